@@ -0,0 +1,129 @@
+"""
+Benchmark every view against a synthetic catalog.
+
+    python -m benchmarks --dataset 10k --output results.json
+    python -m benchmarks --dataset 10k --compare results.json --threshold 0.2
+
+Runs against a separate test database (reused across runs with --keepdb, so
+large catalogs are only generated once) and exits with status 1 when a view
+regressed by more than --threshold compared to the --compare results.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+            description='Benchmark every view against a synthetic catalog.')
+    parser.add_argument('--dataset', default='10k',
+            help='Catalog size, one of 10k, 100k, 1m or a number of recipes.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mode', choices=('client', 'wsgi', 'asgi'), default='client',
+            help='Drive views through the test client (counts queries), over '
+                 'HTTP against a WSGI server or through the ASGI application.')
+    parser.add_argument('--requests', type=int, default=50, help='Measured requests per view.')
+    parser.add_argument('--concurrency', type=int, default=8,
+            help='Concurrent clients in wsgi and asgi modes.')
+    parser.add_argument('--client-delay', type=float, default=0.0,
+            help='Seconds each client takes to send its request in wsgi and asgi modes.')
+    parser.add_argument('--anonymous', action='store_true',
+            help='Make requests without logging in.')
+    parser.add_argument('--views', help='Comma separated url names, defaults to every view.')
+    parser.add_argument('--heavy', action='store_true',
+            help='Include views and jobs that read the whole catalog (export_recipes, '
+                 'recomputing every recipe\'s nutrition).')
+    parser.add_argument('--keepdb', action='store_true',
+            help='Keep the benchmark database, and its catalog, for the next run.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--compare', help='Results JSON of an earlier run to compare against.')
+    parser.add_argument('--threshold', type=float, default=0.2,
+            help='Fraction a latency may grow by before it counts as a regression.')
+    return parser.parse_args(argv)
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stockpot.settings')
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    from recipes.models import Recipe
+    from . import datasets, runner
+
+    count = datasets.SIZES.get(args.dataset) or int(args.dataset)
+    names = runner.url_names()
+    if args.views:
+        names = [name for name in names if name in args.views.split(',')]
+    elif not args.heavy:
+        names = [name for name in names if name not in runner.HEAVY]
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=args.keepdb)
+    try:
+        if Recipe.objects.filter(author__user__username=datasets.USERNAME).exists() and \
+                Recipe.objects.count() == count:
+            print(f'Reusing the catalog of {count} recipes.', file=sys.stderr)
+        else:
+            call_command('flush', interactive=False, verbosity=0)
+            print(f'Generating a catalog of {count} recipes...', file=sys.stderr)
+            datasets.generate(count, seed=args.seed)
+
+        if args.mode in ('wsgi', 'asgi'):
+            run = runner.run_wsgi if args.mode == 'wsgi' else runner.run_asgi
+            results = run(names, args.requests, concurrency=args.concurrency,
+                    anonymous=args.anonymous, client_delay=args.client_delay)
+        else:
+            results = runner.run_client(names, args.requests, anonymous=args.anonymous)
+        if args.heavy:
+            results.update(runner.run_nutrition(args.requests))
+
+        # leave the catalog as generated for --keepdb
+        Recipe.objects.filter(title__startswith='Removable ').delete()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+    report = {
+        'commit': _commit(),
+        'dataset': count,
+        'mode': args.mode,
+        'anonymous': args.anonymous,
+        'concurrency': args.concurrency if args.mode != 'client' else 1,
+        'client_delay': args.client_delay if args.mode != 'client' else 0,
+        'database': connection.vendor,
+        'results': results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = runner.compare(json.load(baseline)['results'], results,
+                    args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Synthetic recipe catalogs for benchmarking.
+
+Catalogs are generated from a seeded random number generator, so the same
+size and seed always produce the same recipes, and loaded with the bulk
+importer.
+"""
+import csv
+from itertools import islice
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from recipes import nutrition
+from recipes.importer import RecipeImporter, BATCH_SIZE
+from users.models import Profile
+
+
+SIZES = {
+    '10k': 10000,
+    '100k': 100000,
+    '1m': 1000000,
+}
+
+# a recipe has 3-12 steps and 4-15 ingredients, out of a vocabulary of
+# INGREDIENTS names where a few common ones (salt, butter...) dominate
+STEPS = (3, 12)
+INGREDIENTS_PER_RECIPE = (4, 15)
+INGREDIENTS = 2000
+WORDS = ('tomato soup bread cheese butter garlic onion pepper chicken rice beans '
+        'lemon basil pasta apple pie salad roast stew curry').split()
+UNITS = ('c', '')
+
+# every benchmark request is made as this user
+USERNAME = 'benchmark'
+PASSWORD = 'benchmark'
+
+
+def ingredient_name(rank):
+    return f'ingredient {rank}'
+
+
+def _recipes(count, authors, rng):
+    # the rank of an ingredient follows a power law, like real catalogs
+    for i in range(count):
+        names = {ingredient_name(int(INGREDIENTS ** rng.random()) - 1)
+                for _ in range(rng.randint(*INGREDIENTS_PER_RECIPE))}
+        title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).title()
+        yield {
+            'title': f'{title} {i}',
+            'author': rng.choice(authors),
+            'steps': [' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+                for _ in range(rng.randint(*STEPS))],
+            'ingredients': [{'name': name, 'amount': rng.randint(1, 8) / 4,
+                'units': rng.choice(UNITS)} for name in sorted(names)],
+        }
+
+
+def generate(count, seed=0, batch_size=BATCH_SIZE):
+    """
+    Load a catalog of `count` recipes by max(10, count / 1000) authors, the
+    first of which is the benchmark user.
+    """
+    rng = random.Random(seed)
+
+    User.objects.create_user(username=USERNAME, password=PASSWORD)
+    # one hash shared by every other author, hashing is deliberately slow
+    password = make_password(PASSWORD)
+    others = [User(username=f'cook{i}', password=password)
+            for i in range(max(10, count // 1000) - 1)]
+    User.objects.bulk_create(others)
+    # bulk inserts skip the signal that creates profiles
+    Profile.objects.bulk_create([Profile(user=user)
+        for user in User.objects.filter(profile__isnull=True)])
+    authors = [USERNAME] + [user.username for user in others]
+
+    importer = RecipeImporter()
+    recipes = _recipes(count, authors, rng)
+    while True:
+        batch = list(islice(recipes, batch_size))
+        if not batch:
+            break
+        importer.import_batch(batch)
+
+
+def write_nutrient_table(stream, seed=0):
+    """
+    Write a nutrient table with values per cup of every ingredient a
+    catalog uses, to `stream`.
+    """
+    rng = random.Random(seed)
+    writer = csv.writer(stream)
+    writer.writerow(('name', 'unit') + nutrition.NUTRIENTS)
+    for rank in range(INGREDIENTS):
+        writer.writerow([ingredient_name(rank), 'cup'] +
+                [round(rng.uniform(0, 500), 2) for nutrient in nutrition.NUTRIENTS])
@@ -0,0 +1,348 @@
+"""
+Drives every URL of recipes.urls and users.urls and measures it.
+
+Requests go through the Django test client, which also counts the queries
+each request runs, over HTTP to a WSGI server running in this process, or
+through the ASGI bridge of stockpot.asgi. The last two measure the stack
+under concurrent load and can simulate slow clients to compare the two.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+import socket
+import tempfile
+import threading
+import time
+from time import perf_counter
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from recipes import nutrition, urls as recipe_urls
+from recipes.models import Recipe
+from stockpot.asgi_bridge import WsgiToAsgi
+from users import urls as user_urls
+from . import datasets
+
+
+# url name -> function(context) returning the path to request; remove_recipe
+# deletes what it is given, so every request gets a recipe of its own
+TARGETS = {
+    'home': lambda context: reverse('home'),
+    'search_recipes': lambda context: reverse('search_recipes') + '?q=tomato',
+    'cookable_recipes': lambda context: reverse('cookable_recipes') + '?' + urlencode(
+        {'ingredients': ','.join(datasets.ingredient_name(i) for i in range(3))}),
+    'export_recipes': lambda context: reverse('export_recipes'),
+    'shopping_list': lambda context: reverse('shopping_list') + '?' + urlencode(
+        {'recipes': ','.join(map(str, context['recipes']))}),
+    'suggest_ingredients': lambda context: reverse('suggest_ingredients') + '?' + urlencode(
+        {'q': datasets.ingredient_name(0)[:6]}),
+    'create_recipe': lambda context: reverse('create_recipe'),
+    'show_recipe': lambda context: reverse('show_recipe', args=[context['recipe']]),
+    'edit_recipe': lambda context: reverse('edit_recipe', args=[context['recipe']]),
+    'remove_recipe': lambda context: reverse('remove_recipe', args=[context['removable'].pop()]),
+    'register': lambda context: reverse('register'),
+    'show_profile': lambda context: reverse('show_profile', args=[datasets.USERNAME]),
+    'edit_profile': lambda context: reverse('edit_profile', args=[datasets.USERNAME]),
+}
+
+# read the whole catalog, only run when asked for, as is run_nutrition
+HEAVY = {'export_recipes'}
+
+# recipes merged into the benchmarked shopping list
+SHOPPING_LIST_SIZE = 100
+
+
+def url_names():
+    names = [pattern.name for urls in (recipe_urls, user_urls) for pattern in urls.urlpatterns]
+    missing = set(names) - set(TARGETS)
+    if missing:
+        raise LookupError('No benchmark target for: {}.'.format(', '.join(sorted(missing))))
+    return names
+
+
+def prepare(names, requests):
+    """
+    Return the context TARGETS build paths from, creating a recipe for
+    every remove_recipe request.
+    """
+    author = User.objects.get(username=datasets.USERNAME).profile
+    recipes = list(Recipe.objects.filter(author=author).order_by('pk')
+            .values_list('pk', flat=True)[:SHOPPING_LIST_SIZE])
+    context = {'recipe': recipes[0] if recipes else None, 'recipes': recipes}
+    if 'remove_recipe' in names:
+        Recipe.objects.bulk_create([Recipe(title=f'Removable {i}', author=author)
+            for i in range(requests)])
+        context['removable'] = list(Recipe.objects.filter(title__startswith='Removable ')
+                .values_list('pk', flat=True))
+    return context
+
+
+def percentile(values, fraction):
+    """
+    Nearest rank percentile of `values`, which must be sorted.
+    """
+    if not values:
+        return None
+    rank = max(math.ceil(fraction * len(values)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(latencies, elapsed, queries=None):
+    latencies = sorted(latencies)
+    summary = {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 0.9) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'queries': None,
+    }
+    if queries:
+        summary['queries'] = max(queries)
+    return summary
+
+
+def run_client(names, requests, warmup=2, anonymous=False):
+    """
+    Benchmark every view in `names` through the test client, one request
+    at a time, counting each request's queries.
+    """
+    context = prepare(names, requests + warmup)
+    client = Client()
+    if not anonymous:
+        client.login(username=datasets.USERNAME, password=datasets.PASSWORD)
+
+    results = {}
+    for name in names:
+        for _ in range(warmup):
+            client.get(TARGETS[name](context))
+
+        latencies = []
+        queries = []
+        start = perf_counter()
+        for _ in range(requests):
+            path = TARGETS[name](context)
+            with CaptureQueriesContext(connection) as captured:
+                request_start = perf_counter()
+                response = client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                latencies.append(perf_counter() - request_start)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{name} answered {path} with {response.status_code}.')
+            queries.append(len(captured))
+        results[name] = summarize(latencies, perf_counter() - start, queries)
+    return results
+
+
+def run_nutrition(requests):
+    """
+    Benchmark working out the nutrition of a single recipe, as saving one
+    does, and of the whole catalog, as update_nutrition does after the
+    nutrient table changed.
+    """
+    handle, path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(handle, 'w', newline='') as table:
+            datasets.write_nutrient_table(table)
+        with override_settings(NUTRIENT_TABLE=path):
+            start = perf_counter()
+            nutrition.update_recipes()
+            catalog = perf_counter() - start
+
+            recipe_ids = list(Recipe.objects.order_by('?').values_list('pk', flat=True)[:requests])
+            latencies = []
+            queries = []
+            start = perf_counter()
+            for recipe_id in recipe_ids:
+                with CaptureQueriesContext(connection) as captured:
+                    request_start = perf_counter()
+                    nutrition.update_recipes([recipe_id])
+                    latencies.append(perf_counter() - request_start)
+                queries.append(len(captured))
+            recipe = summarize(latencies, perf_counter() - start, queries)
+    finally:
+        os.remove(path)
+    return {
+        'update_nutrition_recipe': recipe,
+        'update_nutrition_catalog': summarize([catalog], catalog),
+    }
+
+
+class PooledWSGIServer(WSGIServer):
+    """
+    Handles connections on a fixed pool of threads, like a synchronous
+    worker process with that many threads.
+    """
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, threads):
+        self.pool = ThreadPoolExecutor(threads)
+        super(PooledWSGIServer, self).__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+def _session_cookie():
+    client = Client()
+    client.login(username=datasets.USERNAME, password=datasets.PASSWORD)
+    return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+
+def _drive(names, requests, concurrency, warmup, fetch):
+    results = {}
+    with ThreadPoolExecutor(concurrency) as pool:
+        for name in names:
+            list(pool.map(fetch, [name] * warmup))
+            start = perf_counter()
+            latencies = list(pool.map(fetch, [name] * requests))
+            results[name] = summarize(latencies, perf_counter() - start)
+    return results
+
+
+def run_wsgi(names, requests, concurrency=8, warmup=2, anonymous=False, client_delay=0.0):
+    """
+    Benchmark every view in `names` over HTTP against a WSGI server with
+    settings.ASGI_THREADS threads, with `concurrency` clients making
+    requests at once. Each client takes `client_delay` seconds to send its
+    request, holding one of the server's threads meanwhile.
+    """
+    context = prepare(names, requests + warmup)
+    cookie = '' if anonymous else f'Cookie: {_session_cookie()}\r\n'
+
+    server = PooledWSGIServer(('127.0.0.1', 0), QuietHandler, threads=settings.ASGI_THREADS)
+    server.set_app(get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_address[1]
+    lock = threading.Lock()
+
+    def fetch(name):
+        with lock:
+            path = TARGETS[name](context)
+        start = perf_counter()
+        with socket.create_connection(('127.0.0.1', port)) as connection:
+            connection.sendall(f'GET {path} HTTP/1.0\r\n'.encode())
+            if client_delay:
+                time.sleep(client_delay)
+            connection.sendall(f'Host: localhost\r\n{cookie}\r\n'.encode())
+            response = b''.join(iter(lambda: connection.recv(65536), b''))
+        latency = perf_counter() - start
+        status = int(response.split(b' ', 2)[1])
+        if status >= 400:
+            raise RuntimeError(f'{name} answered {path} with {status}.')
+        return latency
+
+    try:
+        return _drive(names, requests, concurrency, warmup, fetch)
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.pool.shutdown()
+
+
+def run_asgi(names, requests, concurrency=8, warmup=2, anonymous=False, client_delay=0.0):
+    """
+    Benchmark every view in `names` through stockpot.asgi's bridge, called
+    in process from an event loop, with `concurrency` clients making
+    requests at once and taking `client_delay` seconds each to send them.
+    Requests run on settings.ASGI_THREADS threads, like run_wsgi, but a
+    slow client only holds the event loop's attention, not a thread.
+    """
+    context = prepare(names, requests + warmup)
+    headers = [(b'host', b'localhost')]
+    if not anonymous:
+        headers.append((b'cookie', _session_cookie().encode()))
+    application = WsgiToAsgi(get_wsgi_application(), max_threads=settings.ASGI_THREADS)
+
+    async def fetch(name):
+        path, _, query = TARGETS[name](context).partition('?')
+        scope = {'type': 'http', 'http_version': '1.0', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'query_string': query.encode(), 'root_path': '',
+            'headers': headers, 'server': ('localhost', 80), 'client': ('127.0.0.1', 0)}
+        messages = []
+
+        async def receive():
+            if client_delay:
+                await asyncio.sleep(client_delay)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        start = perf_counter()
+        await application(scope, receive, send)
+        latency = perf_counter() - start
+        if messages[0]['status'] >= 400:
+            raise RuntimeError(f'{name} answered {path} with {messages[0]["status"]}.')
+        return latency
+
+    async def fetch_all(name, count):
+        remaining = iter(range(count))
+        latencies = []
+
+        async def client():
+            for _ in remaining:
+                latencies.append(await fetch(name))
+
+        await asyncio.gather(*[client() for _ in range(concurrency)])
+        return latencies
+
+    loop = asyncio.new_event_loop()
+    results = {}
+    try:
+        for name in names:
+            loop.run_until_complete(fetch_all(name, warmup))
+            start = perf_counter()
+            latencies = loop.run_until_complete(fetch_all(name, requests))
+            results[name] = summarize(latencies, perf_counter() - start)
+    finally:
+        application.executor.shutdown()
+        loop.close()
+    return results
+
+
+def compare(baseline, results, threshold):
+    """
+    Return a description of every view whose p50 or p90 latency grew by
+    more than `threshold` (a fraction) over `baseline`, or that runs more
+    queries than it did.
+    """
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p90_ms'):
+            if current[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f'{name} {metric}: {previous[metric]} -> {current[metric]}')
+        if previous.get('queries') is not None and current.get('queries') is not None \
+                and current['queries'] > previous['queries']:
+            regressions.append(
+                    f'{name} queries: {previous["queries"]} -> {current["queries"]}')
+    return regressions
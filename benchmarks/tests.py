@@ -0,0 +1,57 @@
+from django.test import TestCase, SimpleTestCase
+
+from recipes.models import Recipe, Ingredient, RecipeNutrition
+from . import datasets, runner
+
+
+class ReportTest(SimpleTestCase):
+
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(runner.percentile(values, 0.5), 50)
+        self.assertEqual(runner.percentile(values, 0.99), 99)
+        self.assertEqual(runner.percentile([7], 0.9), 7)
+
+    def test_compare_flags_slower_views_and_extra_queries(self):
+        baseline = {
+            'home': {'p50_ms': 10, 'p90_ms': 20, 'queries': 3},
+            'show_recipe': {'p50_ms': 10, 'p90_ms': 20, 'queries': 4},
+        }
+        results = {
+            'home': {'p50_ms': 11, 'p90_ms': 30, 'queries': 3},
+            'show_recipe': {'p50_ms': 10, 'p90_ms': 20, 'queries': 5},
+            'search_recipes': {'p50_ms': 100, 'p90_ms': 200, 'queries': 9},
+        }
+        self.assertEqual(runner.compare(baseline, results, threshold=0.2), [
+            'home p90_ms: 20 -> 30',
+            'show_recipe queries: 4 -> 5',
+        ])
+
+    def test_every_url_has_a_target(self):
+        self.assertIn('show_recipe', runner.url_names())
+
+
+class ClientBenchmarkTest(TestCase):
+
+
+    def test_runs_every_view_against_generated_catalog(self):
+        datasets.generate(20, seed=1, batch_size=8)
+        self.assertEqual(Recipe.objects.count(), 20)
+        self.assertTrue(Ingredient.objects.exists())
+
+        names = [name for name in runner.url_names() if name not in runner.HEAVY]
+        results = runner.run_client(names, requests=2, warmup=1)
+
+        self.assertEqual(set(results), set(names))
+        self.assertEqual(results['show_recipe']['requests'], 2)
+        self.assertIsNotNone(results['show_recipe']['queries'])
+
+    def test_runs_nutrition_jobs(self):
+        datasets.generate(20, seed=1, batch_size=8)
+
+        results = runner.run_nutrition(requests=3)
+
+        self.assertEqual(RecipeNutrition.objects.count(), 20)
+        self.assertEqual(results['update_nutrition_recipe']['requests'], 3)
+        self.assertEqual(results['update_nutrition_catalog']['requests'], 1)
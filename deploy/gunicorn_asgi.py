@@ -0,0 +1,32 @@
+# gunicorn configuration for serving stockpot.asgi:application with uvicorn
+# workers (pip install -r requirements.txt):
+#
+#     gunicorn stockpot.asgi:application -c deploy/gunicorn_asgi.py
+#
+# Each worker process runs an event loop holding any number of client
+# connections, and ASGI_THREADS threads running Django. Keep
+# workers * ASGI_THREADS within what the database (or PgBouncer) accepts.
+#
+# uvicorn is pinned to 0.16.0, the last release that runs on Python 3.6
+# (which Django 1.11 needs) and speaks ASGI 3. Its dependencies h11, asgiref
+# and typing-extensions are pinned to releases that support 3.6 too, and click
+# is at 7.1.2 because uvicorn needs click>=7.
+import multiprocessing
+import os
+
+
+bind = os.environ.get('BIND') or '0.0.0.0:8000'
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count())
+worker_class = 'uvicorn.workers.UvicornWorker'
+keepalive = 75
+timeout = 60
+graceful_timeout = 30
+
+# the metrics directory is shared by every worker and must start out empty
+metrics_dir = os.environ.get('METRICS_DIR')
+
+
+def on_starting(server):
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for filename in os.listdir(metrics_dir):
+            os.remove(os.path.join(metrics_dir, filename))
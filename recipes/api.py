@@ -0,0 +1,137 @@
+"""
+Read-only JSON API over recipes.
+
+Every endpoint takes an optional `fields` parameter (e.g. `fields=title,steps`)
+and only queries the tables the requested fields need: author fields join
+Profile and User into the recipe query, steps and ingredients are each loaded
+with one extra query for the whole page. Nothing is lazy loaded per recipe.
+"""
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import JsonResponse, Http404
+from django.views.decorators.http import require_GET
+
+from .models import Recipe, RecipeStep, MeasuredIngredient
+from .pagination import keyset_paginate
+
+
+FIELDS = ('title', 'author', 'modified', 'steps', 'ingredients')
+
+# most recipes a single batch request may ask for
+MAX_BATCH_SIZE = 100
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _parse_fields(request):
+    value = request.GET.get('fields')
+    if not value:
+        return set(FIELDS)
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields - set(FIELDS)
+    if unknown:
+        raise BadRequest('Unknown fields: {}.'.format(', '.join(sorted(unknown))))
+    return fields
+
+
+def _parse_ids(value):
+    try:
+        ids = [int(pk) for pk in value.split(',') if pk.strip()]
+    except ValueError:
+        raise BadRequest('ids must be a comma separated list of integers.')
+    if len(ids) > MAX_BATCH_SIZE:
+        raise BadRequest(f'At most {MAX_BATCH_SIZE} ids may be requested at once.')
+    return ids
+
+
+def recipe_queryset(fields):
+    """
+    Return a Recipe queryset loading exactly what serialize_recipe needs
+    for `fields`.
+    """
+    columns = ['id'] + [field for field in ('title', 'modified') if field in fields]
+    recipes = Recipe.objects.all()
+
+    if 'author' in fields:
+        recipes = recipes.select_related('author__user')
+        columns += ['author', 'author__name', 'author__user__username']
+    if 'steps' in fields:
+        recipes = recipes.prefetch_related(Prefetch('steps',
+                queryset=RecipeStep.objects.only('id', 'body', 'recipe_id').order_by('pk')))
+    if 'ingredients' in fields:
+        recipes = recipes.prefetch_related(Prefetch('measuredingredient_set',
+                queryset=MeasuredIngredient.objects.select_related('ingredient').order_by('pk')))
+
+    return recipes.only(*columns)
+
+
+def serialize_recipe(recipe, fields):
+    data = {'id': recipe.pk}
+    if 'title' in fields:
+        data['title'] = recipe.title
+    if 'author' in fields:
+        author = recipe.author
+        data['author'] = author and {
+            'username': author.user.username,
+            'name': author.name,
+        }
+    if 'modified' in fields:
+        data['modified'] = recipe.modified
+    if 'steps' in fields:
+        data['steps'] = [step.body for step in recipe.steps.all()]
+    if 'ingredients' in fields:
+        data['ingredients'] = [{
+            'name': measured.ingredient.name,
+            'amount': measured.amount,
+            'units': measured.units,
+        } for measured in recipe.measuredingredient_set.all()]
+    return data
+
+
+def _error(message, status):
+    return JsonResponse({'error': str(message)}, status=status)
+
+
+@require_GET
+def recipe_list(request):
+    """
+    A page of recipes, newest first, or with `ids` the listed recipes in
+    the order asked for (unknown ids are left out).
+    """
+    try:
+        fields = _parse_fields(request)
+        ids = _parse_ids(request.GET['ids']) if 'ids' in request.GET else None
+    except BadRequest as e:
+        return _error(e, 400)
+
+    recipes = recipe_queryset(fields)
+    if ids is not None:
+        found = recipes.in_bulk(ids)
+        results = [serialize_recipe(found[pk], fields) for pk in ids if pk in found]
+        return JsonResponse({'results': results})
+
+    try:
+        page = keyset_paginate(recipes, settings.RECIPE_FEED_PAGE_SIZE,
+                after=request.GET.get('after'), before=request.GET.get('before'))
+    except Http404 as e:
+        return _error(e, 400)
+    return JsonResponse({
+        'results': [serialize_recipe(recipe, fields) for recipe in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+@require_GET
+def recipe_detail(request, pk):
+    try:
+        fields = _parse_fields(request)
+    except BadRequest as e:
+        return _error(e, 400)
+
+    recipe = recipe_queryset(fields).filter(pk=pk).first()
+    if recipe is None:
+        return _error('Recipe not found.', 404)
+    return JsonResponse(serialize_recipe(recipe, fields))
@@ -0,0 +1,9 @@
+from django.conf.urls import url
+
+from . import api
+
+
+urlpatterns = [
+    url(r'^$', api.recipe_list, name='api_recipe_list'),
+    url(r'^(?P<pk>[0-9]+)/$', api.recipe_detail, name='api_recipe_detail'),
+]
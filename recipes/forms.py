@@ -1,13 +1,15 @@
 from django import forms
+from django.forms.models import BaseInlineFormSet
 from django.forms.widgets import TextInput
+from django.utils.functional import cached_property
 
-from .models import Recipe, MeasuredIngredient, Ingredient
+from .models import Recipe, MeasuredIngredient, Ingredient, normalize_ingredient_name
 
 
 class RecipeForm(forms.ModelForm):
     class Meta:
         model = Recipe
-        fields = ('title',)
+        fields = ('title', 'servings')
 
 
 class MeasuredIngredientForm(forms.ModelForm):
@@ -20,26 +22,80 @@ class MeasuredIngredientForm(forms.ModelForm):
     # to and ingredient object in the clean method
     ingredient = forms.CharField(label='Name', max_length=128)
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, ingredient_names=None, **kwargs):
         super(MeasuredIngredientForm, self).__init__(*args, **kwargs)
 
+        # set by a formset that looks up the ingredients of all of its
+        # forms at once, see BaseMeasuredIngredientFormSet.full_clean
+        self.defer_ingredient = False
+
         _ingredient_pk = self.initial.get('ingredient', None)
         if _ingredient_pk:
-            self.initial['ingredient'] = Ingredient.objects.get(pk=_ingredient_pk).name
+            if ingredient_names and _ingredient_pk in ingredient_names:
+                self.initial['ingredient'] = ingredient_names[_ingredient_pk]
+            else:
+                self.initial['ingredient'] = Ingredient.objects.get(pk=_ingredient_pk).name
 
     def clean(self):
         self.cleaned_data = super(MeasuredIngredientForm, self).clean()
 
         name = self.cleaned_data.get('ingredient')
         if name is not None:
-            # see if the name given for an ingredient exists, if it
-            # does use that ingredient
-            ing = Ingredient.objects.filter(name=name.lower()).first()
-            if ing is None:
-                # if it doesn't exist, create the ingredient (lowercase)
-                #TODO: find a better way to force lowercase in database
-                ing = Ingredient.objects.create(name=name.lower())
+            # use the ingredient with the given (normalized) name, creating
+            # it if it doesn't exist yet
+            key = normalize_ingredient_name(name)
+            if self.defer_ingredient:
+                # unsaved until the formset resolves it
+                ing = Ingredient(name=key)
+            else:
+                ing = Ingredient.objects.resolve([name])[key]
 
             self.cleaned_data['ingredient'] = ing
 
         return self.cleaned_data
+
+    def _get_validation_exclusions(self):
+        # the ingredient was looked up (or created) in clean, skip the
+        # model validation query that checks it exists
+        exclude = super(MeasuredIngredientForm, self)._get_validation_exclusions()
+        exclude.append('ingredient')
+        return exclude
+
+
+class BaseMeasuredIngredientFormSet(BaseInlineFormSet):
+    """
+    Inline formset of a recipe's MeasuredIngredients that reads and resolves
+    ingredient names for all of its forms at once instead of row by row.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('queryset', MeasuredIngredient.objects.select_related('ingredient'))
+        super(BaseMeasuredIngredientFormSet, self).__init__(*args, **kwargs)
+
+    @cached_property
+    def ingredient_names(self):
+        return {mi.ingredient_id: mi.ingredient.name for mi in self.get_queryset()}
+
+    def get_form_kwargs(self, index):
+        kwargs = super(BaseMeasuredIngredientFormSet, self).get_form_kwargs(index)
+        kwargs['ingredient_names'] = self.ingredient_names
+        return kwargs
+
+    def full_clean(self):
+        if not self.is_bound:
+            return super(BaseMeasuredIngredientFormSet, self).full_clean()
+
+        for form in self.forms:
+            form.defer_ingredient = True
+        super(BaseMeasuredIngredientFormSet, self).full_clean()
+
+        # only the ingredients of the rows that are kept and valid are
+        # looked up, and the missing ones created, all at once
+        kept = [form for form in self.forms
+                if not form.errors and 'ingredient' in form.cleaned_data
+                and not (self.can_delete and self._should_delete_form(form))]
+        ingredients = Ingredient.objects.resolve(
+                [form.cleaned_data['ingredient'].name for form in kept])
+        for form in kept:
+            ing = ingredients[form.cleaned_data['ingredient'].name]
+            form.cleaned_data['ingredient'] = form.instance.ingredient = ing
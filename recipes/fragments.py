@@ -0,0 +1,110 @@
+"""
+Cache of rendered recipe.html fragments.
+
+Fragments are keyed by recipe pk and a per-recipe version. Invalidating a
+recipe just drops its version, so the next read picks a fresh one and any
+fragments rendered under the old version are never looked up again.
+"""
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from stockpot import metrics
+from stockpot.db.replicas import primary
+
+
+def _version_key(pk):
+    return f'recipe-fragment:{pk}:version'
+
+
+def _fragment_key(pk, version, detail):
+    variant = 'detail' if detail else 'summary'
+    return f'recipe-fragment:{pk}:{version}:{variant}'
+
+
+def _get_versions(pks):
+    keys = {pk: _version_key(pk) for pk in pks}
+    found = cache.get_many(keys.values())
+
+    versions = {}
+    missing = {}
+    for pk, key in keys.items():
+        if key in found:
+            versions[pk] = found[key]
+        else:
+            missing[key] = versions[pk] = uuid4().hex
+    if missing:
+        cache.set_many(missing, timeout=None)
+    return versions
+
+
+def get_fragments(pks, detail=False):
+    """
+    Return (cached, versions): a dict of pk -> cached html for each of
+    `pks` that has a fragment cached under its current version, and a dict
+    of pk -> the version of every one of `pks`.
+
+    Read the versions before loading the recipes the missing fragments are
+    rendered from, and store those under them, so a change landing in
+    between invalidates what was rendered instead of being cached over.
+    """
+    versions = _get_versions(pks)
+    keys = {pk: _fragment_key(pk, versions[pk], detail) for pk in pks}
+    found = cache.get_many(keys.values())
+    metrics.record_cache('recipe_fragment', len(found), len(keys) - len(found))
+    return {pk: mark_safe(found[key]) for pk, key in keys.items() if key in found}, versions
+
+
+def get_fragment(pk, detail=False):
+    """
+    Return (cached html or None, version) for `pk`, see get_fragments.
+    """
+    cached, versions = get_fragments([pk], detail=detail)
+    return cached.get(pk), versions[pk]
+
+
+def render_fragment(recipe, version, detail=False):
+    """
+    Render recipe.html for `recipe` and cache it under `version`, the
+    version read before `recipe` was loaded. Load it from the primary
+    database, what a lagging replica returns would be cached after the
+    invalidation of the write it misses.
+    """
+    html = render_to_string('recipe.html', {'recipe': recipe, 'detail': detail})
+    cache.set(_fragment_key(recipe.pk, version, detail), str(html),
+            settings.RECIPE_FRAGMENT_CACHE_TIMEOUT)
+    return mark_safe(html)
+
+
+def render_fragments(pks, load, detail=False):
+    """
+    Return a dict of pk -> html for each of `pks`, rendering and caching
+    only the ones that are missing from the cache. `load(pks)` returns a
+    dict of pk -> recipe for those, recipes it leaves out are left out.
+    They are loaded from the primary database, see render_fragment.
+    """
+    cached, versions = get_fragments(pks, detail=detail)
+    missing = [pk for pk in pks if pk not in cached]
+    if missing:
+        with primary():
+            for pk, recipe in load(missing).items():
+                cached[pk] = render_fragment(recipe, versions[pk], detail=detail)
+    return cached
+
+
+def invalidate(*pks):
+    """
+    Drop the cached fragments for `pks`.
+
+    The versions are dropped right away and again once the surrounding
+    transaction commits, so a read that races the write cannot re-cache
+    the old content under a new version.
+    """
+    keys = [_version_key(pk) for pk in pks if pk is not None]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
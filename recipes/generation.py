@@ -0,0 +1,66 @@
+"""
+Generation counters in the shared cache, telling the processes that keep an
+in-memory copy of some data when another process has changed it.
+
+Every change moves the counter on, a copy built at any other generation is
+stale. Each process reads the counter from the cache at most every
+settings.GENERATION_CHECK_INTERVAL seconds, so changes made by other
+processes are noticed within that long and changes made by this one right
+away.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _seed():
+    # a counter evicted and started again doesn't come back to the value a
+    # stale copy was built at
+    return random.getrandbits(48)
+
+
+class SharedGeneration(object):
+
+
+    def __init__(self, key):
+        self.key = key
+        self._lock = threading.Lock()
+        self._value = None
+        self._read_at = None
+
+    def _remember(self, value):
+        with self._lock:
+            self._value = value
+            self._read_at = time.monotonic()
+
+    def current(self):
+        """
+        The counter, as last read or moved on by this process unless that
+        was GENERATION_CHECK_INTERVAL seconds ago or more.
+        """
+        with self._lock:
+            if (self._value is not None and
+                    time.monotonic() - self._read_at < settings.GENERATION_CHECK_INTERVAL):
+                return self._value
+        value = cache.get(self.key)
+        if value is None:
+            cache.add(self.key, _seed(), timeout=None)
+            value = cache.get(self.key)
+        self._remember(value)
+        return value
+
+    def bump(self):
+        """
+        Move the counter on, returns its new value.
+        """
+        try:
+            value = cache.incr(self.key)
+        except ValueError:
+            # never read or evicted
+            cache.add(self.key, _seed(), timeout=None)
+            value = cache.incr(self.key)
+        self._remember(value)
+        return value
@@ -0,0 +1,201 @@
+"""
+Bulk loading of recipe catalogs, in the format recipes.export writes.
+
+Records are read one at a time and written in batches: every batch is one
+transaction holding a single insert per table, ingredient names are mapped
+to ids from an in-memory dict and only names never seen before go to the
+database. On PostgreSQL the steps and ingredients can be loaded with COPY.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections, transaction
+
+from stockpot import page_cache
+from stockpot.db import copy_rows
+from users.models import Profile
+from . import nutrition, units as unit_registry
+from .ingredient_index import ingredient_index
+from .models import Recipe, RecipeStep, MeasuredIngredient, Ingredient, normalize_ingredient_name
+
+
+FORMATS = ('ndjson', 'csv')
+
+BATCH_SIZE = 1000
+
+
+class RecipeImportError(ValueError):
+    pass
+
+
+def read_records(stream, format):
+    """
+    Yield the recipe dicts in `stream`, NDJSON or CSV with JSON encoded
+    author, steps and ingredients cells.
+    """
+    for raw in read_raw_records(stream, format):
+        yield decode_record(raw, format)
+
+
+def read_raw_records(stream, format):
+    """
+    Yield the records in `stream` as read_records() finds them but still
+    undecoded, NDJSON lines or CSV rows with their cells as read, so the
+    ones that are skipped aren't decoded.
+    """
+    if format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+
+    for line in stream:
+        if line.strip():
+            yield line
+
+
+def decode_record(raw, format):
+    """
+    Return the recipe dict of a record from read_raw_records().
+    """
+    if format == 'csv':
+        for column in ('author', 'steps', 'ingredients'):
+            if raw.get(column):
+                raw[column] = json.loads(raw[column])
+        return raw
+    return json.loads(raw)
+
+
+class RecipeImporter(object):
+    """
+    Writes recipes given as dicts with a title, an author (a username or
+    {'username': ...}), a list of step bodies and a list of
+    {'name', 'amount', 'units'} ingredients.
+
+    Recipes whose author doesn't exist are imported without one.
+    """
+
+    def __init__(self, using='default', use_copy=False):
+        self.using = using
+        self.use_copy = use_copy
+        # normalized name -> id, for every ingredient seen so far
+        self.ingredients = {}
+        # username -> profile id (None for unknown users)
+        self.authors = {}
+
+        vendor = connections[using].vendor
+        if use_copy and vendor != 'postgresql':
+            raise RecipeImportError('COPY is only available on PostgreSQL.')
+
+    def import_batch(self, records, imported=None):
+        """
+        Write `records` in one transaction, return the new recipe ids.
+
+        `imported()` is called once they are committed, before the caches
+        and nutrition are updated, so the batch can be recorded as done
+        even if those fail.
+        """
+        records = [self._clean(record) for record in records]
+        if not records:
+            return []
+
+        with transaction.atomic(using=self.using):
+            self._resolve_ingredients(records)
+            self._resolve_authors(records)
+
+            recipes = [Recipe(title=record['title'],
+                author_id=self.authors.get(record['author'])) for record in records]
+            self._insert_recipes(recipes)
+
+            steps = []
+            measured = []
+            for recipe, record in zip(recipes, records):
+                steps.extend((recipe.pk, body) for body in record['steps'])
+                measured.extend((recipe.pk, self.ingredients[name], amount, units)
+                        for name, amount, units in record['ingredients'])
+            self._insert_children(steps, measured)
+
+            pks = [recipe.pk for recipe in recipes]
+            # the signals that normally keep these current aren't sent by
+            # bulk inserts
+            Recipe.objects.using(self.using).filter(pk__in=pks).update_search_vectors()
+
+        if imported is not None:
+            imported()
+        page_cache.purge('recipes')
+        # logged as one change, other processes catch up with the batch
+        # instead of rebuilding their index
+        ingredient_index.reindex_recipes(pks)
+        nutrition.refresh_recipes(pks, using=self.using)
+        return pks
+
+    def _clean(self, record):
+        title = record.get('title')
+        if not title:
+            raise RecipeImportError(f'Recipe without a title: {record!r}')
+
+        author = record.get('author') or None
+        if isinstance(author, dict):
+            author = author.get('username')
+
+        ingredients = []
+        for ingredient in record.get('ingredients') or ():
+            name = normalize_ingredient_name(ingredient.get('name') or '')
+            if not name:
+                raise RecipeImportError(f'Ingredient without a name in {title!r}.')
+            try:
+                amount = Decimal(str(ingredient.get('amount') or 0))
+            except InvalidOperation:
+                raise RecipeImportError(f'Bad amount for {name!r} in {title!r}.')
+            # by code or name, units the registry doesn't know are kept as
+            # they are without a quantity
+            units = ingredient.get('units') or ''
+            unit = unit_registry.find(units)
+            ingredients.append((name, amount, units if unit is None else unit.code))
+
+        return {
+            'title': title,
+            'author': author,
+            'steps': [str(step) for step in record.get('steps') or ()],
+            'ingredients': ingredients,
+        }
+
+    def _resolve_ingredients(self, records):
+        missing = {name for record in records for name, amount, units in record['ingredients']
+                if name not in self.ingredients}
+        if missing:
+            resolved = Ingredient.objects.db_manager(self.using).resolve(missing)
+            self.ingredients.update({name: ing.pk for name, ing in resolved.items()})
+
+    def _resolve_authors(self, records):
+        missing = {record['author'] for record in records
+                if record['author'] and record['author'] not in self.authors}
+        if missing:
+            found = dict(Profile.objects.using(self.using).filter(user__username__in=missing)
+                    .values_list('user__username', 'pk'))
+            self.authors.update({username: found.get(username) for username in missing})
+
+    def _insert_recipes(self, recipes):
+        connection = connections[self.using]
+        if connection.features.can_return_ids_from_bulk_insert:
+            Recipe.objects.using(self.using).bulk_create(recipes)
+        else:
+            # the ids of bulk inserted rows aren't known here, fall back to
+            # an insert per recipe
+            for recipe in recipes:
+                recipe.save(using=self.using)
+
+    def _insert_children(self, steps, measured):
+        if self.use_copy:
+            copy_rows(RecipeStep, ('recipe_id', 'body'), steps, using=self.using)
+            copy_rows(MeasuredIngredient,
+                    ('recipe_id', 'ingredient_id', 'amount', 'units', 'quantity', 'dimension'),
+                    [row + unit_registry.canonical(row[2], row[3]) for row in measured],
+                    using=self.using, null_columns=('quantity',))
+            return
+
+        RecipeStep.objects.using(self.using).bulk_create(
+                [RecipeStep(recipe_id=recipe_id, body=body) for recipe_id, body in steps])
+        MeasuredIngredient.objects.using(self.using).bulk_create(
+                [MeasuredIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=amount, units=units)
+                    for recipe_id, ingredient_id, amount, units in measured])
@@ -0,0 +1,214 @@
+"""
+In-process inverted index from ingredient to the recipes that use it.
+
+Each ingredient maps to a sorted array of recipe ids, so ranking recipes by
+how many of a set of ingredients they use is done in memory instead of with
+joins across MeasuredIngredient. The index is built lazily from one query
+and kept up to date incrementally in the process that makes a change.
+
+Every change moves the shared generation counter on and logs the recipes it
+was made to in the cache under the new generation. Other processes that
+notice the counter has moved on re-read just the logged recipes and update
+their copy in place, and rebuild it only when some of the log is gone:
+expired, evicted, more than DELTA_LOG_SIZE changes behind or never
+written, as for invalidate().
+"""
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+import heapq
+import threading
+
+from django.apps import apps
+from django.core.cache import cache
+
+from stockpot.db.replicas import primary
+from .generation import SharedGeneration
+
+
+GENERATION_KEY = 'ingredient-index:generation'
+
+# changes a process can fall behind by and still catch up without a rebuild
+DELTA_LOG_SIZE = 1000
+# seconds each change stays in the log
+DELTA_LOG_TIMEOUT = 60 * 60
+
+
+def _delta_key(generation):
+    return f'ingredient-index:delta:{generation}'
+
+
+def _remove(ids, value):
+    i = bisect_left(ids, value)
+    if i < len(ids) and ids[i] == value:
+        del ids[i]
+
+
+class IngredientIndex(object):
+
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            # ingredient id -> sorted array of recipe ids
+            self._recipes = None
+            # recipe id -> sorted array of its distinct ingredient ids
+            self._ingredients = None
+            self._generation = None
+            self._shared_generation = SharedGeneration(GENERATION_KEY)
+
+    def generation(self):
+        """
+        The shared generation counter, it moves on with every change to the
+        index in any process.
+        """
+        return self._shared_generation.current()
+
+    def _build(self):
+        MeasuredIngredient = apps.get_model('recipes', 'MeasuredIngredient')
+        generation = self._shared_generation.current()
+
+        recipes = {}
+        ingredients = {}
+        rows = MeasuredIngredient.objects.order_by('recipe_id', 'ingredient_id') \
+                .values_list('recipe_id', 'ingredient_id').distinct()
+        for recipe_id, ingredient_id in rows.iterator():
+            # rows arrive sorted by recipe, so appending keeps both sides sorted
+            recipes.setdefault(ingredient_id, array('l')).append(recipe_id)
+            ingredients.setdefault(recipe_id, array('l')).append(ingredient_id)
+
+        self._recipes = recipes
+        self._ingredients = ingredients
+        self._generation = generation
+
+    def _catch_up(self, generation):
+        """
+        Apply the changes logged since our copy's generation up to
+        `generation`, False when some of them aren't in the log.
+        """
+        MeasuredIngredient = apps.get_model('recipes', 'MeasuredIngredient')
+        if not 0 < generation - self._generation <= DELTA_LOG_SIZE:
+            return False
+        keys = [_delta_key(logged) for logged in range(self._generation + 1, generation + 1)]
+        deltas = cache.get_many(keys)
+        if len(deltas) < len(keys):
+            return False
+
+        # every recipe changed, even the ones left without ingredients
+        changed = {recipe_id: set() for recipe_ids in deltas.values()
+                for recipe_id in recipe_ids}
+        rows = MeasuredIngredient.objects.filter(recipe_id__in=changed) \
+                .values_list('recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows.iterator():
+            changed[recipe_id].add(ingredient_id)
+        for recipe_id, ingredient_ids in changed.items():
+            self._update(recipe_id, ingredient_ids)
+        self._generation = generation
+        return True
+
+    def _ensure_current(self):
+        # a lagging replica would leave the copy stale until the next change
+        with primary():
+            if self._recipes is None:
+                self._build()
+                return
+            generation = self._shared_generation.current()
+            if self._generation != generation and not self._catch_up(generation):
+                self._build()
+
+    def rank(self, ingredient_ids, limit=None):
+        """
+        Return (recipe_id, matched, missing) tuples for every recipe using at
+        least one of `ingredient_ids`, fewest missing ingredients first, then
+        most matched, then newest.
+        """
+        with self._lock:
+            self._ensure_current()
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self._recipes.get(ingredient_id, ()))
+            sizes = {recipe_id: len(self._ingredients[recipe_id]) for recipe_id in matched}
+
+        keyed = ((sizes[recipe_id] - count, -count, -recipe_id)
+                for recipe_id, count in matched.items())
+        if limit is None:
+            ranked = sorted(keyed)
+        else:
+            ranked = heapq.nsmallest(limit, keyed)
+        return [(-recipe_id, -count, missing) for missing, count, recipe_id in ranked]
+
+    def usage(self, ingredient_ids):
+        """
+        Return a dict of each of `ingredient_ids` -> the number of recipes
+        using it.
+        """
+        with self._lock:
+            self._ensure_current()
+            return {ingredient_id: len(self._recipes.get(ingredient_id, ()))
+                    for ingredient_id in ingredient_ids}
+
+    def reindex_recipe(self, recipe_id):
+        """
+        Refresh the postings of a single recipe after its measured
+        ingredients changed.
+        """
+        self.reindex_recipes([recipe_id])
+
+    def reindex_recipes(self, recipe_ids):
+        """
+        Refresh the postings of `recipe_ids` after their measured
+        ingredients changed, logged as a single change.
+        """
+        MeasuredIngredient = apps.get_model('recipes', 'MeasuredIngredient')
+        recipe_ids = sorted(set(recipe_ids))
+        if not recipe_ids:
+            return
+        with self._lock:
+            if self._recipes is None:
+                # nothing built yet, the next query loads everything fresh
+                self._bump_generation(recipe_ids)
+                return
+
+            changed = {recipe_id: set() for recipe_id in recipe_ids}
+            rows = MeasuredIngredient.objects.filter(recipe_id__in=recipe_ids) \
+                    .values_list('recipe_id', 'ingredient_id')
+            for recipe_id, ingredient_id in rows.iterator():
+                changed[recipe_id].add(ingredient_id)
+            for recipe_id, ingredient_ids in changed.items():
+                self._update(recipe_id, ingredient_ids)
+            self._bump_generation(recipe_ids)
+
+    def _update(self, recipe_id, new):
+        old = set(self._ingredients.pop(recipe_id, ()))
+        for ingredient_id in old - new:
+            _remove(self._recipes[ingredient_id], recipe_id)
+        for ingredient_id in new - old:
+            insort(self._recipes.setdefault(ingredient_id, array('l')), recipe_id)
+        if new:
+            self._ingredients[recipe_id] = array('l', sorted(new))
+
+    def invalidate(self):
+        """
+        Throw away every process's copy, for changes made without signals
+        such as bulk imports.
+        """
+        with self._lock:
+            self._recipes = None
+            self._bump_generation()
+
+    def _bump_generation(self, recipe_ids=None):
+        # tell other processes their copy is stale and, unless everything
+        # changed, which recipe to re-read. if nobody else changed anything
+        # since our last look ours stays current, otherwise it catches up
+        # with the others' changes on its next use
+        generation = self._shared_generation.bump()
+        if recipe_ids is not None:
+            cache.set(_delta_key(generation), recipe_ids, DELTA_LOG_TIMEOUT)
+        if self._generation is not None and generation == self._generation + 1:
+            self._generation = generation
+
+
+ingredient_index = IngredientIndex()
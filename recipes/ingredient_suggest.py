@@ -0,0 +1,125 @@
+"""
+In-process prefix index over ingredient names, for autocompletion.
+
+The normalized names are kept in one sorted list, so the names starting
+with a prefix are the run between two binary searches, ranked by how many
+recipes use them in the ingredient index. New ingredients are inserted in
+place by the process creating them, other processes reload the names when
+the shared generation counter in the cache has moved on.
+"""
+from bisect import bisect_left
+import heapq
+import threading
+
+from django.apps import apps
+
+from stockpot.db.replicas import primary
+from .generation import SharedGeneration
+from .ingredient_index import ingredient_index
+
+
+GENERATION_KEY = 'ingredient-suggest:generation'
+
+# sorts after anything a name can continue with
+_END = '\U0010ffff'
+
+# prefixes this short match a large share of the names, their suggestions
+# are kept until the names or the ingredient index change
+MEMO_PREFIX_LENGTH = 2
+
+
+class IngredientSuggester(object):
+
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            # sorted names and the id of each
+            self._names = None
+            self._ids = None
+            self._generation = None
+            # (prefix, limit) -> (ingredient index generation, suggestions)
+            self._memo = {}
+            self._shared_generation = SharedGeneration(GENERATION_KEY)
+
+    def _build(self):
+        Ingredient = apps.get_model('recipes', 'Ingredient')
+        generation = self._shared_generation.current()
+        # sorted here, the database's collation may not order like python
+        rows = sorted(Ingredient.objects.values_list('name', 'pk').iterator())
+        self._names = [name for name, pk in rows]
+        self._ids = [pk for name, pk in rows]
+        self._generation = generation
+        self._memo = {}
+
+    def _ensure_current(self):
+        if self._names is None or self._generation != self._shared_generation.current():
+            # a lagging replica would leave the copy stale until the next change
+            with primary():
+                self._build()
+
+    def suggest(self, prefix, limit=10):
+        """
+        Return up to `limit` ingredient names starting with `prefix` (a
+        normalized name), the most used first.
+        """
+        if not prefix:
+            return []
+        with self._lock:
+            self._ensure_current()
+            memo = self._memo
+            if len(prefix) <= MEMO_PREFIX_LENGTH:
+                index_generation = ingredient_index.generation()
+                memoized = memo.get((prefix, limit))
+                if memoized is not None and memoized[0] == index_generation:
+                    return list(memoized[1])
+            start = bisect_left(self._names, prefix)
+            end = bisect_left(self._names, prefix + _END, start)
+            candidates = list(zip(self._names[start:end], self._ids[start:end]))
+
+        usage = ingredient_index.usage([pk for name, pk in candidates])
+        ranked = heapq.nsmallest(limit, candidates,
+                key=lambda candidate: (-usage[candidate[1]], candidate[0]))
+        suggestions = [name for name, pk in ranked]
+        if len(prefix) <= MEMO_PREFIX_LENGTH:
+            # into the memo the names were read with, unless they changed since
+            memo[(prefix, limit)] = (index_generation, suggestions)
+        return list(suggestions)
+
+    def add(self, ingredients):
+        """
+        Insert newly created (name, id) pairs.
+        """
+        with self._lock:
+            self._memo = {}
+            if self._names is not None:
+                for name, pk in ingredients:
+                    i = bisect_left(self._names, name)
+                    if i < len(self._names) and self._names[i] == name:
+                        continue
+                    self._names.insert(i, name)
+                    self._ids.insert(i, pk)
+            self._bump_generation()
+
+    def invalidate(self):
+        """
+        Throw away every process's copy, for renamed or deleted ingredients.
+        """
+        with self._lock:
+            self._names = None
+            self._bump_generation()
+
+    def _bump_generation(self):
+        # tell other processes their copy is stale, if nobody else changed
+        # anything since our last look ours stays current
+        generation = self._shared_generation.bump()
+        if self._generation is not None and generation == self._generation + 1:
+            self._generation = generation
+        else:
+            self._names = None
+
+
+ingredient_suggester = IngredientSuggester()
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import export
+from recipes.api import FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Stream every recipe with its steps and ingredients as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=export.FORMATS, default='ndjson')
+        parser.add_argument('--output', '-o', default='-',
+                help='File to write to, defaults to stdout.')
+        parser.add_argument('--fields', default=','.join(FIELDS),
+                help='Comma separated fields to export: {}.'.format(', '.join(FIELDS)))
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE,
+                help='Recipes loaded per query.')
+
+    def handle(self, *args, **options):
+        fields = {field.strip() for field in options['fields'].split(',') if field.strip()}
+        unknown = fields - set(FIELDS)
+        if unknown:
+            raise CommandError('Unknown fields: {}.'.format(', '.join(sorted(unknown))))
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+
+        lines = export.export_lines(options['format'], fields, options['chunk_size'])
+        if options['output'] == '-':
+            # lines already carry their own line endings
+            self.stdout.ending = ''
+            self._write(lines, self.stdout)
+        else:
+            with open(options['output'], 'w', newline='') as output:
+                self._write(lines, output)
+
+    def _write(self, lines, output):
+        for line in lines:
+            output.write(line)
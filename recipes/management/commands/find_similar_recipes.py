@@ -0,0 +1,58 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from recipes import similarity
+from recipes.models import Recipe
+
+
+def _load_state(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as state:
+        return parse_datetime(json.load(state)['since'])
+
+
+def _save_state(path, since):
+    # write and rename, so a crash never leaves a half written state file
+    with open(path + '.tmp', 'w') as state:
+        json.dump({'since': since.isoformat()}, state)
+    os.replace(path + '.tmp', path)
+
+
+class Command(BaseCommand):
+    help = ('Find and store the most similar recipes of every recipe by ingredient '
+            'overlap, or only of those affected by recipes changed since the last run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbours', type=int, default=similarity.NEIGHBOURS,
+                help='Similar recipes stored per recipe.')
+        parser.add_argument('--workers', type=int, default=1,
+                help='Processes to split the work across.')
+        parser.add_argument('--state',
+                help='File recording when the last run started, a run with the same '
+                     'file only updates what recipes changed since can affect.')
+
+    def handle(self, *args, **options):
+        if options['neighbours'] < 1:
+            raise CommandError('--neighbours must be positive.')
+        if options['workers'] < 1:
+            raise CommandError('--workers must be positive.')
+
+        # taken before reading anything, so changes made during the run are
+        # picked up by the next one
+        started = timezone.now()
+        since = _load_state(options['state'])
+        changed = None
+        if since is not None:
+            changed = list(Recipe.objects.filter(modified__gte=since)
+                    .values_list('pk', flat=True))
+
+        looked_at, updated = similarity.update_similar_recipes(changed,
+                count=options['neighbours'], workers=options['workers'])
+        if options['state']:
+            _save_state(options['state'], started)
+        self.stdout.write(f'Updated the similar recipes of {updated} of {looked_at} recipes.')
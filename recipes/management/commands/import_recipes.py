@@ -0,0 +1,111 @@
+from itertools import islice
+import json
+import multiprocessing
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import importer
+from stockpot.db import close_all_connections
+
+
+def _load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as checkpoint:
+        return json.load(checkpoint)['position']
+
+
+def _save_checkpoint(path, position):
+    # write and rename, so a crash never leaves a half written checkpoint
+    with open(path + '.tmp', 'w') as checkpoint:
+        json.dump({'position': position}, checkpoint)
+    os.replace(path + '.tmp', path)
+
+
+def import_shard(options, shard=0, shards=1):
+    """
+    Import every `shards`th record of the input starting at `shard`,
+    resuming after the last batch this shard recorded in its checkpoint.
+    Returns the number of recipes imported.
+    """
+    checkpoint = options['checkpoint']
+    if checkpoint and shards > 1:
+        checkpoint = f'{checkpoint}.{shard}'
+    position = _load_checkpoint(checkpoint)
+
+    recipe_importer = importer.RecipeImporter(use_copy=options['copy'])
+    path = options['path']
+    stream = sys.stdin if path == '-' else open(path, newline='')
+    imported = 0
+    try:
+        # (index, record) for the records of this shard not imported yet,
+        # picked before decoding so each worker decodes only its own
+        format = options['format']
+        records = ((index, importer.decode_record(raw, format)) for index, raw
+                in enumerate(importer.read_raw_records(stream, format))
+                if index >= position and index % shards == shard)
+        while True:
+            batch = list(islice(records, options['batch_size']))
+            if not batch:
+                break
+            def save_checkpoint():
+                # as soon as the batch is committed, a resume must not import
+                # it again whatever fails after
+                if checkpoint:
+                    _save_checkpoint(checkpoint, batch[-1][0] + 1)
+
+            imported += len(recipe_importer.import_batch((record for index, record in batch),
+                    imported=save_checkpoint))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return imported
+
+
+class Command(BaseCommand):
+    help = ('Bulk load recipes from NDJSON or CSV, in the format export_recipes '
+            'writes, in batched transactions.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, - for stdin.')
+        parser.add_argument('--format', choices=importer.FORMATS,
+                help='Input format, by default guessed from the file extension.')
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE,
+                help='Recipes written per transaction.')
+        parser.add_argument('--copy', action='store_true',
+                help='Load steps and ingredients with COPY (PostgreSQL only).')
+        parser.add_argument('--checkpoint',
+                help='File recording progress after every batch, an interrupted '
+                     'import run again with the same file carries on where it stopped.')
+        parser.add_argument('--workers', type=int, default=1,
+                help='Processes to split the input across.')
+
+    def handle(self, *args, **options):
+        if options['format'] is None:
+            options['format'] = 'csv' if options['path'].endswith('.csv') else 'ndjson'
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        if options['workers'] < 1:
+            raise CommandError('--workers must be positive.')
+        if options['workers'] > 1 and options['path'] == '-':
+            raise CommandError('--workers needs a file, every worker reads the whole input.')
+
+        shard_options = {key: options[key]
+                for key in ('path', 'format', 'batch_size', 'copy', 'checkpoint')}
+        workers = options['workers']
+        try:
+            if workers == 1:
+                imported = import_shard(shard_options)
+            else:
+                # forked workers must open connections of their own
+                close_all_connections()
+                with multiprocessing.Pool(workers) as pool:
+                    imported = sum(pool.starmap(import_shard,
+                            [(shard_options, shard, workers) for shard in range(workers)]))
+        except ValueError as e:
+            # bad records, RecipeImportError or malformed JSON
+            raise CommandError(str(e))
+
+        self.stdout.write(f'Imported {imported} recipes.')
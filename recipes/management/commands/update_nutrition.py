@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import nutrition
+
+
+class Command(BaseCommand):
+    help = ('Recompute the nutrition and cost of every recipe, after the nutrient '
+            'table changed.')
+
+    def handle(self, *args, **options):
+        if not settings.NUTRIENT_TABLE:
+            raise CommandError('NUTRIENT_TABLE is not set.')
+        try:
+            looked_at, changed = nutrition.update_recipes()
+        except nutrition.NutrientTableError as e:
+            # a missing table or bad rows in it
+            raise CommandError(str(e))
+        self.stdout.write(f'Updated the nutrition of {changed} of {looked_at} recipes.')
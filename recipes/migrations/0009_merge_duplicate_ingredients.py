@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def normalize_name(name):
+    # frozen copy of recipes.models.normalize_ingredient_name
+    return ' '.join(name.split()).lower()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    MeasuredIngredient = apps.get_model('recipes', 'MeasuredIngredient')
+    db_alias = schema_editor.connection.alias
+
+    # normalized name -> pks, oldest first
+    groups = {}
+    names = {}
+    ingredients = Ingredient.objects.using(db_alias).order_by('pk').values_list('pk', 'name')
+    for pk, name in ingredients.iterator():
+        groups.setdefault(normalize_name(name), []).append(pk)
+        names[pk] = name
+
+    for name, pks in groups.items():
+        keep, duplicates = pks[0], pks[1:]
+        if duplicates:
+            # repoint every use of a duplicate at the oldest ingredient
+            MeasuredIngredient.objects.using(db_alias).filter(
+                    ingredient_id__in=duplicates).update(ingredient_id=keep)
+            Ingredient.objects.using(db_alias).filter(pk__in=duplicates).delete()
+        if names[keep] != name:
+            Ingredient.objects.using(db_alias).filter(pk=keep).update(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_auto_20171226_1607'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 09:07
+from __future__ import unicode_literals
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+BACKFILL_BATCH_SIZE = 10000
+
+# frozen copy of recipes.models.UPDATE_SEARCH_VECTORS_SQL, by pk range
+BACKFILL_SQL = '''
+    UPDATE recipes_recipe AS r SET search_vector =
+        setweight(to_tsvector('english', coalesce(r.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM recipes_measuredingredient AS mi
+            JOIN recipes_ingredient AS i ON i.id = mi.ingredient_id
+            WHERE mi.recipe_id = r.id), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(s.body, ' ')
+            FROM recipes_recipestep AS s
+            WHERE s.recipe_id = r.id), '')), 'C')
+    WHERE r.id >= %s AND r.id < %s
+'''
+
+
+def create_search_index(apps, schema_editor):
+    # text search vectors and GIN indexes only exist on postgres, other
+    # databases use the LIKE fallback in RecipeQuerySet.search
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT coalesce(max(id), 0) FROM recipes_recipe')
+        max_pk = cursor.fetchone()[0]
+        for start in range(0, max_pk + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(BACKFILL_SQL, [start, start + BACKFILL_BATCH_SIZE])
+
+    schema_editor.execute(
+            'CREATE INDEX recipes_recipe_search_vector_gin '
+            'ON recipes_recipe USING gin (search_vector)')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('DROP INDEX IF EXISTS recipes_recipe_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_ingredient_name_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 14:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_BATCH_SIZE = 10000
+
+BACKFILL_SQL = '''
+    INSERT INTO recipes_recipesummary
+        (recipe_id, title, author_username, step_count, ingredient_count)
+    SELECT r.id, r.title, coalesce(u.username, ''),
+        (SELECT count(*) FROM recipes_recipestep AS s WHERE s.recipe_id = r.id),
+        (SELECT count(*) FROM recipes_measuredingredient AS mi WHERE mi.recipe_id = r.id)
+    FROM recipes_recipe AS r
+    LEFT JOIN users_profile AS p ON p.id = r.author_id
+    LEFT JOIN auth_user AS u ON u.id = p.user_id
+    WHERE r.id >= %s AND r.id < %s
+'''
+
+# frozen copy of the functions and triggers recipes.summary_triggers
+# installed along with the table, the current ones are recreated after migrate
+# (function, definition)
+POSTGRESQL_FUNCTIONS = [
+    ('recipes_summary_insert_recipes()', '''
+    CREATE OR REPLACE FUNCTION recipes_summary_insert_recipes() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO recipes_recipesummary
+            (recipe_id, title, author_username, step_count, ingredient_count)
+        SELECT r.id, r.title, coalesce(u.username, ''), 0, 0
+        FROM changed_rows AS r
+        LEFT JOIN users_profile AS p ON p.id = r.author_id
+        LEFT JOIN auth_user AS u ON u.id = p.user_id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    '''),
+    ('recipes_summary_update_recipe()', '''
+    CREATE OR REPLACE FUNCTION recipes_summary_update_recipe() RETURNS trigger AS $$
+    BEGIN
+        IF (OLD.title, OLD.author_id) IS DISTINCT FROM (NEW.title, NEW.author_id) THEN
+            UPDATE recipes_recipesummary
+            SET title = NEW.title, author_username = coalesce((
+                SELECT u.username FROM users_profile AS p
+                JOIN auth_user AS u ON u.id = p.user_id
+                WHERE p.id = NEW.author_id), '')
+            WHERE recipe_id = NEW.id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    '''),
+    ('recipes_summary_count_children()', '''
+    CREATE OR REPLACE FUNCTION recipes_summary_count_children() RETURNS trigger AS $$
+    BEGIN
+        -- TG_ARGV[0] is the summary column counting the table's rows
+        EXECUTE format('UPDATE recipes_recipesummary AS s SET %1$I = s.%1$I %2$s c.n '
+            'FROM (SELECT recipe_id, count(*) AS n FROM changed_rows GROUP BY recipe_id) AS c '
+            'WHERE s.recipe_id = c.recipe_id',
+            TG_ARGV[0], CASE TG_OP WHEN 'INSERT' THEN '+' ELSE '-' END);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    '''),
+    ('recipes_summary_move_child()', '''
+    CREATE OR REPLACE FUNCTION recipes_summary_move_child() RETURNS trigger AS $$
+    BEGIN
+        IF OLD.recipe_id IS DISTINCT FROM NEW.recipe_id THEN
+            EXECUTE format('UPDATE recipes_recipesummary SET %1$I = %1$I - 1 '
+                'WHERE recipe_id = $1', TG_ARGV[0]) USING OLD.recipe_id;
+            EXECUTE format('UPDATE recipes_recipesummary SET %1$I = %1$I + 1 '
+                'WHERE recipe_id = $1', TG_ARGV[0]) USING NEW.recipe_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    '''),
+    ('recipes_summary_rename_author()', '''
+    CREATE OR REPLACE FUNCTION recipes_summary_rename_author() RETURNS trigger AS $$
+    BEGIN
+        IF OLD.username IS DISTINCT FROM NEW.username THEN
+            UPDATE recipes_recipesummary AS s SET author_username = NEW.username
+            FROM recipes_recipe AS r JOIN users_profile AS p ON p.id = r.author_id
+            WHERE p.user_id = NEW.id AND s.recipe_id = r.id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    '''),
+]
+
+# (trigger, table, definition)
+POSTGRESQL_TRIGGERS = [
+    ('recipes_summary_insert', 'recipes_recipe',
+        'AFTER INSERT ON recipes_recipe REFERENCING NEW TABLE AS changed_rows '
+        'FOR EACH STATEMENT EXECUTE PROCEDURE recipes_summary_insert_recipes()'),
+    ('recipes_summary_update', 'recipes_recipe',
+        'AFTER UPDATE OF title, author_id ON recipes_recipe '
+        'FOR EACH ROW EXECUTE PROCEDURE recipes_summary_update_recipe()'),
+    ('recipes_summary_rename', 'auth_user',
+        'AFTER UPDATE OF username ON auth_user '
+        'FOR EACH ROW EXECUTE PROCEDURE recipes_summary_rename_author()'),
+    ('recipes_summary_insert', 'recipes_recipestep',
+        'AFTER INSERT ON recipes_recipestep REFERENCING NEW TABLE AS changed_rows '
+        "FOR EACH STATEMENT EXECUTE PROCEDURE recipes_summary_count_children('step_count')"),
+    ('recipes_summary_delete', 'recipes_recipestep',
+        'AFTER DELETE ON recipes_recipestep REFERENCING OLD TABLE AS changed_rows '
+        "FOR EACH STATEMENT EXECUTE PROCEDURE recipes_summary_count_children('step_count')"),
+    ('recipes_summary_move', 'recipes_recipestep',
+        'AFTER UPDATE OF recipe_id ON recipes_recipestep '
+        "FOR EACH ROW EXECUTE PROCEDURE recipes_summary_move_child('step_count')"),
+    ('recipes_summary_insert', 'recipes_measuredingredient',
+        'AFTER INSERT ON recipes_measuredingredient REFERENCING NEW TABLE AS changed_rows '
+        "FOR EACH STATEMENT EXECUTE PROCEDURE recipes_summary_count_children('ingredient_count')"),
+    ('recipes_summary_delete', 'recipes_measuredingredient',
+        'AFTER DELETE ON recipes_measuredingredient REFERENCING OLD TABLE AS changed_rows '
+        "FOR EACH STATEMENT EXECUTE PROCEDURE recipes_summary_count_children('ingredient_count')"),
+    ('recipes_summary_move', 'recipes_measuredingredient',
+        'AFTER UPDATE OF recipe_id ON recipes_measuredingredient '
+        "FOR EACH ROW EXECUTE PROCEDURE recipes_summary_move_child('ingredient_count')"),
+]
+
+# (trigger, definition)
+SQLITE_TRIGGERS = [
+    ('recipes_summary_recipe_insert', '''
+        AFTER INSERT ON recipes_recipe BEGIN
+            INSERT INTO recipes_recipesummary
+                (recipe_id, title, author_username, step_count, ingredient_count)
+            VALUES (NEW.id, NEW.title, coalesce((
+                SELECT u.username FROM users_profile AS p
+                JOIN auth_user AS u ON u.id = p.user_id
+                WHERE p.id = NEW.author_id), ''), 0, 0);
+        END'''),
+    ('recipes_summary_recipe_update', '''
+        AFTER UPDATE OF title, author_id ON recipes_recipe
+        WHEN OLD.title IS NOT NEW.title OR OLD.author_id IS NOT NEW.author_id BEGIN
+            UPDATE recipes_recipesummary SET title = NEW.title, author_username = coalesce((
+                SELECT u.username FROM users_profile AS p
+                JOIN auth_user AS u ON u.id = p.user_id
+                WHERE p.id = NEW.author_id), '')
+            WHERE recipe_id = NEW.id;
+        END'''),
+    ('recipes_summary_user_rename', '''
+        AFTER UPDATE OF username ON auth_user WHEN OLD.username IS NOT NEW.username BEGIN
+            UPDATE recipes_recipesummary SET author_username = NEW.username
+            WHERE recipe_id IN (
+                SELECT r.id FROM recipes_recipe AS r
+                JOIN users_profile AS p ON p.id = r.author_id
+                WHERE p.user_id = NEW.id);
+        END'''),
+    ('recipes_summary_recipes_recipestep_insert', '''
+        AFTER INSERT ON recipes_recipestep BEGIN
+            UPDATE recipes_recipesummary SET step_count = step_count + 1
+            WHERE recipe_id = NEW.recipe_id;
+        END'''),
+    ('recipes_summary_recipes_recipestep_delete', '''
+        AFTER DELETE ON recipes_recipestep BEGIN
+            UPDATE recipes_recipesummary SET step_count = step_count - 1
+            WHERE recipe_id = OLD.recipe_id;
+        END'''),
+    ('recipes_summary_recipes_recipestep_move', '''
+        AFTER UPDATE OF recipe_id ON recipes_recipestep WHEN OLD.recipe_id IS NOT NEW.recipe_id BEGIN
+            UPDATE recipes_recipesummary SET step_count = step_count - 1
+            WHERE recipe_id = OLD.recipe_id;
+            UPDATE recipes_recipesummary SET step_count = step_count + 1
+            WHERE recipe_id = NEW.recipe_id;
+        END'''),
+    ('recipes_summary_recipes_measuredingredient_insert', '''
+        AFTER INSERT ON recipes_measuredingredient BEGIN
+            UPDATE recipes_recipesummary SET ingredient_count = ingredient_count + 1
+            WHERE recipe_id = NEW.recipe_id;
+        END'''),
+    ('recipes_summary_recipes_measuredingredient_delete', '''
+        AFTER DELETE ON recipes_measuredingredient BEGIN
+            UPDATE recipes_recipesummary SET ingredient_count = ingredient_count - 1
+            WHERE recipe_id = OLD.recipe_id;
+        END'''),
+    ('recipes_summary_recipes_measuredingredient_move', '''
+        AFTER UPDATE OF recipe_id ON recipes_measuredingredient WHEN OLD.recipe_id IS NOT NEW.recipe_id BEGIN
+            UPDATE recipes_recipesummary SET ingredient_count = ingredient_count - 1
+            WHERE recipe_id = OLD.recipe_id;
+            UPDATE recipes_recipesummary SET ingredient_count = ingredient_count + 1
+            WHERE recipe_id = NEW.recipe_id;
+        END'''),
+]
+
+
+def install_triggers(apps, schema_editor):
+    # before the backfill, so summaries are kept from the moment the table
+    # is filled rather than only once migrate finishes
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = [definition for function, definition in POSTGRESQL_FUNCTIONS]
+        for name, table, definition in POSTGRESQL_TRIGGERS:
+            statements.append(f'DROP TRIGGER IF EXISTS {name} ON {table}')
+            statements.append(f'CREATE TRIGGER {name} {definition}')
+    elif vendor == 'sqlite':
+        statements = []
+        for name, definition in SQLITE_TRIGGERS:
+            statements.append(f'DROP TRIGGER IF EXISTS {name}')
+            statements.append(f'CREATE TRIGGER {name} {definition}')
+    else:
+        raise NotImplementedError(f'Recipe summary triggers are not available on {vendor}.')
+    # without parameters, the function bodies are full of %
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def backfill_summaries(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT coalesce(max(id), 0) FROM recipes_recipe')
+        max_pk = cursor.fetchone()[0]
+        for start in range(0, max_pk + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(BACKFILL_SQL, [start, start + BACKFILL_BATCH_SIZE])
+
+
+def drop_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for name, table, definition in POSTGRESQL_TRIGGERS:
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {name} ON {table}')
+        for function, definition in POSTGRESQL_FUNCTIONS:
+            schema_editor.execute(f'DROP FUNCTION IF EXISTS {function}')
+    elif vendor == 'sqlite':
+        for name, definition in SQLITE_TRIGGERS:
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_profile_modified'),
+        ('recipes', '0012_recipe_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSummary',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='recipes.Recipe')),
+                ('title', models.TextField(default='')),
+                ('author_username', models.CharField(blank=True, max_length=150)),
+                ('step_count', models.PositiveIntegerField(default=0)),
+                ('ingredient_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(install_triggers, drop_triggers),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
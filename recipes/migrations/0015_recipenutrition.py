@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 15:25
+from __future__ import unicode_literals
+
+from importlib import import_module
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# the triggers as 0013 froze them, the current ones are recreated after migrate
+recipesummary = import_module('recipes.migrations.0013_recipesummary')
+
+
+def drop_sqlite_summary_triggers(apps, schema_editor):
+    # SQLite rebuilds the tables the fields are added to, which the recipe
+    # summary triggers refer to or would be lost with
+    if schema_editor.connection.vendor == 'sqlite':
+        recipesummary.drop_triggers(apps, schema_editor)
+
+
+def install_sqlite_summary_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        recipesummary.install_triggers(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_sqlite_summary_triggers, install_sqlite_summary_triggers),
+        migrations.CreateModel(
+            name='RecipeNutrition',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='nutrition', serialize=False, to='recipes.Recipe')),
+                ('calories', models.FloatField()),
+                ('protein', models.FloatField()),
+                ('fat', models.FloatField()),
+                ('carbohydrate', models.FloatField()),
+                ('cost', models.FloatField()),
+                ('complete', models.BooleanField(default=True)),
+                ('computed', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='servings',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(install_sqlite_summary_triggers, drop_sqlite_summary_triggers),
+    ]
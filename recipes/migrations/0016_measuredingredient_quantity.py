@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 16:10
+from __future__ import unicode_literals
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+BACKFILL_BATCH_SIZE = 10000
+
+# frozen copy of recipes.units.UNITS, code -> (dimension, size in the base unit)
+UNITS = {
+    'c': ('volume', '236.5882365'),
+    'tbsp': ('volume', '14.78676478125'),
+    'tsp': ('volume', '4.92892159375'),
+    'ml': ('volume', '1'),
+    'l': ('volume', '1000'),
+    'g': ('mass', '1'),
+    'kg': ('mass', '1000'),
+    'oz': ('mass', '28.349523125'),
+    'lb': ('mass', '453.59237'),
+    '': ('count', '1'),
+}
+
+# unknown units get no quantity, the CASE without a match is null
+BACKFILL_SQL = '''
+    UPDATE recipes_measuredingredient SET
+        quantity = round(amount * CASE units {sizes} END, 3),
+        dimension = CASE units {dimensions} ELSE '' END
+    WHERE id >= %s AND id < %s
+'''.format(
+    sizes=' '.join(f"WHEN '{code}' THEN {size}" for code, (dimension, size) in UNITS.items()),
+    dimensions=' '.join(f"WHEN '{code}' THEN '{dimension}'"
+        for code, (dimension, size) in UNITS.items()))
+
+
+def backfill_quantities(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT coalesce(max(id), 0) FROM recipes_measuredingredient')
+        max_pk = cursor.fetchone()[0]
+        for start in range(0, max_pk + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(BACKFILL_SQL, [start, start + BACKFILL_BATCH_SIZE])
+
+# the triggers as 0013 froze them, the current ones are recreated after migrate
+recipesummary = import_module('recipes.migrations.0013_recipesummary')
+
+
+def drop_sqlite_summary_triggers(apps, schema_editor):
+    # SQLite rebuilds the tables the fields are added to, which the recipe
+    # summary triggers refer to or would be lost with
+    if schema_editor.connection.vendor == 'sqlite':
+        recipesummary.drop_triggers(apps, schema_editor)
+
+
+def install_sqlite_summary_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        recipesummary.install_triggers(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipenutrition'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_sqlite_summary_triggers, install_sqlite_summary_triggers),
+        migrations.AddField(
+            model_name='measuredingredient',
+            name='dimension',
+            field=models.CharField(blank=True, choices=[('volume', 'volume'), ('mass', 'mass'), ('count', 'count')], editable=False, max_length=6),
+        ),
+        migrations.AddField(
+            model_name='measuredingredient',
+            name='quantity',
+            field=models.DecimalField(decimal_places=3, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AlterField(
+            model_name='measuredingredient',
+            name='units',
+            field=models.CharField(blank=True, choices=[('c', 'cup'), ('tbsp', 'tablespoon'), ('tsp', 'teaspoon'), ('ml', 'millilitre'), ('l', 'litre'), ('g', 'gram'), ('kg', 'kilogram'), ('oz', 'ounce'), ('lb', 'pound')], max_length=128),
+        ),
+        # before the index, so the backfill doesn't maintain it row by row
+        migrations.RunPython(backfill_quantities, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='measuredingredient',
+            index=models.Index(fields=['ingredient', 'dimension', 'quantity'], name='recipes_mea_ingredi_c14d1d_idx'),
+        ),
+        migrations.RunPython(install_sqlite_summary_triggers, drop_sqlite_summary_triggers),
+    ]
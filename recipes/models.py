@@ -1,16 +1,222 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField, SearchQuery, SearchRank
+from django.db import models, connections, router, transaction, IntegrityError
+from django.db.models import Count, F, Q, Sum
+from django.db.models.signals import (
+        pre_delete, post_init, post_save, post_delete, post_migrate)
+from django.utils import timezone
+from django.dispatch import receiver
 
+from stockpot import page_cache
 from users.models import Profile
+from . import fragments, nutrition, summary_triggers, units as unit_registry
+from .ingredient_index import ingredient_index
+from .ingredient_suggest import ingredient_suggester
+
+
+def normalize_ingredient_name(name):
+    """
+    Return the key an ingredient is stored under: lowercased, with runs of
+    whitespace collapsed to a single space.
+    """
+    return ' '.join(name.split()).lower()
+
 
 # Create your models here.
+class IngredientManager(models.Manager):
+
+
+    def resolve(self, names):
+        """
+        Return a dict mapping each of `names` (normalized) to its Ingredient.
+
+        Existing ingredients are fetched in one query and the missing ones
+        are created with a single insert. Names created concurrently by
+        another writer are picked up rather than duplicated.
+        """
+        names = {normalize_ingredient_name(name) for name in names}
+        ingredients = {ing.name: ing for ing in self.filter(name__in=names)}
+
+        missing = names - set(ingredients)
+        if missing:
+            # self.db is where reads go, which may be a replica
+            using = self._db or router.db_for_write(self.model)
+            self._insert_missing(missing, using)
+            created = {ing.name: ing
+                    for ing in self.db_manager(using).filter(name__in=missing)}
+            ingredients.update(created)
+            # inserted without signals
+            added = [(name, ing.pk) for name, ing in created.items()]
+            transaction.on_commit(lambda: ingredient_suggester.add(added), using=using)
+
+        return ingredients
+
+    def _insert_missing(self, names, using):
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            # let the unique index settle races inside the database
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'INSERT INTO {} (name) SELECT unnest(%s::varchar[]) '
+                    'ON CONFLICT (name) DO NOTHING'.format(self.model._meta.db_table),
+                    [sorted(names)])
+            return
+
+        manager = self.db_manager(using)
+        try:
+            with transaction.atomic(using=using):
+                manager.bulk_create([self.model(name=name) for name in names])
+        except IntegrityError:
+            # another writer created some of these first, fall back to
+            # get_or_create which retries the lookup on conflict
+            for name in names:
+                manager.get_or_create(name=name)
+
+
 class Ingredient(models.Model):
-    name = models.CharField(max_length=128, default='')
+    name = models.CharField(max_length=128, unique=True)
+
+    objects = IngredientManager()
+
+    def save(self, *args, **kwargs):
+        self.name = normalize_ingredient_name(self.name)
+        super(Ingredient, self).save(*args, **kwargs)
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    # postgres text search configuration used to build and query the
+    # search vectors
+    SEARCH_CONFIG = 'english'
+
+    def search(self, query):
+        """
+        Filter to recipes matching `query` in their title, steps or
+        ingredient names, best matches first.
+
+        On PostgreSQL this ranks against the stored, GIN indexed search
+        vector. Other databases fall back to a LIKE match on every term.
+        """
+        if connections[self.db].vendor == 'postgresql':
+            search_query = SearchQuery(query, config=self.SEARCH_CONFIG)
+            return self.annotate(rank=SearchRank(F('search_vector'), search_query)) \
+                    .filter(search_vector=search_query).order_by('-rank', '-pk')
+
+        queryset = self
+        for term in query.split():
+            queryset = queryset.filter(
+                    Q(title__icontains=term) |
+                    Q(pk__in=RecipeStep.objects.filter(body__icontains=term)
+                        .values('recipe_id')) |
+                    Q(pk__in=MeasuredIngredient.objects.filter(ingredient__name__icontains=term)
+                        .values('recipe_id')))
+        return queryset.order_by('-pk')
+
+    def update_search_vectors(self):
+        """
+        Rebuild the stored search vector of every recipe in this queryset
+        from its title (weighted highest), ingredient names and steps.
+        Does nothing on databases other than PostgreSQL.
+        """
+        connection = connections[self.db]
+        if connection.vendor != 'postgresql':
+            return
+
+        pks = list(self.values_list('pk', flat=True))
+        if not pks:
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute(UPDATE_SEARCH_VECTORS_SQL,
+                    [self.SEARCH_CONFIG] * 3 + [pks])
+
+    def using_ingredient(self, name, units, less_than=None, at_least=None):
+        """
+        Filter to recipes using the ingredient called `name` measured in
+        the dimension of `units`, in total less than and at least the
+        given amounts of `units` when those are given.
+        """
+        unit = unit_registry.get(units)
+        if unit is None:
+            raise ValueError(f'Unknown unit {units!r}.')
+        quantities = {f'total__{bound}': unit_registry.canonical(amount, units)[0]
+                for bound, amount in (('lt', less_than), ('gte', at_least)) if amount is not None}
+
+        # served by the (ingredient, dimension, quantity) index
+        used = MeasuredIngredient.objects.filter(
+                ingredient__name=normalize_ingredient_name(name), dimension=unit.dimension) \
+                .values('recipe_id').annotate(total=Sum('quantity')).filter(**quantities)
+        return self.filter(pk__in=used.values('recipe_id'))
+
+
+class RecipeManager(models.Manager.from_queryset(RecipeQuerySet)):
+
+
+    def get_queryset(self):
+        # the search vector is only ever read inside the database, don't
+        # ship it to python with every recipe
+        return super(RecipeManager, self).get_queryset().defer('search_vector')
 
 
 class Recipe(models.Model):
     title = models.TextField(default='')
     author = models.ForeignKey(Profile, related_name='recipes', null=True)
     ingredients = models.ManyToManyField(Ingredient, through='MeasuredIngredient')
+    search_vector = SearchVectorField(null=True, editable=False)
+    modified = models.DateTimeField(auto_now=True)
+    servings = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    objects = RecipeManager()
+
+
+class RecipeSummary(models.Model):
+    """
+    What the recipe lists show of a recipe, one narrow row per recipe kept
+    current by the database triggers in summary_triggers. Shares the
+    recipe's primary key, so the feed pages through it like the recipes.
+    """
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE, primary_key=True,
+            related_name='summary')
+    title = models.TextField(default='')
+    author_username = models.CharField(max_length=150, blank=True)
+    step_count = models.PositiveIntegerField(default=0)
+    ingredient_count = models.PositiveIntegerField(default=0)
+
+
+class SimilarRecipe(models.Model):
+    """
+    One of a recipe's nearest neighbours by ingredient overlap, as last
+    found by the find_similar_recipes command.
+    """
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='similar_recipes')
+    similar = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='+')
+    # Jaccard similarity of the two ingredient sets
+    similarity = models.FloatField()
+    computed = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('recipe', 'similar')
+
+
+class RecipeNutrition(models.Model):
+    """
+    A recipe's nutrition and cost, summed from its ingredients and the
+    nutrient table by recipes.nutrition.
+    """
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE, primary_key=True,
+            related_name='nutrition')
+    calories = models.FloatField()
+    # grams
+    protein = models.FloatField()
+    fat = models.FloatField()
+    carbohydrate = models.FloatField()
+    cost = models.FloatField()
+    # whether every ingredient was in the table, in units it converts from
+    complete = models.BooleanField(default=True)
+    computed = models.DateTimeField()
+
+    def per_serving(self):
+        servings = self.recipe.servings or 1
+        return {nutrient: getattr(self, nutrient) / servings for nutrient in nutrition.NUTRIENTS}
 
 
 class RecipeStep(models.Model):
@@ -18,10 +224,220 @@ class RecipeStep(models.Model):
     recipe = models.ForeignKey(Recipe, related_name='steps', null=True)
 
 
+class MeasuredIngredientQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # save() isn't called for these
+        objs = list(objs)
+        for obj in objs:
+            obj.set_quantity()
+        return super(MeasuredIngredientQuerySet, self).bulk_create(objs, *args, **kwargs)
+
+    def totals(self):
+        """
+        Sum the quantities in this queryset per ingredient and dimension,
+        as dicts of ingredient_id, ingredient__name, dimension, total (in
+        the dimension's base unit) and recipes (how many use it).
+        """
+        return self.exclude(quantity=None).order_by() \
+                .values('ingredient_id', 'ingredient__name', 'dimension') \
+                .annotate(total=Sum('quantity'), recipes=Count('recipe_id', distinct=True)) \
+                .order_by('ingredient__name', 'dimension')
+
+
 class MeasuredIngredient(models.Model):
-    UNIT_CHOICES = (('c', 'cup'),)
+    UNIT_CHOICES = unit_registry.UNIT_CHOICES
 
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
     amount = models.DecimalField(default=0, max_digits=6, decimal_places=3)
     units = models.CharField(max_length=128, choices=UNIT_CHOICES, blank=True)
+    # the amount in its dimension's base unit (millilitres, grams or
+    # items), kept in step with amount and units, none for unknown units
+    quantity = models.DecimalField(max_digits=12, decimal_places=3, null=True, editable=False)
+    dimension = models.CharField(max_length=6, choices=unit_registry.DIMENSION_CHOICES,
+            blank=True, editable=False)
+
+    objects = models.Manager.from_queryset(MeasuredIngredientQuerySet)()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ingredient', 'dimension', 'quantity']),
+        ]
+
+    def set_quantity(self):
+        self.quantity, self.dimension = unit_registry.canonical(self.amount, self.units)
+
+    def save(self, *args, **kwargs):
+        self.set_quantity()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'amount', 'units'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'quantity', 'dimension'}
+        super(MeasuredIngredient, self).save(*args, **kwargs)
+
+
+UPDATE_SEARCH_VECTORS_SQL = '''
+    UPDATE recipes_recipe AS r SET search_vector =
+        setweight(to_tsvector(%s::regconfig, coalesce(r.title, '')), 'A') ||
+        setweight(to_tsvector(%s::regconfig, coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM recipes_measuredingredient AS mi
+            JOIN recipes_ingredient AS i ON i.id = mi.ingredient_id
+            WHERE mi.recipe_id = r.id), '')), 'B') ||
+        setweight(to_tsvector(%s::regconfig, coalesce((
+            SELECT string_agg(s.body, ' ')
+            FROM recipes_recipestep AS s
+            WHERE s.recipe_id = r.id), '')), 'C')
+    WHERE r.id = ANY(%s)
+'''
+
+
+# drop cached recipe.html fragments whenever anything they render changes
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_fragments(sender, instance, **kwargs):
+    fragments.invalidate(instance.pk)
+
+@receiver(post_save, sender=RecipeStep)
+@receiver(post_delete, sender=RecipeStep)
+@receiver(post_save, sender=MeasuredIngredient)
+@receiver(post_delete, sender=MeasuredIngredient)
+def invalidate_parent_recipe_fragments(sender, instance, **kwargs):
+    fragments.invalidate(instance.recipe_id)
+
+@receiver(pre_delete, sender=Recipe)
+def invalidate_similar_recipe_fragments(sender, instance, **kwargs):
+    # the recipes listing it as similar link to it
+    fragments.invalidate(*SimilarRecipe.objects.filter(similar=instance)
+            .values_list('recipe_id', flat=True))
+
+# the title a recipe was loaded with, read from __dict__ so a deferred title
+# isn't fetched
+@receiver(post_init, sender=Recipe)
+def remember_recipe_title(sender, instance, **kwargs):
+    instance._loaded_title = instance.__dict__.get('title')
+
+@receiver(post_save, sender=Recipe)
+def invalidate_renamed_similar_recipe_fragments(sender, instance, created, **kwargs):
+    # the recipes listing it as similar show its title
+    loaded_title = getattr(instance, '_loaded_title', None)
+    if not created and loaded_title is not None and loaded_title != instance.title:
+        pks = list(SimilarRecipe.objects.filter(similar=instance)
+                .values_list('recipe_id', flat=True))
+        fragments.invalidate(*pks)
+        page_cache.purge(*[f'recipe:{pk}' for pk in pks])
+    instance._loaded_title = instance.title
+
+@receiver(post_save, sender=Profile)
+def invalidate_author_recipe_fragments(sender, instance, **kwargs):
+    fragments.invalidate(*instance.recipes.values_list('pk', flat=True))
+
+
+# and the anonymous pages built from them, every recipe shows on the feed
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def purge_recipe_pages(sender, instance, **kwargs):
+    page_cache.purge('recipes', f'recipe:{instance.pk}')
+
+@receiver(post_save, sender=RecipeStep)
+@receiver(post_delete, sender=RecipeStep)
+@receiver(post_save, sender=MeasuredIngredient)
+@receiver(post_delete, sender=MeasuredIngredient)
+def purge_parent_recipe_pages(sender, instance, **kwargs):
+    page_cache.purge('recipes', f'recipe:{instance.recipe_id}')
+
+@receiver(pre_delete, sender=Recipe)
+def purge_similar_recipe_pages(sender, instance, **kwargs):
+    page_cache.purge(*[f'recipe:{pk}' for pk in SimilarRecipe.objects
+        .filter(similar=instance).values_list('recipe_id', flat=True)])
+
+@receiver(post_save, sender=Profile)
+def purge_author_recipe_pages(sender, instance, **kwargs):
+    page_cache.purge('recipes',
+            *[f'recipe:{pk}' for pk in instance.recipes.values_list('pk', flat=True)])
+
+
+# a recipe's modification time covers its steps and ingredients
+@receiver(post_save, sender=RecipeStep)
+@receiver(post_delete, sender=RecipeStep)
+@receiver(post_save, sender=MeasuredIngredient)
+@receiver(post_delete, sender=MeasuredIngredient)
+def touch_parent_recipe(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).update(modified=timezone.now())
+
+
+# the stored search vectors, this process's ingredient -> recipes index (and
+# through it the other processes') and the stored nutrition are refreshed
+# once the changes are committed, so they see the recipes' final steps and
+# ingredients. every recipe a transaction changes is refreshed by a single
+# callback, however many of its rows are saved, and recipe saves cover the
+# rows save_recipe inserts in bulk without signals
+class _PendingRefreshes(object):
+
+
+    def __init__(self, using, hooks):
+        self.using = using
+        # the connection's on_commit hooks when this was queued
+        self.hooks = hooks
+        self.search_vectors = set()
+        self.ingredients = set()
+
+    def run(self):
+        Recipe.objects.db_manager(self.using).filter(pk__in=self.search_vectors) \
+                .update_search_vectors()
+        if self.ingredients:
+            ingredient_index.reindex_recipes(self.ingredients)
+            nutrition.refresh_recipes(sorted(self.ingredients), using=self.using)
+
+
+def _refresh_on_commit(recipe_id, using, ingredients=True):
+    connection = transaction.get_connection(using)
+    pending = getattr(connection, '_pending_recipe_refreshes', None)
+    # the hooks are a new list once the transaction commits or a savepoint
+    # rolls back, which may have dropped the queued callback
+    queue = (not connection.in_atomic_block or pending is None
+            or pending.hooks is not connection.run_on_commit)
+    if queue:
+        pending = _PendingRefreshes(using, connection.run_on_commit)
+        connection._pending_recipe_refreshes = pending
+    pending.search_vectors.add(recipe_id)
+    if ingredients:
+        pending.ingredients.add(recipe_id)
+    if queue:
+        # runs right away outside a transaction
+        transaction.on_commit(pending.run, using=using)
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=MeasuredIngredient)
+@receiver(post_delete, sender=MeasuredIngredient)
+def refresh_recipe(sender, instance, using, **kwargs):
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    _refresh_on_commit(recipe_id, using)
+
+@receiver(post_save, sender=RecipeStep)
+@receiver(post_delete, sender=RecipeStep)
+def refresh_recipe_search_vector(sender, instance, using, **kwargs):
+    _refresh_on_commit(instance.recipe_id, using, ingredients=False)
+
+
+# the names offered by ingredient autocompletion
+@receiver(post_save, sender=Ingredient)
+def suggest_ingredient(sender, instance, created, **kwargs):
+    if created:
+        added = [(instance.name, instance.pk)]
+        transaction.on_commit(lambda: ingredient_suggester.add(added))
+    else:
+        transaction.on_commit(ingredient_suggester.invalidate)
+
+@receiver(post_delete, sender=Ingredient)
+def forget_ingredient_suggestion(sender, instance, **kwargs):
+    transaction.on_commit(ingredient_suggester.invalidate)
+
+
+# the summaries are written by triggers, created by migration 0013 and
+# recreated after every migrate, as migrations that make SQLite rebuild a
+# table they refer to drop them first
+@receiver(post_migrate)
+def install_recipe_summary_triggers(sender, using, **kwargs):
+    if sender.label == 'recipes':
+        summary_triggers.install(connections[using])
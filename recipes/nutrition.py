@@ -0,0 +1,268 @@
+"""
+Calories, macros and cost of recipes, from a local nutrient table.
+
+The table (settings.NUTRIENT_TABLE) is a CSV file giving, per ingredient
+name, the nutrient values of one unit of that ingredient. A recipe's
+totals are the sum over its ingredients of their stored canonical
+quantity times the ingredient's values per base unit of that dimension.
+The database sums them for CHUNK_SIZE recipes at a time in one grouped
+query, given the vectors of the distinct (ingredient, dimension) pairs the
+chunk uses, so the rows never reach Python and the whole catalog is
+recomputed in a single pass after the table changes.
+
+Totals are stored in RecipeNutrition, recomputed for a recipe whenever its
+ingredients change and for every recipe by the update_nutrition command.
+The table is read and checked once, and again only when the file changes.
+"""
+import csv
+import logging
+import math
+import os
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from stockpot import page_cache
+from stockpot.db import copy_rows
+from . import fragments, units as unit_registry
+
+
+NUTRIENTS = ('calories', 'protein', 'fat', 'carbohydrate', 'cost')
+
+# recipes whose nutrition is read and written at a time
+CHUNK_SIZE = 10000
+
+# the totals of a chunk of recipes, the vectors are inlined as they are only
+# ids, finite numbers and the unit registry's dimensions
+TOTALS_SQL = '''
+    WITH vectors (ingredient_id, dimension, {nutrients}) AS (VALUES {vectors})
+    SELECT mi.recipe_id, {sums},
+        min(CASE WHEN v.ingredient_id IS NULL OR mi.quantity IS NULL THEN 0 ELSE 1 END)
+    FROM recipes_measuredingredient AS mi
+    LEFT JOIN vectors AS v
+        ON v.ingredient_id = mi.ingredient_id AND v.dimension = mi.dimension
+    WHERE {where}
+    GROUP BY mi.recipe_id
+'''.format(nutrients=', '.join(NUTRIENTS), vectors='{vectors}', where='{where}',
+    sums=', '.join(f'coalesce(sum(CAST(mi.quantity AS DOUBLE PRECISION) * v.{nutrient}), 0)'
+        for nutrient in NUTRIENTS))
+
+logger = logging.getLogger(__name__)
+
+
+class NutrientTableError(ValueError):
+    pass
+
+
+class NutrientTable(object):
+    """
+    Nutrient values per normalized ingredient name, read from CSV with a
+    `name` and a `unit` column and a column for each of NUTRIENTS.
+    """
+
+    def __init__(self, entries):
+        # name -> (unit, values in NUTRIENTS order)
+        self.entries = entries
+
+    @classmethod
+    def read(cls, stream):
+        from .models import normalize_ingredient_name
+
+        entries = {}
+        for line, row in enumerate(csv.DictReader(stream), start=2):
+            name = normalize_ingredient_name(row.get('name') or '')
+            unit = unit_registry.find(row.get('unit'))
+            if not name:
+                raise ValueError(f'Line {line}: ingredient without a name.')
+            if unit is None:
+                raise ValueError(f'Line {line}: unknown unit {row.get("unit")!r} for {name!r}.')
+            try:
+                values = tuple(float(row.get(nutrient) or 0) for nutrient in NUTRIENTS)
+            except ValueError:
+                values = ()
+            if len(values) < len(NUTRIENTS) or not all(map(math.isfinite, values)):
+                raise ValueError(f'Line {line}: bad nutrient value for {name!r}.')
+            entries[name] = (unit, values)
+        return cls(entries)
+
+    def vector(self, name, dimension):
+        """
+        The nutrient values of one base unit of `dimension` of the
+        ingredient called `name`, None when it isn't in the table or the
+        table measures it in another dimension.
+        """
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        unit, values = entry
+        if unit.dimension != dimension:
+            return None
+        size = float(unit.size)
+        return tuple(value / size for value in values)
+
+
+_lock = threading.Lock()
+# ((path, modification time), table, error) of the table last read
+_loaded = (None, None, None)
+
+
+def nutrient_table():
+    """
+    The table at settings.NUTRIENT_TABLE, read again whenever the file
+    changes. None when no table is configured, NutrientTableError when it
+    can't be read or has a bad line, without reading it again until the
+    file changes.
+    """
+    global _loaded
+    path = settings.NUTRIENT_TABLE
+    if not path:
+        return None
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except OSError as e:
+        raise NutrientTableError(f'Cannot read the nutrient table: {e}')
+    with _lock:
+        if _loaded[0] != key:
+            try:
+                with open(path, newline='') as stream:
+                    _loaded = (key, NutrientTable.read(stream), None)
+            except (OSError, ValueError) as e:
+                _loaded = (key, None, f'Bad nutrient table {path}: {e}')
+        _, table, error = _loaded
+    if error is not None:
+        raise NutrientTableError(error)
+    return table
+
+
+def totals(recipe_ids, table, using='default', every=False):
+    """
+    Sum the ingredients of `recipe_ids` into a dict of recipe id -> (values
+    in NUTRIENTS order, complete), complete being whether every ingredient
+    was found in `table`. With `every`, `recipe_ids` is every recipe from
+    its first to its last and they are looked up by range.
+    """
+    MeasuredIngredient = apps.get_model('recipes', 'MeasuredIngredient')
+    if every:
+        where = 'mi.recipe_id >= %s AND mi.recipe_id <= %s'
+        params = [recipe_ids[0], recipe_ids[-1]]
+        rows = MeasuredIngredient.objects.filter(
+                recipe_id__gte=recipe_ids[0], recipe_id__lte=recipe_ids[-1])
+    else:
+        where = 'mi.recipe_id IN ({})'.format(', '.join(['%s'] * len(recipe_ids)))
+        params = list(recipe_ids)
+        rows = MeasuredIngredient.objects.filter(recipe_id__in=recipe_ids)
+
+    # every distinct (ingredient, dimension) of the chunk once
+    vectors = []
+    for ingredient_id, name, dimension in rows.using(using) \
+            .values_list('ingredient_id', 'ingredient__name', 'dimension').distinct():
+        vector = table.vector(name, dimension)
+        if vector is not None:
+            vectors.append("({}, '{}', {})".format(int(ingredient_id), dimension,
+                ', '.join(repr(value) for value in vector)))
+    # VALUES can't be empty, no ingredient has id 0
+    vectors = vectors or ["(0, '', {})".format(', '.join(['0.0'] * len(NUTRIENTS)))]
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(TOTALS_SQL.format(vectors=', '.join(vectors), where=where), params)
+        return {row[0]: (tuple(round(value, 3) for value in row[1:-1]), bool(row[-1]))
+                for row in cursor.fetchall()}
+
+
+def _store(recipe_ids, found, using, every=False):
+    """
+    Store the totals in `found` for `recipe_ids`, rewriting only the
+    recipes whose totals changed and removing those of the recipes without
+    any. Returns how many changed. `every` is as for totals().
+    """
+    RecipeNutrition = apps.get_model('recipes', 'RecipeNutrition')
+    nutrition = RecipeNutrition.objects.using(using)
+    if every:
+        stored = nutrition.filter(recipe_id__gte=recipe_ids[0], recipe_id__lte=recipe_ids[-1])
+    else:
+        stored = nutrition.filter(recipe_id__in=recipe_ids)
+    stored = {row[0]: (tuple(row[1:-1]), row[-1])
+            for row in stored.values_list('recipe_id', *NUTRIENTS, 'complete')}
+
+    changed = [recipe_id for recipe_id in recipe_ids
+            if found.get(recipe_id) != stored.get(recipe_id)]
+    if changed:
+        now = timezone.now()
+        # as many ids as the database takes in one query
+        batch_size = connections[using].ops.bulk_batch_size(['recipe_id'], changed)
+        with transaction.atomic(using=using):
+            for i in range(0, len(changed), batch_size):
+                nutrition.filter(recipe_id__in=changed[i:i + batch_size]).delete()
+            rows = [(recipe_id,) + found[recipe_id][0] + (found[recipe_id][1], now)
+                    for recipe_id in changed if recipe_id in found]
+            if connections[using].vendor == 'postgresql':
+                # several times faster than an insert for a whole catalog
+                copy_rows(RecipeNutrition, ('recipe_id',) + NUTRIENTS + ('complete', 'computed'),
+                        rows, using=using)
+            else:
+                nutrition.bulk_create([RecipeNutrition(recipe_id=row[0], complete=row[-2],
+                    computed=now, **dict(zip(NUTRIENTS, row[1:-2]))) for row in rows])
+        # the detail page shows them
+        fragments.invalidate(*changed)
+        page_cache.purge(*[f'recipe:{recipe_id}' for recipe_id in changed])
+    return len(changed)
+
+
+def _all_recipe_ids(using):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    last = 0
+    while True:
+        chunk = list(Recipe.objects.using(using).filter(pk__gt=last).order_by('pk')
+                .values_list('pk', flat=True)[:CHUNK_SIZE])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+def update_recipes(recipe_ids=None, using='default'):
+    """
+    Recompute and store the nutrition of `recipe_ids`, or of every recipe.
+    Returns (recipes looked at, recipes whose nutrition changed), nothing
+    is done without a nutrient table.
+
+    Each CHUNK_SIZE recipes cost a query for the ingredients they use, one
+    summing their totals, one for their stored nutrition and, going through
+    every recipe, one for their ids, plus a transaction for those that
+    changed. Memory stays bounded by the chunk whatever the catalog's size.
+    """
+    table = nutrient_table()
+    if table is None:
+        return 0, 0
+
+    every = recipe_ids is None
+    if every:
+        chunks = _all_recipe_ids(using)
+    else:
+        recipe_ids = sorted(set(recipe_ids))
+        # as many ids as the database takes in one query
+        size = min(CHUNK_SIZE,
+                connections[using].ops.bulk_batch_size(['recipe_id'], recipe_ids) or 1)
+        chunks = (recipe_ids[i:i + size] for i in range(0, len(recipe_ids), size))
+
+    looked_at = changed = 0
+    for chunk in chunks:
+        looked_at += len(chunk)
+        changed += _store(chunk, totals(chunk, table, using, every=every), using, every=every)
+    return looked_at, changed
+
+
+def refresh_recipes(recipe_ids, using='default'):
+    """
+    update_recipes() for hooks run once a change is committed, logging
+    errors rather than raising them: the change is saved either way, and
+    the update_nutrition command fills in what's missed.
+    """
+    try:
+        update_recipes(recipe_ids, using=using)
+    except Exception:
+        logger.exception('Could not update the nutrition of %d recipes, ids %d to %d.',
+                len(recipe_ids), min(recipe_ids), max(recipe_ids))
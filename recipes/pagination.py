@@ -0,0 +1,70 @@
+from django.http import Http404
+
+
+class KeysetPage(object):
+    """
+    A single page of results from a keyset (seek) paginated queryset.
+
+    Results are ordered by descending primary key, so `next_cursor` points
+    at older rows and `previous_cursor` at newer ones.
+    """
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return self.object_list[-1].pk
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return self.object_list[0].pk
+        return None
+
+
+def _parse_cursor(value):
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise Http404('Invalid page cursor.')
+
+
+def keyset_paginate(queryset, per_page, after=None, before=None):
+    """
+    Return a KeysetPage of `per_page` rows from `queryset`.
+
+    `after` returns the rows with a primary key below the cursor, `before`
+    the rows above it. Each page is a single index range scan on the primary
+    key, so the cost does not depend on how deep into the results the page is.
+    """
+    after = _parse_cursor(after)
+    before = _parse_cursor(before)
+
+    if before is not None:
+        # walk forwards from the cursor, then flip back into feed order
+        rows = list(queryset.filter(pk__gt=before).order_by('pk')[:per_page + 1])
+        has_previous = len(rows) > per_page
+        object_list = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            queryset = queryset.filter(pk__lt=after)
+        rows = list(queryset.order_by('-pk')[:per_page + 1])
+        has_next = len(rows) > per_page
+        object_list = rows[:per_page]
+        has_previous = after is not None
+
+    return KeysetPage(object_list, has_next=has_next, has_previous=has_previous)
@@ -0,0 +1,42 @@
+from django.db import transaction
+
+
+def save_recipe(form, formsets, author=None):
+    """
+    Save a valid RecipeForm together with its inline formsets in a single
+    transaction, so a failure part way through leaves nothing behind.
+
+    New rows are inserted with one bulk insert per formset, existing rows
+    are only written when their form changed (and then only the changed
+    columns), and removed rows are deleted together.
+    """
+    with transaction.atomic():
+        recipe = form.save(commit=False)
+        if author is not None:
+            recipe.author = author
+        # always saved, even when unchanged, so the Recipe post_save
+        # receivers see the edit: bulk inserts don't send signals
+        recipe.save()
+
+        for formset in formsets:
+            formset.instance = recipe
+            _save_formset(formset)
+
+    return recipe
+
+
+def _save_formset(formset):
+    model = formset.model
+    formset.save(commit=False)
+
+    if formset.new_objects:
+        model.objects.bulk_create(formset.new_objects)
+
+    field_names = {field.name for field in model._meta.concrete_fields}
+    for obj, changed_data in formset.changed_objects:
+        update_fields = [name for name in changed_data if name in field_names]
+        if update_fields:
+            obj.save(update_fields=update_fields)
+
+    if formset.deleted_objects:
+        model.objects.filter(pk__in=[obj.pk for obj in formset.deleted_objects]).delete()
@@ -0,0 +1,43 @@
+"""
+One merged shopping list for many recipes.
+
+Every measured ingredient of the chosen recipes is read with a single
+query and summed in one pass: per ingredient and dimension from the stored
+canonical quantities, and per unit for units the registry doesn't know, so
+the work doesn't grow with a query per recipe.
+"""
+from collections import Counter
+
+from . import units as unit_registry
+from .models import MeasuredIngredient
+
+
+def shopping_list(recipe_ids):
+    """
+    Return [(ingredient name, [(amount, units), ...]), ...] for the
+    recipes in `recipe_ids`, sorted by name. A recipe listed twice is
+    shopped for twice. An ingredient gets an amount per dimension it's
+    measured in, in a readable unit, and one per unknown unit.
+    """
+    times = Counter(recipe_ids)
+    rows = MeasuredIngredient.objects.filter(recipe_id__in=list(times)) \
+            .values_list('recipe_id', 'ingredient__name', 'quantity', 'dimension',
+                'amount', 'units')
+
+    # (name, dimension) -> quantity, (name, units) -> amount
+    quantities = {}
+    unknown = {}
+    for recipe_id, name, quantity, dimension, amount, units in rows.iterator():
+        if quantity is None:
+            key = (name, units)
+            unknown[key] = unknown.get(key, 0) + amount * times[recipe_id]
+        else:
+            key = (name, dimension)
+            quantities[key] = quantities.get(key, 0) + quantity * times[recipe_id]
+
+    items = {}
+    for (name, dimension), quantity in sorted(quantities.items()):
+        items.setdefault(name, []).append(unit_registry.readable(quantity, dimension))
+    for (name, units), amount in sorted(unknown.items()):
+        items.setdefault(name, []).append((amount, units))
+    return sorted(items.items())
@@ -0,0 +1,278 @@
+"""
+Similar recipes by ingredient overlap, found with MinHash and LSH.
+
+Every recipe's ingredient set gets a MinHash signature of PERMUTATIONS
+values, the chance two signatures agree on a value being the Jaccard
+similarity of the two sets. The signature is cut into BANDS bands and
+recipes that agree on every value of some band share that band's bucket.
+Only recipes sharing a bucket are compared, by their exact Jaccard
+similarity, so the work grows with the catalog instead of its square.
+
+The catalog is held in flat arrays so forked worker processes share it,
+and each stage (signatures, buckets, neighbours) is split across them.
+"""
+from array import array
+from functools import lru_cache
+import heapq
+import multiprocessing
+import random
+
+from django.db import transaction
+from django.utils import timezone
+
+from stockpot import page_cache
+from stockpot.db import close_all_connections
+from . import fragments
+from .models import Recipe, MeasuredIngredient, SimilarRecipe
+
+
+PERMUTATIONS = 64
+BANDS = 16
+ROWS = PERMUTATIONS // BANDS
+
+# neighbours stored per recipe
+NEIGHBOURS = 10
+
+# recipes sharing a bucket with more recipes than this (everything made of
+# just flour and water, say) aren't compared through it
+MAX_BUCKET_SIZE = 200
+
+# recipes whose neighbours are written per transaction
+CHUNK_SIZE = 1000
+
+_PRIME = (1 << 61) - 1
+
+# fixed, signatures have to agree between runs and processes
+_random = random.Random(22)
+_COEFFICIENTS = [(_random.randrange(1, _PRIME), _random.randrange(_PRIME))
+        for _ in range(PERMUTATIONS)]
+
+
+@lru_cache(maxsize=None)
+def _hashes(ingredient_id):
+    return tuple((a * ingredient_id + b) % _PRIME for a, b in _COEFFICIENTS)
+
+
+def signature(ingredient_ids):
+    """
+    The MinHash signature of a non-empty set of ingredient ids.
+    """
+    return tuple(map(min, zip(*map(_hashes, ingredient_ids))))
+
+
+def band_keys(signature):
+    # hashes of int tuples are the same in every process
+    return [hash(signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+def jaccard(a, b):
+    shared = len(set(a).intersection(b))
+    return shared / (len(a) + len(b) - shared)
+
+
+class Catalog(object):
+    """
+    Every recipe with ingredients, by position: `ids` holds the recipe ids
+    in order and recipe i's distinct ingredient ids are
+    ingredients[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, ids, offsets, ingredients):
+        self.ids = ids
+        self.offsets = offsets
+        self.ingredients = ingredients
+        self.positions = {recipe_id: i for i, recipe_id in enumerate(ids)}
+        # per band, the key of every recipe
+        self.keys = None
+        # per band, key -> positions of the recipes in that bucket, for the
+        # buckets of two to MAX_BUCKET_SIZE recipes
+        self.buckets = None
+
+    @classmethod
+    def load(cls):
+        ids = array('l')
+        offsets = array('l', [0])
+        ingredients = array('l')
+        rows = MeasuredIngredient.objects.order_by('recipe_id', 'ingredient_id') \
+                .values_list('recipe_id', 'ingredient_id').distinct()
+        for recipe_id, ingredient_id in rows.iterator():
+            if not ids or ids[-1] != recipe_id:
+                if ids:
+                    offsets.append(len(ingredients))
+                ids.append(recipe_id)
+            ingredients.append(ingredient_id)
+        if ids:
+            offsets.append(len(ingredients))
+        return cls(ids, offsets, ingredients)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def recipe_ingredients(self, position):
+        return self.ingredients[self.offsets[position]:self.offsets[position + 1]]
+
+    def candidates(self, position):
+        """
+        Positions of the recipes sharing a bucket with the recipe at
+        `position`.
+        """
+        found = set()
+        for band in range(BANDS):
+            bucket = self.buckets[band].get(self.keys[band][position])
+            if bucket is not None:
+                found.update(bucket)
+        found.discard(position)
+        return found
+
+    def neighbours(self, position, count=NEIGHBOURS):
+        """
+        Return up to `count` (similarity, recipe id) pairs for the recipes
+        most like the one at `position`, most similar first.
+        """
+        ingredients = self.recipe_ingredients(position)
+        scored = ((jaccard(ingredients, self.recipe_ingredients(other)), self.ids[other])
+                for other in self.candidates(position))
+        return heapq.nlargest(count, scored)
+
+
+# the catalog forked worker processes inherit
+_catalog = None
+
+
+def _signature_keys(start, stop):
+    keys = [array('q') for band in range(BANDS)]
+    for position in range(start, stop):
+        for band, key in enumerate(band_keys(signature(_catalog.recipe_ingredients(position)))):
+            keys[band].append(key)
+    return keys
+
+
+def _band_buckets(band):
+    keys = _catalog.keys[band]
+    buckets = {}
+    run = []
+    # walk the positions in key order, each run of equal keys is a bucket
+    for position in sorted(range(len(keys)), key=keys.__getitem__):
+        if run and keys[run[0]] != keys[position]:
+            if 1 < len(run) <= MAX_BUCKET_SIZE:
+                buckets[keys[run[0]]] = array('l', run)
+            run = []
+        run.append(position)
+    if 1 < len(run) <= MAX_BUCKET_SIZE:
+        buckets[keys[run[0]]] = array('l', run)
+    return buckets
+
+
+def _write_neighbours(positions, count):
+    """
+    Store the neighbours of the recipes at `positions`, rewriting only the
+    recipes whose neighbours changed. Returns how many did.
+    """
+    found = {_catalog.ids[position]: [(recipe_id, round(similarity, 6))
+        for similarity, recipe_id in _catalog.neighbours(position, count)]
+        for position in positions}
+
+    stored = {recipe_id: [] for recipe_id in found}
+    rows = SimilarRecipe.objects.filter(recipe_id__in=list(found)) \
+            .order_by('recipe_id', '-similarity', '-similar_id') \
+            .values_list('recipe_id', 'similar_id', 'similarity')
+    for recipe_id, similar_id, similarity in rows:
+        stored[recipe_id].append((similar_id, similarity))
+
+    changed = [recipe_id for recipe_id, neighbours in found.items()
+            if neighbours != stored[recipe_id]]
+    if changed:
+        now = timezone.now()
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(recipe_id__in=changed).delete()
+            SimilarRecipe.objects.bulk_create([SimilarRecipe(recipe_id=recipe_id,
+                similar_id=similar_id, similarity=similarity, computed=now)
+                for recipe_id in changed for similar_id, similarity in found[recipe_id]])
+        # the detail page shows them
+        fragments.invalidate(*changed)
+        page_cache.purge(*[f'recipe:{recipe_id}' for recipe_id in changed])
+    return len(changed)
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _run(pool, function, arguments):
+    if pool is None:
+        return [function(*args) for args in arguments]
+    return pool.starmap(function, arguments)
+
+
+def _fork(pool, workers):
+    """
+    Replace `pool` with workers forked from this process as it is now, so
+    they see the catalog built so far.
+    """
+    if workers <= 1:
+        return None
+    if pool is not None:
+        pool.close()
+        pool.join()
+    # forked workers must open connections of their own
+    close_all_connections()
+    return multiprocessing.Pool(workers)
+
+
+def update_similar_recipes(changed=None, count=NEIGHBOURS, workers=1):
+    """
+    Find and store the `count` nearest neighbours of every recipe, or with
+    `changed` (recipe ids) only of the recipes whose neighbours those
+    changes can affect. Returns (recipes looked at, recipes whose
+    neighbours changed).
+    """
+    global _catalog
+    _catalog = catalog = Catalog.load()
+    pool = None
+    try:
+        pool = _fork(pool, workers)
+        size = max(1, -(-len(catalog) // workers))
+        catalog.keys = [array('q') for band in range(BANDS)]
+        for keys in _run(pool, _signature_keys,
+                [(start, min(start + size, len(catalog))) for start in range(0, len(catalog), size)]):
+            for band in range(BANDS):
+                catalog.keys[band].extend(keys[band])
+
+        pool = _fork(pool, workers)
+        catalog.buckets = _run(pool, _band_buckets, [(band,) for band in range(BANDS)])
+
+        pool = _fork(pool, workers)
+        if changed is None:
+            positions = range(len(catalog))
+            # recipes that lost all their ingredients
+            SimilarRecipe.objects.filter(recipe_id__in=Recipe.objects
+                    .filter(measuredingredient__isnull=True).values('pk')).delete()
+        else:
+            changed = set(changed)
+            positions = set()
+            for recipe_id in changed:
+                position = catalog.positions.get(recipe_id)
+                if position is not None:
+                    positions.add(position)
+                    positions.update(catalog.candidates(position))
+            for chunk in _chunks(sorted(changed), CHUNK_SIZE):
+                # and the recipes that listed a changed recipe before, their
+                # pages show its title
+                listing = set(SimilarRecipe.objects.filter(similar_id__in=chunk)
+                        .values_list('recipe_id', flat=True))
+                positions.update(catalog.positions[recipe_id] for recipe_id in listing
+                        if recipe_id in catalog.positions)
+                fragments.invalidate(*listing)
+                page_cache.purge(*[f'recipe:{recipe_id}' for recipe_id in listing])
+                SimilarRecipe.objects.filter(recipe_id__in=[recipe_id for recipe_id in chunk
+                    if recipe_id not in catalog.positions]).delete()
+            positions = sorted(positions)
+
+        written = _run(pool, _write_neighbours,
+                [(chunk, count) for chunk in _chunks(list(positions), CHUNK_SIZE)])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        _catalog = None
+    return len(positions), sum(written)
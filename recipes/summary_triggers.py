@@ -0,0 +1,201 @@
+"""
+Database triggers keeping recipes_recipesummary in step with the recipes,
+steps, ingredients and usernames it summarizes.
+
+Triggers rather than signals, so the bulk inserts and COPY used by
+save_recipe and the importer, which send no signals, are covered too and
+the summary is written in the same statement as the change. PostgreSQL
+updates the counts once per statement from its transition tables, SQLite
+once per row. Other databases aren't supported.
+
+Migration 0013 creates a frozen copy of them along with the summary table,
+before filling it, and the current ones are recreated after every migrate.
+"""
+
+# (table, summary column counting its rows)
+CHILDREN = (
+    ('recipes_recipestep', 'step_count'),
+    ('recipes_measuredingredient', 'ingredient_count'),
+)
+
+AUTHOR_USERNAME_SQL = '''coalesce((
+    SELECT u.username FROM users_profile AS p JOIN auth_user AS u ON u.id = p.user_id
+    WHERE p.id = {}.author_id), '')'''
+
+
+POSTGRESQL_FUNCTIONS = ['''
+    CREATE OR REPLACE FUNCTION recipes_summary_insert_recipes() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO recipes_recipesummary
+            (recipe_id, title, author_username, step_count, ingredient_count)
+        SELECT r.id, r.title, coalesce(u.username, ''), 0, 0
+        FROM changed_rows AS r
+        LEFT JOIN users_profile AS p ON p.id = r.author_id
+        LEFT JOIN auth_user AS u ON u.id = p.user_id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+''', '''
+    CREATE OR REPLACE FUNCTION recipes_summary_update_recipe() RETURNS trigger AS $$
+    BEGIN
+        IF (OLD.title, OLD.author_id) IS DISTINCT FROM (NEW.title, NEW.author_id) THEN
+            UPDATE recipes_recipesummary
+            SET title = NEW.title, author_username = {}
+            WHERE recipe_id = NEW.id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+'''.format(AUTHOR_USERNAME_SQL.format('NEW')), '''
+    CREATE OR REPLACE FUNCTION recipes_summary_count_children() RETURNS trigger AS $$
+    BEGIN
+        -- TG_ARGV[0] is the summary column counting the table's rows
+        EXECUTE format('UPDATE recipes_recipesummary AS s SET %1$I = s.%1$I %2$s c.n '
+            'FROM (SELECT recipe_id, count(*) AS n FROM changed_rows GROUP BY recipe_id) AS c '
+            'WHERE s.recipe_id = c.recipe_id',
+            TG_ARGV[0], CASE TG_OP WHEN 'INSERT' THEN '+' ELSE '-' END);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+''', '''
+    CREATE OR REPLACE FUNCTION recipes_summary_move_child() RETURNS trigger AS $$
+    BEGIN
+        IF OLD.recipe_id IS DISTINCT FROM NEW.recipe_id THEN
+            EXECUTE format('UPDATE recipes_recipesummary SET %1$I = %1$I - 1 '
+                'WHERE recipe_id = $1', TG_ARGV[0]) USING OLD.recipe_id;
+            EXECUTE format('UPDATE recipes_recipesummary SET %1$I = %1$I + 1 '
+                'WHERE recipe_id = $1', TG_ARGV[0]) USING NEW.recipe_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+''', '''
+    CREATE OR REPLACE FUNCTION recipes_summary_rename_author() RETURNS trigger AS $$
+    BEGIN
+        IF OLD.username IS DISTINCT FROM NEW.username THEN
+            UPDATE recipes_recipesummary AS s SET author_username = NEW.username
+            FROM recipes_recipe AS r JOIN users_profile AS p ON p.id = r.author_id
+            WHERE p.user_id = NEW.id AND s.recipe_id = r.id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+''']
+
+# (trigger, table, definition)
+POSTGRESQL_TRIGGERS = [
+    ('recipes_summary_insert', 'recipes_recipe',
+        'AFTER INSERT ON recipes_recipe REFERENCING NEW TABLE AS changed_rows '
+        'FOR EACH STATEMENT EXECUTE PROCEDURE recipes_summary_insert_recipes()'),
+    ('recipes_summary_update', 'recipes_recipe',
+        'AFTER UPDATE OF title, author_id ON recipes_recipe '
+        'FOR EACH ROW EXECUTE PROCEDURE recipes_summary_update_recipe()'),
+    ('recipes_summary_rename', 'auth_user',
+        'AFTER UPDATE OF username ON auth_user '
+        'FOR EACH ROW EXECUTE PROCEDURE recipes_summary_rename_author()'),
+]
+for table, column in CHILDREN:
+    POSTGRESQL_TRIGGERS += [
+        ('recipes_summary_insert', table,
+            f'AFTER INSERT ON {table} REFERENCING NEW TABLE AS changed_rows '
+            f"FOR EACH STATEMENT EXECUTE PROCEDURE recipes_summary_count_children('{column}')"),
+        ('recipes_summary_delete', table,
+            f'AFTER DELETE ON {table} REFERENCING OLD TABLE AS changed_rows '
+            f"FOR EACH STATEMENT EXECUTE PROCEDURE recipes_summary_count_children('{column}')"),
+        ('recipes_summary_move', table,
+            f'AFTER UPDATE OF recipe_id ON {table} '
+            f"FOR EACH ROW EXECUTE PROCEDURE recipes_summary_move_child('{column}')"),
+    ]
+
+
+# (trigger, definition), SQLite trigger names are global
+SQLITE_TRIGGERS = [
+    ('recipes_summary_recipe_insert', '''
+        AFTER INSERT ON recipes_recipe BEGIN
+            INSERT INTO recipes_recipesummary
+                (recipe_id, title, author_username, step_count, ingredient_count)
+            VALUES (NEW.id, NEW.title, {}, 0, 0);
+        END'''.format(AUTHOR_USERNAME_SQL.format('NEW'))),
+    ('recipes_summary_recipe_update', '''
+        AFTER UPDATE OF title, author_id ON recipes_recipe
+        WHEN OLD.title IS NOT NEW.title OR OLD.author_id IS NOT NEW.author_id BEGIN
+            UPDATE recipes_recipesummary SET title = NEW.title, author_username = {}
+            WHERE recipe_id = NEW.id;
+        END'''.format(AUTHOR_USERNAME_SQL.format('NEW'))),
+    ('recipes_summary_user_rename', '''
+        AFTER UPDATE OF username ON auth_user WHEN OLD.username IS NOT NEW.username BEGIN
+            UPDATE recipes_recipesummary SET author_username = NEW.username
+            WHERE recipe_id IN (
+                SELECT r.id FROM recipes_recipe AS r
+                JOIN users_profile AS p ON p.id = r.author_id
+                WHERE p.user_id = NEW.id);
+        END'''),
+]
+for table, column in CHILDREN:
+    SQLITE_TRIGGERS += [
+        (f'recipes_summary_{table}_insert', f'''
+            AFTER INSERT ON {table} BEGIN
+                UPDATE recipes_recipesummary SET {column} = {column} + 1
+                WHERE recipe_id = NEW.recipe_id;
+            END'''),
+        (f'recipes_summary_{table}_delete', f'''
+            AFTER DELETE ON {table} BEGIN
+                UPDATE recipes_recipesummary SET {column} = {column} - 1
+                WHERE recipe_id = OLD.recipe_id;
+            END'''),
+        (f'recipes_summary_{table}_move', f'''
+            AFTER UPDATE OF recipe_id ON {table} WHEN OLD.recipe_id IS NOT NEW.recipe_id BEGIN
+                UPDATE recipes_recipesummary SET {column} = {column} - 1
+                WHERE recipe_id = OLD.recipe_id;
+                UPDATE recipes_recipesummary SET {column} = {column} + 1
+                WHERE recipe_id = NEW.recipe_id;
+            END'''),
+    ]
+
+
+def _statements(vendor):
+    if vendor == 'postgresql':
+        statements = list(POSTGRESQL_FUNCTIONS)
+        for name, table, definition in POSTGRESQL_TRIGGERS:
+            statements.append(f'DROP TRIGGER IF EXISTS {name} ON {table}')
+            statements.append(f'CREATE TRIGGER {name} {definition}')
+        return statements
+    if vendor == 'sqlite':
+        statements = []
+        for name, definition in SQLITE_TRIGGERS:
+            statements.append(f'DROP TRIGGER IF EXISTS {name}')
+            statements.append(f'CREATE TRIGGER {name} {definition}')
+        return statements
+    # without them the summaries, all the recipe listings read, go stale
+    raise NotImplementedError(f'Recipe summary triggers are not available on {vendor}.')
+
+
+def _drop_statements(vendor):
+    if vendor == 'postgresql':
+        return [f'DROP TRIGGER IF EXISTS {name} ON {table}'
+                for name, table, definition in POSTGRESQL_TRIGGERS]
+    if vendor == 'sqlite':
+        return [f'DROP TRIGGER IF EXISTS {name}' for name, definition in SQLITE_TRIGGERS]
+    return []
+
+
+def install(connection):
+    """
+    (Re)create the triggers on `connection`, once the summary table exists.
+    """
+    if 'recipes_recipesummary' not in connection.introspection.table_names():
+        return
+    statements = _statements(connection.vendor)
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def uninstall(connection):
+    """
+    Drop the triggers on `connection`, e.g. before SQLite rebuilds a table
+    they refer to, which it refuses to do while they exist.
+    """
+    with connection.cursor() as cursor:
+        for statement in _drop_statements(connection.vendor):
+            cursor.execute(statement)
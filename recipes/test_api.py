@@ -0,0 +1,101 @@
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+
+from .models import Recipe, RecipeStep, Ingredient, MeasuredIngredient
+
+
+class RecipeApiTest(TestCase):
+
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='username', password='password')
+        self.user.profile.name = 'Jo Cook'
+        self.user.profile.save()
+
+    def create_recipe(self, title, size=2):
+        recipe = Recipe.objects.create(title=title, author=self.user.profile)
+        for i in range(size):
+            ingredient, _ = Ingredient.objects.get_or_create(name=f'ingredient {i}')
+            MeasuredIngredient.objects.create(recipe=recipe, ingredient=ingredient,
+                    amount=1.5, units='c')
+            RecipeStep.objects.create(recipe=recipe, body=f'Step {i}.')
+        return recipe
+
+    def test_detail_returns_whole_recipe(self):
+        recipe = self.create_recipe('Tomato Soup')
+
+        response = self.client.get(reverse('api_recipe_detail', args=[recipe.pk]))
+        data = response.json()
+
+        self.assertEqual(data['id'], recipe.pk)
+        self.assertEqual(data['title'], 'Tomato Soup')
+        self.assertEqual(data['author'], {'username': 'username', 'name': 'Jo Cook'})
+        self.assertEqual(data['steps'], ['Step 0.', 'Step 1.'])
+        self.assertEqual(data['ingredients'][0],
+                {'name': 'ingredient 0', 'amount': '1.500', 'units': 'c'})
+
+    def test_missing_recipe_returns_404(self):
+        response = self.client.get(reverse('api_recipe_detail', args=[12345]))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
+
+    def test_fields_limit_response_and_queries(self):
+        recipe = self.create_recipe('Tomato Soup')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api_recipe_detail', args=[recipe.pk]),
+                    {'fields': 'title'})
+        self.assertEqual(response.json(), {'id': recipe.pk, 'title': 'Tomato Soup'})
+
+        # recipe, then its steps
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api_recipe_detail', args=[recipe.pk]),
+                    {'fields': 'title,steps'})
+        self.assertEqual(set(response.json()), {'id', 'title', 'steps'})
+
+    def test_unknown_field_returns_400(self):
+        response = self.client.get(reverse('api_recipe_list'), {'fields': 'title,calories'})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(RECIPE_FEED_PAGE_SIZE=2)
+    def test_list_is_cursor_paginated(self):
+        soup = self.create_recipe('Tomato Soup')
+        cheese = self.create_recipe('Grilled Cheese')
+        salad = self.create_recipe('Caesar Salad')
+
+        data = self.client.get(reverse('api_recipe_list')).json()
+        self.assertEqual([r['id'] for r in data['results']], [salad.pk, cheese.pk])
+        self.assertIsNone(data['previous'])
+
+        data = self.client.get(reverse('api_recipe_list'), {'after': data['next']}).json()
+        self.assertEqual([r['id'] for r in data['results']], [soup.pk])
+        self.assertIsNone(data['next'])
+
+    def test_list_query_count_independent_of_recipe_size(self):
+        for i in range(5):
+            self.create_recipe(f'Recipe {i}', size=i)
+
+        # recipes with authors, steps, ingredients with their names
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('api_recipe_list'))
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_batch_returns_requested_recipes_in_order(self):
+        soup = self.create_recipe('Tomato Soup')
+        cheese = self.create_recipe('Grilled Cheese')
+
+        response = self.client.get(reverse('api_recipe_list'),
+                {'ids': f'{cheese.pk},12345,{soup.pk}', 'fields': 'title'})
+        self.assertEqual(response.json()['results'], [
+            {'id': cheese.pk, 'title': 'Grilled Cheese'},
+            {'id': soup.pk, 'title': 'Tomato Soup'},
+        ])
+
+    def test_invalid_batch_ids_return_400(self):
+        response = self.client.get(reverse('api_recipe_list'), {'ids': '1,two'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(reverse('api_recipe_list'),
+                {'ids': ','.join(str(i) for i in range(101))})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.contrib.auth.models import User
+
+from .export import iter_recipes, csv_lines
+from .models import Recipe, RecipeStep, Ingredient, MeasuredIngredient
+
+
+class RecipeExportTest(TestCase):
+
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='username', password='password')
+        self.recipes = []
+        for i in range(5):
+            recipe = Recipe.objects.create(title=f'Recipe {i}', author=self.user.profile)
+            ingredient = Ingredient.objects.create(name=f'ingredient {i}')
+            MeasuredIngredient.objects.create(recipe=recipe, ingredient=ingredient,
+                    amount=2, units='c')
+            RecipeStep.objects.create(recipe=recipe, body=f'Step {i}.')
+            self.recipes.append(recipe)
+
+    def test_iter_recipes_yields_every_recipe_in_order(self):
+        exported = list(iter_recipes(chunk_size=2))
+        self.assertEqual([r['id'] for r in exported], [r.pk for r in self.recipes])
+        self.assertEqual(exported[0]['steps'], ['Step 0.'])
+        self.assertEqual(exported[0]['ingredients'][0]['name'], 'ingredient 0')
+
+    def test_iter_recipes_queries_per_chunk_not_per_recipe(self):
+        # three chunks of recipes with authors, steps and ingredients
+        with self.assertNumQueries(9):
+            list(iter_recipes(chunk_size=2))
+
+    def test_csv_lines_write_nested_values_as_json(self):
+        rows = list(csv.reader(io.StringIO(''.join(
+                csv_lines(iter_recipes(fields={'title', 'steps'}), fields={'title', 'steps'})))))
+        self.assertEqual(rows[0], ['id', 'title', 'steps'])
+        self.assertEqual(rows[1], [str(self.recipes[0].pk), 'Recipe 0', '["Step 0."]'])
+        self.assertEqual(len(rows), 6)
+
+    def test_command_writes_ndjson_file(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+
+        call_command('export_recipes', output=path, chunk_size=2)
+
+        with open(path) as output:
+            lines = [json.loads(line) for line in output]
+        self.assertEqual([r['title'] for r in lines], [f'Recipe {i}' for i in range(5)])
+
+    def test_command_writes_csv_to_stdout(self):
+        out = io.StringIO()
+        call_command('export_recipes', format='csv', fields='title', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[:2],
+                ['id,title', f'{self.recipes[0].pk},Recipe 0'])
+
+    def test_export_view_requires_login(self):
+        response = self.client.get(reverse('export_recipes'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_view_streams_catalog(self):
+        self.client.login(username='username', password='password')
+        response = self.client.get(reverse('export_recipes'), {'format': 'csv'})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 6)
+
+    def test_export_view_rejects_unknown_format(self):
+        self.client.login(username='username', password='password')
+        response = self.client.get(reverse('export_recipes'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
@@ -1,8 +1,9 @@
 from django.test import TestCase
+from django.db import connection
 from django.forms import inlineformset_factory
 from django.forms.models import model_to_dict
 
-from .forms import RecipeForm, MeasuredIngredientForm
+from .forms import RecipeForm, MeasuredIngredientForm, BaseMeasuredIngredientFormSet
 from .models import Recipe, MeasuredIngredient, Ingredient, RecipeStep
 
 
@@ -108,3 +109,88 @@ class MeasuredIngredientFormTest(TestCase):
         # the MeasureIngredient object's ingredient name is now butter
         # instead of potato
         self.assertEqual(mi.ingredient.name, 'butter')
+
+
+class MeasuredIngredientFormSetTest(TestCase):
+
+
+    def setUp(self):
+        self.recipe = Recipe.objects.create(title='Mashed Potatoes')
+        self.IngredientFormSet = inlineformset_factory(Recipe, MeasuredIngredient,
+                form=MeasuredIngredientForm, formset=BaseMeasuredIngredientFormSet,
+                fields=('amount', 'units', 'ingredient'), extra=1)
+
+    def formset_data(self, names):
+        data = {
+            'measuredingredient_set-TOTAL_FORMS': len(names),
+            'measuredingredient_set-INITIAL_FORMS': 0,
+            'measuredingredient_set-MIN_NUM_FORMS': 0,
+            'measuredingredient_set-MAX_NUM_FORMS': 1000,
+        }
+        for i, name in enumerate(names):
+            data.update({
+                f'measuredingredient_set-{i}-amount': 1,
+                f'measuredingredient_set-{i}-units': 'c',
+                f'measuredingredient_set-{i}-ingredient': name,
+            })
+        return data
+
+    def test_prefills_ingredient_names_in_one_query(self):
+        for name in ('potato', 'butter', 'milk', 'salt', 'pepper'):
+            MeasuredIngredient.objects.create(recipe=self.recipe,
+                    ingredient=Ingredient.objects.create(name=name))
+
+        with self.assertNumQueries(1):
+            formset = self.IngredientFormSet(instance=self.recipe)
+            names = [form.initial.get('ingredient') for form in formset.forms]
+
+        self.assertEqual(names, ['potato', 'butter', 'milk', 'salt', 'pepper', None])
+
+    def test_resolves_ingredients_in_bulk(self):
+        potato = Ingredient.objects.create(name='potato')
+        formset = self.IngredientFormSet(
+                self.formset_data(['Potato', 'butter', 'milk', 'salt', 'pepper']),
+                instance=self.recipe)
+
+        # existing rows, existing ingredients, one insert (wrapped in a
+        # savepoint outside of postgres) and reading the new ids back
+        expected_queries = 4 if connection.vendor == 'postgresql' else 6
+        with self.assertNumQueries(expected_queries):
+            self.assertTrue(formset.is_valid())
+
+        formset.save()
+        self.assertEqual(Ingredient.objects.count(), 5)
+        self.assertEqual(self.recipe.measuredingredient_set.first().ingredient, potato)
+        self.assertEqual(sorted(self.recipe.ingredients.values_list('name', flat=True)),
+                ['butter', 'milk', 'pepper', 'potato', 'salt'])
+
+    def test_ingredient_names_normalized(self):
+        formset = self.IngredientFormSet(
+                self.formset_data(['  Sweet   Potato ', 'sweet potato']),
+                instance=self.recipe)
+        self.assertTrue(formset.is_valid())
+        formset.save()
+        self.assertEqual(list(Ingredient.objects.values_list('name', flat=True)),
+                ['sweet potato'])
+
+    def test_invalid_ingredient_names_are_not_created(self):
+        formset = self.IngredientFormSet(self.formset_data(['x' * 129, 'butter']),
+                instance=self.recipe)
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(list(Ingredient.objects.values_list('name', flat=True)), ['butter'])
+
+    def test_deleted_and_invalid_rows_create_no_ingredients(self):
+        data = self.formset_data(['potato', 'butter', 'milk'])
+        data['measuredingredient_set-0-DELETE'] = 'on'
+        data['measuredingredient_set-1-amount'] = 'string'
+        formset = self.IngredientFormSet(data, instance=self.recipe)
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(list(Ingredient.objects.values_list('name', flat=True)), ['milk'])
+
+        data['measuredingredient_set-1-amount'] = 1
+        formset = self.IngredientFormSet(data, instance=self.recipe)
+        self.assertTrue(formset.is_valid())
+        formset.save()
+        self.assertEqual(sorted(self.recipe.ingredients.values_list('name', flat=True)),
+                ['butter', 'milk'])
+        self.assertFalse(Ingredient.objects.filter(name='potato').exists())
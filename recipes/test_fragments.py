@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from stockpot.db import replicas
+from . import fragments
+from .models import Recipe, RecipeSummary
+
+
+class RecipeFragmentTest(TestCase):
+
+
+    def setUp(self):
+        cache.clear()
+        self.recipe = Recipe.objects.create(title='Tomato Soup')
+
+    def test_rendered_fragment_served_from_cache(self):
+        html, version = fragments.get_fragment(self.recipe.pk)
+        self.assertIsNone(html)
+        fragments.render_fragment(self.recipe.summary, version)
+
+        html, version = fragments.get_fragment(self.recipe.pk)
+        self.assertIn('Tomato Soup', html)
+
+    def test_fragment_of_read_raced_by_a_change_not_cached(self):
+        html, version = fragments.get_fragment(self.recipe.pk)
+        stale = RecipeSummary.objects.get(pk=self.recipe.pk)
+        # the change commits after the read, before the fragment is stored
+        Recipe.objects.filter(pk=self.recipe.pk).update(title='Pea Soup')
+        fragments.invalidate(self.recipe.pk)
+        fragments.render_fragment(stale, version)
+
+        self.assertIsNone(fragments.get_fragment(self.recipe.pk)[0])
+
+    def test_render_fragments_loads_only_missing_recipes(self):
+        other = Recipe.objects.create(title='Pea Soup')
+        pks = [self.recipe.pk, other.pk]
+        fragments.render_fragments([self.recipe.pk], RecipeSummary.objects.in_bulk)
+
+        loaded = []
+        def load(pks):
+            loaded.extend(pks)
+            return RecipeSummary.objects.in_bulk(pks)
+        found = fragments.render_fragments(pks + [0], load)
+
+        self.assertEqual(loaded, [other.pk, 0])
+        self.assertEqual(sorted(found), sorted(pks))
+        self.assertIn('Pea Soup', found[other.pk])
+
+    def test_missing_fragments_loaded_from_primary(self):
+        # as for a safe request, with nothing written yet
+        replicas.reset()
+        replicas.allow_replicas(True)
+        self.addCleanup(replicas.reset)
+
+        allowed = []
+        def load(pks):
+            allowed.append(replicas.replicas_allowed())
+            return RecipeSummary.objects.in_bulk(pks)
+        fragments.render_fragments([self.recipe.pk], load)
+
+        self.assertEqual(allowed, [False])
+        self.assertTrue(replicas.replicas_allowed())
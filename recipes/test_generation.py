@@ -0,0 +1,40 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from .generation import SharedGeneration
+
+
+@override_settings(GENERATION_CHECK_INTERVAL=60)
+class SharedGenerationTest(SimpleTestCase):
+
+
+    def setUp(self):
+        cache.delete('test:generation')
+        self.generation = SharedGeneration('test:generation')
+
+    def test_read_from_the_cache_once_per_interval(self):
+        first = self.generation.current()
+        with mock.patch.object(cache, 'get', wraps=cache.get) as get:
+            self.assertEqual(self.generation.current(), first)
+            self.assertEqual(self.generation.current(), first)
+        self.assertEqual(get.call_count, 0)
+
+    def test_own_changes_seen_right_away(self):
+        first = self.generation.current()
+        self.assertEqual(self.generation.bump(), first + 1)
+        self.assertEqual(self.generation.current(), first + 1)
+
+    def test_other_processes_changes_seen_after_the_interval(self):
+        first = self.generation.current()
+        SharedGeneration('test:generation').bump()
+
+        self.assertEqual(self.generation.current(), first)
+        with override_settings(GENERATION_CHECK_INTERVAL=0):
+            self.assertEqual(self.generation.current(), first + 1)
+
+    def test_starts_again_when_evicted(self):
+        self.generation.current()
+        cache.delete('test:generation')
+        self.assertEqual(self.generation.bump(), cache.get('test:generation'))
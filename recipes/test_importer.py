@@ -0,0 +1,174 @@
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+
+from .export import export_lines
+from .management.commands.import_recipes import import_shard
+from .importer import RecipeImporter, RecipeImportError, read_records
+from .ingredient_index import IngredientIndex, ingredient_index
+from .models import Recipe, RecipeStep, Ingredient, IngredientManager, MeasuredIngredient
+
+
+def recipe_record(title, *ingredients, author=None):
+    return {
+        'title': title,
+        'author': author and {'username': author},
+        'steps': [f'Make the {title.lower()}.'],
+        'ingredients': [{'name': name, 'amount': '1.5', 'units': 'c'} for name in ingredients],
+    }
+
+
+class RecipeImporterTest(TestCase):
+
+
+    def test_import_batch_writes_recipes_steps_and_ingredients(self):
+        user = User.objects.create_user(username='cook', password='password')
+        pks = RecipeImporter().import_batch([
+            recipe_record('Tomato Soup', 'Tomato', 'butter', author='cook'),
+            recipe_record('Toast', 'bread', 'Butter ', author='nobody'),
+        ])
+
+        soup, toast = Recipe.objects.filter(pk__in=pks).order_by('pk')
+        self.assertEqual(soup.author, user.profile)
+        self.assertIsNone(toast.author)
+        self.assertEqual([step.body for step in soup.steps.all()], ['Make the tomato soup.'])
+        self.assertEqual(sorted(Ingredient.objects.values_list('name', flat=True)),
+                ['bread', 'butter', 'tomato'])
+        self.assertEqual(MeasuredIngredient.objects.filter(recipe=toast).count(), 2)
+        self.assertEqual((soup.summary.author_username, soup.summary.step_count,
+            soup.summary.ingredient_count), ('cook', 1, 2))
+
+    def test_units_stored_with_quantities(self):
+        importers = [RecipeImporter()]
+        if connection.vendor == 'postgresql':
+            importers.append(RecipeImporter(use_copy=True))
+        for recipe_importer in importers:
+            record = recipe_record('Toast', 'bread')
+            record['ingredients'] += [{'name': 'butter', 'amount': '2', 'units': 'Ounce'},
+                {'name': 'jam', 'amount': '1', 'units': 'dollop'}]
+            pk, = recipe_importer.import_batch([record])
+
+            self.assertEqual(sorted(MeasuredIngredient.objects.filter(recipe_id=pk)
+                .values_list('ingredient__name', 'units', 'quantity', 'dimension')), [
+                ('bread', 'c', Decimal('354.882'), 'volume'),
+                ('butter', 'oz', Decimal('56.699'), 'mass'),
+                ('jam', 'dollop', None, ''),
+            ])
+
+    def test_known_ingredients_are_not_looked_up_again(self):
+        recipe_importer = RecipeImporter()
+        recipe_importer.import_batch([recipe_record('Toast', 'bread', 'butter')])
+
+        with mock.patch.object(IngredientManager, 'resolve') as resolve:
+            recipe_importer.import_batch([recipe_record('More Toast', 'bread', 'butter')])
+        resolve.assert_not_called()
+        self.assertEqual(MeasuredIngredient.objects.count(), 4)
+
+    @override_settings(GENERATION_CHECK_INTERVAL=0)
+    def test_other_processes_catch_up_with_a_batch_without_rebuilding(self):
+        other_process = IngredientIndex()
+        other_process.rank([])
+        self.addCleanup(ingredient_index.clear)
+
+        toast, = RecipeImporter().import_batch([recipe_record('Toast', 'bread', 'butter')])
+
+        bread = Ingredient.objects.get(name='bread')
+        with mock.patch.object(other_process, '_build') as build:
+            self.assertEqual(other_process.rank([bread.pk]), [(toast, 1, 1)])
+        build.assert_not_called()
+
+    def test_bad_records_are_rejected(self):
+        with self.assertRaises(RecipeImportError):
+            RecipeImporter().import_batch([{'title': ''}])
+        with self.assertRaises(RecipeImportError):
+            RecipeImporter().import_batch([{'title': 'Soup', 'ingredients': [{'amount': 1}]}])
+
+    def test_read_records_round_trips_export(self):
+        RecipeImporter().import_batch([recipe_record('Toast', 'bread', 'butter')])
+        for format in ('ndjson', 'csv'):
+            records = list(read_records(io.StringIO(''.join(export_lines(format))), format))
+            self.assertEqual(records[0]['title'], 'Toast')
+            self.assertEqual(records[0]['steps'], ['Make the toast.'])
+            self.assertEqual(records[0]['ingredients'][0]['name'], 'bread')
+
+
+class ImportRecipesCommandTest(TestCase):
+
+
+    def write_input(self, records):
+        handle, path = tempfile.mkstemp(suffix='.ndjson')
+        with os.fdopen(handle, 'w') as output:
+            for record in records:
+                output.write(json.dumps(record) + '\n')
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_imports_file_in_batches(self):
+        path = self.write_input([recipe_record(f'Recipe {i}', 'salt') for i in range(5)])
+
+        out = io.StringIO()
+        call_command('import_recipes', path, batch_size=2, stdout=out)
+
+        self.assertIn('Imported 5 recipes.', out.getvalue())
+        self.assertEqual(Recipe.objects.count(), 5)
+        self.assertEqual(RecipeStep.objects.count(), 5)
+
+    def test_resumes_from_checkpoint(self):
+        path = self.write_input([recipe_record(f'Recipe {i}', 'salt') for i in range(5)])
+        checkpoint = path + '.checkpoint'
+        self.addCleanup(os.remove, checkpoint)
+        with open(checkpoint, 'w') as output:
+            json.dump({'position': 3}, output)
+
+        call_command('import_recipes', path, checkpoint=checkpoint, stdout=io.StringIO())
+
+        self.assertEqual(sorted(Recipe.objects.values_list('title', flat=True)),
+                ['Recipe 3', 'Recipe 4'])
+        with open(checkpoint) as checkpoint_file:
+            self.assertEqual(json.load(checkpoint_file), {'position': 5})
+
+    def test_checkpoint_saved_before_the_batch_side_effects(self):
+        path = self.write_input([recipe_record(f'Recipe {i}', 'salt') for i in range(5)])
+        checkpoint = path + '.checkpoint'
+        self.addCleanup(os.remove, checkpoint)
+
+        with mock.patch('recipes.importer.ingredient_index.reindex_recipes',
+                side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                call_command('import_recipes', path, batch_size=2, checkpoint=checkpoint,
+                        stdout=io.StringIO())
+
+        # the committed batch isn't imported again on resume
+        with open(checkpoint) as checkpoint_file:
+            self.assertEqual(json.load(checkpoint_file), {'position': 2})
+
+    def test_shards_decode_only_their_own_records(self):
+        path = self.write_input([recipe_record(f'Recipe {i}', 'salt') for i in range(4)])
+        with open(path) as stream:
+            lines = stream.readlines()
+        # a record only the second shard reads
+        lines[1] = '{not json\n'
+        with open(path, 'w') as output:
+            output.writelines(lines)
+
+        options = {'path': path, 'format': 'ndjson', 'batch_size': 10, 'copy': False,
+                'checkpoint': None}
+        self.assertEqual(import_shard(options, shard=0, shards=2), 2)
+        self.assertEqual(sorted(Recipe.objects.values_list('title', flat=True)),
+                ['Recipe 0', 'Recipe 2'])
+
+    def test_malformed_input_raises_command_error(self):
+        path = self.write_input([])
+        with open(path, 'w') as output:
+            output.write('{not json\n')
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, stdout=io.StringIO())
@@ -0,0 +1,133 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .ingredient_index import IngredientIndex, _delta_key
+from .models import Recipe, Ingredient, MeasuredIngredient
+
+
+class IngredientIndexTest(TestCase):
+
+
+    def setUp(self):
+        cache.clear()
+        self.index = IngredientIndex()
+        self.bread = Ingredient.objects.create(name='bread')
+        self.cheese = Ingredient.objects.create(name='cheese')
+        self.butter = Ingredient.objects.create(name='butter')
+        self.tomato = Ingredient.objects.create(name='tomato')
+
+        self.grilled_cheese = self.create_recipe('Grilled Cheese',
+                self.bread, self.cheese, self.butter)
+        self.toast = self.create_recipe('Toast', self.bread, self.butter)
+        self.soup = self.create_recipe('Tomato Soup', self.tomato, self.butter)
+
+    def create_recipe(self, title, *ingredients):
+        recipe = Recipe.objects.create(title=title)
+        for ingredient in ingredients:
+            MeasuredIngredient.objects.create(recipe=recipe, ingredient=ingredient)
+        return recipe
+
+    def test_ranks_by_missing_then_matched(self):
+        ranked = self.index.rank([self.bread.pk, self.butter.pk])
+        self.assertEqual(ranked, [
+            (self.toast.pk, 2, 0),
+            (self.grilled_cheese.pk, 2, 1),
+            (self.soup.pk, 1, 1),
+        ])
+
+    def test_limit(self):
+        ranked = self.index.rank([self.bread.pk, self.butter.pk], limit=1)
+        self.assertEqual(ranked, [(self.toast.pk, 2, 0)])
+
+    def test_unknown_ingredients_match_nothing(self):
+        self.assertEqual(self.index.rank([]), [])
+        self.assertEqual(self.index.rank([12345]), [])
+
+    def test_built_with_a_single_query(self):
+        with self.assertNumQueries(1):
+            self.index.rank([self.bread.pk])
+        with self.assertNumQueries(0):
+            self.index.rank([self.cheese.pk, self.tomato.pk])
+
+    def test_reindex_recipe_updates_postings(self):
+        self.index.rank([self.bread.pk])
+
+        MeasuredIngredient.objects.filter(recipe=self.toast, ingredient=self.butter).delete()
+        MeasuredIngredient.objects.create(recipe=self.toast, ingredient=self.cheese)
+        self.index.reindex_recipe(self.toast.pk)
+
+        with self.assertNumQueries(0):
+            ranked = self.index.rank([self.bread.pk, self.cheese.pk])
+        self.assertEqual(ranked[0], (self.toast.pk, 2, 0))
+
+    @override_settings(GENERATION_CHECK_INTERVAL=0)
+    def test_rebuilds_when_another_process_changes_the_index(self):
+        self.index.rank([self.bread.pk])
+
+        other_process = IngredientIndex()
+        other_process.rank([self.bread.pk])
+        soup_id = self.soup.pk
+        self.soup.delete()
+        other_process.reindex_recipe(soup_id)
+
+        ranked = self.index.rank([self.butter.pk])
+        self.assertNotIn(soup_id, [recipe_id for recipe_id, matched, missing in ranked])
+
+    @override_settings(GENERATION_CHECK_INTERVAL=0)
+    def test_applies_other_processes_changes_in_place(self):
+        self.index.rank([self.bread.pk])
+
+        other_process = IngredientIndex()
+        MeasuredIngredient.objects.create(recipe=self.soup, ingredient=self.bread)
+        other_process.reindex_recipe(self.soup.pk)
+        MeasuredIngredient.objects.filter(recipe=self.toast).delete()
+        other_process.reindex_recipe(self.toast.pk)
+
+        # one query for the two changed recipes, no rebuild
+        with mock.patch.object(self.index, '_build') as build, self.assertNumQueries(1):
+            ranked = self.index.rank([self.bread.pk])
+        build.assert_not_called()
+        self.assertEqual(ranked, [(self.soup.pk, 1, 2), (self.grilled_cheese.pk, 1, 2)])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.index.usage([self.butter.pk]), {self.butter.pk: 2})
+
+    @override_settings(GENERATION_CHECK_INTERVAL=0)
+    def test_reindexes_several_recipes_as_one_change(self):
+        self.index.rank([self.bread.pk])
+        generation = self.index.generation()
+
+        other_process = IngredientIndex()
+        MeasuredIngredient.objects.create(recipe=self.soup, ingredient=self.bread)
+        MeasuredIngredient.objects.filter(recipe=self.toast).delete()
+        other_process.reindex_recipes([self.soup.pk, self.toast.pk])
+        self.assertEqual(other_process.generation(), generation + 1)
+
+        with mock.patch.object(self.index, '_build') as build:
+            ranked = self.index.rank([self.bread.pk])
+        build.assert_not_called()
+        self.assertEqual(ranked, [(self.soup.pk, 1, 2), (self.grilled_cheese.pk, 1, 2)])
+
+    @override_settings(GENERATION_CHECK_INTERVAL=0)
+    def test_rebuilds_when_changes_are_gone_from_the_log(self):
+        self.index.rank([self.bread.pk])
+
+        other_process = IngredientIndex()
+        MeasuredIngredient.objects.create(recipe=self.soup, ingredient=self.bread)
+        other_process.reindex_recipe(self.soup.pk)
+        cache.delete(_delta_key(other_process.generation()))
+
+        with mock.patch.object(self.index, '_build', wraps=self.index._build) as build:
+            ranked = self.index.rank([self.bread.pk])
+        build.assert_called_once_with()
+        self.assertIn(self.soup.pk, [recipe_id for recipe_id, matched, missing in ranked])
+
+    def test_notices_other_processes_changes_once_the_check_interval_passed(self):
+        self.index.rank([self.bread.pk])
+        IngredientIndex().invalidate()
+
+        with self.assertNumQueries(0):
+            self.index.rank([self.bread.pk])
+        with override_settings(GENERATION_CHECK_INTERVAL=0), self.assertNumQueries(1):
+            self.index.rank([self.bread.pk])
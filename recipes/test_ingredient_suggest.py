@@ -0,0 +1,64 @@
+from django.test import TestCase, override_settings
+
+from .ingredient_index import ingredient_index
+from .ingredient_suggest import IngredientSuggester
+from .models import Recipe, Ingredient, MeasuredIngredient
+
+
+class IngredientSuggesterTest(TestCase):
+
+
+    def setUp(self):
+        ingredient_index.clear()
+        self.suggester = IngredientSuggester()
+        ingredients = {name: Ingredient.objects.create(name=name)
+                for name in ('brown sugar', 'broth', 'bread', 'butter', 'sugar')}
+        for title, names in (('Toast', ['bread', 'butter']), ('Soup', ['broth', 'butter']),
+                ('Cake', ['butter', 'brown sugar', 'sugar']), ('Stew', ['broth'])):
+            recipe = Recipe.objects.create(title=title)
+            for name in names:
+                MeasuredIngredient.objects.create(recipe=recipe, ingredient=ingredients[name])
+
+    def test_prefix_matches_most_used_first(self):
+        self.assertEqual(self.suggester.suggest('br'), ['broth', 'bread', 'brown sugar'])
+        self.assertEqual(self.suggester.suggest('bro'), ['broth', 'brown sugar'])
+        self.assertEqual(self.suggester.suggest('b', limit=2), ['butter', 'broth'])
+
+    def test_no_match(self):
+        self.assertEqual(self.suggester.suggest(''), [])
+        self.assertEqual(self.suggester.suggest('zucchini'), [])
+
+    def test_answers_from_memory(self):
+        self.suggester.suggest('b')
+        with self.assertNumQueries(0):
+            self.suggester.suggest('bu')
+
+    def test_add_inserts_new_names(self):
+        self.suggester.suggest('b')
+        basil = Ingredient.objects.create(name='basil')
+
+        self.suggester.add([(basil.name, basil.pk)])
+
+        with self.assertNumQueries(0):
+            self.assertIn('basil', self.suggester.suggest('ba'))
+
+    @override_settings(GENERATION_CHECK_INTERVAL=0)
+    def test_reloads_when_another_process_adds_names(self):
+        self.suggester.suggest('b')
+
+        other_process = IngredientSuggester()
+        bacon = Ingredient.objects.create(name='bacon')
+        other_process.add([(bacon.name, bacon.pk)])
+
+        self.assertEqual(self.suggester.suggest('ba'), ['bacon'])
+
+    def test_reranks_when_usage_changes(self):
+        self.assertEqual(self.suggester.suggest('br', limit=1), ['broth'])
+
+        for title in ('Sandwich', 'Pudding'):
+            recipe = Recipe.objects.create(title=title)
+            MeasuredIngredient.objects.create(recipe=recipe,
+                    ingredient=Ingredient.objects.get(name='bread'))
+            ingredient_index.reindex_recipe(recipe.pk)
+
+        self.assertEqual(self.suggester.suggest('br', limit=1), ['bread'])
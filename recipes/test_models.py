@@ -1,6 +1,13 @@
-from django.test import TestCase
+from unittest import mock
 
-from .models import Recipe, RecipeStep, Ingredient, MeasuredIngredient
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from . import nutrition, summary_triggers
+from .ingredient_index import ingredient_index
+from .models import Recipe, RecipeStep, RecipeSummary, Ingredient, IngredientManager, \
+        MeasuredIngredient
 
 
 class RecipeModelTest(TestCase):
@@ -83,6 +90,36 @@ class RecipeModelTest(TestCase):
         self.assertEqual(Ingredient.objects.count(), 3)
         self.assertEqual(Recipe.objects.count(), 0)
 
+    def test_ingredient_names_are_normalized_and_unique(self):
+        ingredient = Ingredient.objects.create(name=' Brown   SUGAR')
+        self.assertEqual(ingredient.name, 'brown sugar')
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Ingredient.objects.create(name='brown sugar')
+
+    def test_resolve_creates_missing_ingredients(self):
+        flour = Ingredient.objects.create(name='flour')
+
+        ingredients = Ingredient.objects.resolve(['Flour', 'eggs ', 'flour'])
+
+        self.assertEqual(set(ingredients), {'flour', 'eggs'})
+        self.assertEqual(ingredients['flour'], flour)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_resolve_survives_concurrent_insert(self):
+        # another writer created flour between our lookup and our insert
+        flour = Ingredient.objects.create(name='flour')
+        Ingredient.objects._insert_missing({'flour', 'eggs'}, 'default')
+        self.assertEqual(Ingredient.objects.count(), 2)
+        self.assertEqual(Ingredient.objects.get(name='flour'), flour)
+
+    def test_resolve_inserts_on_write_database(self):
+        # reads routed to a replica, which has no connection here
+        with mock.patch.object(IngredientManager, 'db', new_callable=mock.PropertyMock,
+                return_value='replica_0'):
+            ingredients = Ingredient.objects.resolve(['eggs'])
+        self.assertEqual(ingredients['eggs'], Ingredient.objects.get(name='eggs'))
+
     def delete_ingredient_from_all_recipes(self):
         recipe1 = Recipe.objects.create(title="Grilled Cheese")
         recipe2 = Recipe.objects.create(title="Cheddar Soup")
@@ -98,3 +135,96 @@ class RecipeModelTest(TestCase):
         self.assertEqual(MeasuredIngredient.objects.count(), 1)
         self.assertEqual(recipe2.ingredients.count(), 0)
         self.assertEqual(recipe1.ingredients.count(), 1)
+
+
+class RecipeSummaryTest(TestCase):
+
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cook', password='password')
+        self.recipe = Recipe.objects.create(title='Stew', author=self.user.profile)
+
+    def summary(self):
+        return RecipeSummary.objects.get(recipe=self.recipe)
+
+    def test_created_with_the_recipe(self):
+        summary = self.summary()
+        self.assertEqual((summary.title, summary.author_username), ('Stew', 'cook'))
+        self.assertEqual((summary.step_count, summary.ingredient_count), (0, 0))
+
+    def test_counts_steps_and_ingredients(self):
+        RecipeStep.objects.bulk_create([RecipeStep(recipe=self.recipe, body=body)
+            for body in ('Chop.', 'Simmer.', 'Serve.')])
+        carrot = Ingredient.objects.create(name='carrot')
+        MeasuredIngredient.objects.create(recipe=self.recipe, ingredient=carrot)
+        self.assertEqual((self.summary().step_count, self.summary().ingredient_count), (3, 1))
+
+        self.recipe.steps.filter(body='Chop.').delete()
+        other = Recipe.objects.create(title='Soup')
+        RecipeStep.objects.filter(body='Serve.').update(recipe=other)
+
+        self.assertEqual(self.summary().step_count, 1)
+        self.assertEqual(other.summary.step_count, 1)
+
+    def test_follows_title_and_username_changes(self):
+        self.recipe.title = 'Beef Stew'
+        self.recipe.save()
+        self.user.username = 'chef'
+        self.user.save()
+
+        summary = self.summary()
+        self.assertEqual((summary.title, summary.author_username), ('Beef Stew', 'chef'))
+
+    def test_deleted_with_the_recipe(self):
+        RecipeStep.objects.create(recipe=self.recipe, body='Chop.')
+        self.recipe.delete()
+        self.assertFalse(RecipeSummary.objects.exists())
+
+    def test_unsupported_database_refused(self):
+        connection = mock.Mock(vendor='mysql')
+        connection.introspection.table_names.return_value = ['recipes_recipesummary']
+        with self.assertRaises(NotImplementedError):
+            summary_triggers.install(connection)
+
+
+class RecipeRefreshTest(TransactionTestCase):
+
+
+    def setUp(self):
+        patcher = mock.patch.object(nutrition, 'refresh_recipes')
+        self.refresh_nutrition = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(ingredient_index, 'reindex_recipes')
+        self.reindex = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_recipes_refreshed_once_per_transaction(self):
+        with transaction.atomic():
+            soup = Recipe.objects.create(title='Tomato Soup')
+            salad = Recipe.objects.create(title='Salad')
+            for name in ('tomato', 'onion', 'salt'):
+                MeasuredIngredient.objects.create(recipe=soup,
+                        ingredient=Ingredient.objects.create(name=name))
+            RecipeStep.objects.create(recipe=soup, body='Chop.')
+            RecipeStep.objects.create(recipe=salad, body='Toss.')
+            self.refresh_nutrition.assert_not_called()
+
+        self.refresh_nutrition.assert_called_once_with(
+                sorted([soup.pk, salad.pk]), using='default')
+        self.reindex.assert_called_once_with({soup.pk, salad.pk})
+
+    def test_refresh_dropped_by_a_savepoint_rollback_queued_again(self):
+        soup = Recipe.objects.create(title='Tomato Soup')
+        self.refresh_nutrition.reset_mock()
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    Recipe.objects.create(title='Salad')
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+            soup.title = 'Pea Soup'
+            soup.save()
+
+        self.refresh_nutrition.assert_called_once_with([soup.pk], using='default')
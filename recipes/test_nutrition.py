@@ -0,0 +1,171 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.urlresolvers import reverse
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from . import nutrition
+from .models import Recipe, Ingredient, MeasuredIngredient, RecipeNutrition
+
+
+TABLE = '''name,unit,calories,protein,fat,carbohydrate,cost
+Flour,cup,455,13,1.2,95,0.5
+milk,ml,0.6,0.034,0.01,0.05,0.002
+egg,each,70,6,5,0.5,0.3
+'''
+
+
+def write_table(test, content=TABLE):
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(fd, 'w') as table:
+        table.write(content)
+    test.addCleanup(os.remove, path)
+    return path
+
+
+class NutrientTableTest(TestCase):
+
+
+    def test_read_rejects_unknown_unit(self):
+        with self.assertRaisesRegex(ValueError, 'Line 2'):
+            nutrition.NutrientTable.read(io.StringIO('name,unit,calories\nflour,handful,1\n'))
+
+    def test_bad_table_read_once_until_it_changes(self):
+        with override_settings(NUTRIENT_TABLE=write_table(self, 'name,unit\nflour,handful\n')):
+            with mock.patch.object(nutrition.NutrientTable, 'read',
+                    wraps=nutrition.NutrientTable.read) as read:
+                for attempt in range(2):
+                    with self.assertRaisesRegex(nutrition.NutrientTableError, 'handful'):
+                        nutrition.nutrient_table()
+            self.assertEqual(read.call_count, 1)
+
+    @override_settings(NUTRIENT_TABLE='/nonexistent/nutrients.csv')
+    def test_missing_table(self):
+        with self.assertRaisesRegex(nutrition.NutrientTableError, 'nutrients.csv'):
+            nutrition.nutrient_table()
+
+    def test_read_rejects_values_that_are_not_finite(self):
+        with self.assertRaisesRegex(ValueError, 'Line 2'):
+            nutrition.NutrientTable.read(io.StringIO('name,unit,calories\nflour,cup,inf\n'))
+
+    def test_totals(self):
+        table = nutrition.NutrientTable.read(io.StringIO(TABLE))
+        flour, milk, egg = (Ingredient.objects.create(name=name)
+                for name in ('flour', 'milk', 'egg'))
+        pancakes, omelette, bread, toast = (Recipe.objects.create(title=title)
+                for title in ('Pancakes', 'Omelette', 'Bread', 'Toast'))
+        for recipe, ingredient, amount, units in (
+                (pancakes, flour, 2, 'c'), (pancakes, milk, 1, 'c'), (pancakes, egg, 2, ''),
+                (omelette, egg, 1, 'c'), (bread, flour, 1, 'handful')):
+            MeasuredIngredient.objects.create(recipe=recipe, ingredient=ingredient,
+                    amount=amount, units=units)
+        pks = [pancakes.pk, omelette.pk, bread.pk, toast.pk]
+
+        for every in (False, True):
+            found = nutrition.totals(pks, table, every=every)
+
+            values, complete = found[pancakes.pk]
+            self.assertTrue(complete)
+            self.assertAlmostEqual(values[0], 2 * 455 + 236.588 * 0.6 + 2 * 70, places=2)
+            self.assertAlmostEqual(values[4], 2 * 0.5 + 236.588 * 0.002 + 2 * 0.3, places=2)
+            # the table counts eggs, it can't tell how many are in a cup
+            self.assertEqual(found[omelette.pk], ((0, 0, 0, 0, 0), False))
+            # in units the registry doesn't know
+            self.assertEqual(found[bread.pk], ((0, 0, 0, 0, 0), False))
+            self.assertNotIn(toast.pk, found)
+
+
+class UpdateRecipesTest(TestCase):
+
+
+    def setUp(self):
+        settings = override_settings(NUTRIENT_TABLE=write_table(self))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.pancakes = Recipe.objects.create(title='Pancakes', servings=4)
+        for name, amount, units in (('flour', 2, 'c'), ('milk', 1, 'c'), ('egg', 2, '')):
+            MeasuredIngredient.objects.create(recipe=self.pancakes,
+                    ingredient=Ingredient.objects.create(name=name), amount=amount, units=units)
+        self.toast = Recipe.objects.create(title='Toast')
+
+    def test_stores_totals(self):
+        self.assertEqual(nutrition.update_recipes(), (2, 1))
+
+        stored = RecipeNutrition.objects.get(recipe=self.pancakes)
+        self.assertAlmostEqual(stored.calories, 1191.953, places=2)
+        self.assertTrue(stored.complete)
+        self.assertAlmostEqual(stored.per_serving()['calories'], 1191.953 / 4, places=2)
+        self.assertFalse(RecipeNutrition.objects.filter(recipe=self.toast).exists())
+
+    def test_rerun_changes_nothing(self):
+        nutrition.update_recipes()
+        self.assertEqual(nutrition.update_recipes(), (2, 0))
+
+    def test_unknown_ingredient_marks_incomplete(self):
+        MeasuredIngredient.objects.create(recipe=self.pancakes,
+                ingredient=Ingredient.objects.create(name='sugar'), amount=1, units='c')
+
+        nutrition.update_recipes([self.pancakes.pk])
+
+        self.assertFalse(RecipeNutrition.objects.get(recipe=self.pancakes).complete)
+
+    def test_removed_ingredients_remove_nutrition(self):
+        nutrition.update_recipes()
+        MeasuredIngredient.objects.filter(recipe=self.pancakes).delete()
+
+        self.assertEqual(nutrition.update_recipes([self.pancakes.pk]), (1, 1))
+
+        self.assertFalse(RecipeNutrition.objects.exists())
+
+    def test_table_change_picked_up(self):
+        nutrition.update_recipes()
+        with override_settings(NUTRIENT_TABLE=write_table(self, TABLE.replace('455', '400'))):
+            self.assertEqual(nutrition.update_recipes(), (2, 1))
+
+    @override_settings(NUTRIENT_TABLE=None)
+    def test_nothing_without_table(self):
+        self.assertEqual(nutrition.update_recipes(), (0, 0))
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('update_nutrition', stdout=out)
+        self.assertIn('Updated the nutrition of 1 of 2 recipes.', out.getvalue())
+
+    def test_command_reports_bad_table(self):
+        with override_settings(NUTRIENT_TABLE=write_table(self, 'name,unit\nflour,handful\n')):
+            with self.assertRaisesRegex(CommandError, 'handful'):
+                call_command('update_nutrition', stdout=io.StringIO())
+
+    def test_shown_on_recipe_page(self):
+        self.client.get(reverse('show_recipe', args=[self.pancakes.pk]))
+
+        nutrition.update_recipes()
+
+        response = self.client.get(reverse('show_recipe', args=[self.pancakes.pk]))
+        self.assertContains(response, 'Nutrition per serving')
+        self.assertContains(response, '298 kcal')
+
+
+class UpdateOnChangeTest(TransactionTestCase):
+
+
+    def test_saving_ingredients_updates_nutrition(self):
+        with override_settings(NUTRIENT_TABLE=write_table(self)):
+            recipe = Recipe.objects.create(title='Scrambled Eggs')
+            MeasuredIngredient.objects.create(recipe=recipe,
+                    ingredient=Ingredient.objects.create(name='egg'), amount=3)
+
+            self.assertAlmostEqual(RecipeNutrition.objects.get(recipe=recipe).calories, 210)
+
+    @override_settings(NUTRIENT_TABLE='/nonexistent/nutrients.csv')
+    def test_bad_table_logged_without_failing_the_change(self):
+        with self.assertLogs('recipes.nutrition', 'ERROR') as logs:
+            recipe = Recipe.objects.create(title='Scrambled Eggs')
+
+        self.assertTrue(Recipe.objects.filter(pk=recipe.pk).exists())
+        self.assertIn('Could not update the nutrition', logs.output[0])
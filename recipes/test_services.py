@@ -0,0 +1,98 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.db import DatabaseError
+from django.forms import inlineformset_factory
+from django.contrib.auth.models import User
+
+from .forms import RecipeForm, MeasuredIngredientForm, BaseMeasuredIngredientFormSet
+from .models import Recipe, RecipeStep, MeasuredIngredient
+from .services import save_recipe
+
+
+StepFormSet = inlineformset_factory(Recipe, RecipeStep, fields=('body',), extra=1)
+
+IngredientFormSet = inlineformset_factory(Recipe, MeasuredIngredient,
+        form=MeasuredIngredientForm, formset=BaseMeasuredIngredientFormSet,
+        fields=('amount', 'units', 'ingredient'), extra=1)
+
+
+class SaveRecipeTest(TestCase):
+
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='username', password='password')
+
+    def recipe_data(self, title, steps=(), ingredients=(), initial_steps=()):
+        data = {
+            'title': title,
+            'steps-TOTAL_FORMS': len(initial_steps) + len(steps),
+            'steps-INITIAL_FORMS': len(initial_steps),
+            'steps-MIN_NUM_FORMS': 0,
+            'steps-MAX_NUM_FORMS': 1000,
+            'measuredingredient_set-TOTAL_FORMS': len(ingredients),
+            'measuredingredient_set-INITIAL_FORMS': 0,
+            'measuredingredient_set-MIN_NUM_FORMS': 0,
+            'measuredingredient_set-MAX_NUM_FORMS': 1000,
+        }
+        for i, (step, body, delete) in enumerate(initial_steps):
+            data.update({f'steps-{i}-id': step.pk, f'steps-{i}-body': body})
+            if delete:
+                data[f'steps-{i}-DELETE'] = 'on'
+        for i, body in enumerate(steps, start=len(initial_steps)):
+            data[f'steps-{i}-body'] = body
+        for i, name in enumerate(ingredients):
+            data.update({
+                f'measuredingredient_set-{i}-amount': 1,
+                f'measuredingredient_set-{i}-units': 'c',
+                f'measuredingredient_set-{i}-ingredient': name,
+            })
+        return data
+
+    def bound_forms(self, data, instance=None):
+        form = RecipeForm(data, instance=instance)
+        formsets = [StepFormSet(data, instance=instance),
+                IngredientFormSet(data, instance=instance)]
+        self.assertTrue(form.is_valid() and all(formset.is_valid() for formset in formsets))
+        return form, formsets
+
+    def test_bulk_inserts_new_rows(self):
+        steps = [f'Step {i}.' for i in range(20)]
+        ingredients = [f'ingredient {i}' for i in range(20)]
+        form, formsets = self.bound_forms(self.recipe_data('Stew', steps, ingredients))
+
+        # savepoint, recipe, one insert per formset, release
+        with self.assertNumQueries(5):
+            recipe = save_recipe(form, formsets, author=self.user.profile)
+
+        self.assertEqual(recipe.author, self.user.profile)
+        self.assertEqual(list(recipe.steps.values_list('body', flat=True)), steps)
+        self.assertEqual(recipe.measuredingredient_set.count(), 20)
+
+    def test_only_writes_changed_rows(self):
+        recipe = Recipe.objects.create(title='Stew', author=self.user.profile)
+        kept, changed, removed = [RecipeStep.objects.create(recipe=recipe, body=body)
+                for body in ('Chop.', 'Simmer.', 'Burn.')]
+        data = self.recipe_data('Stew', steps=['Serve.'], initial_steps=[
+            (kept, 'Chop.', False), (changed, 'Simmer slowly.', False), (removed, 'Burn.', True)])
+        form, formsets = self.bound_forms(data, instance=recipe)
+
+        with mock.patch.object(RecipeStep, 'save', autospec=True,
+                side_effect=RecipeStep.save) as step_save:
+            save_recipe(form, formsets)
+
+        step_save.assert_called_once_with(changed, update_fields=['body'])
+        self.assertEqual(list(recipe.steps.order_by('pk').values_list('body', flat=True)),
+                ['Chop.', 'Simmer slowly.', 'Serve.'])
+
+    def test_failure_rolls_back_the_whole_recipe(self):
+        form, formsets = self.bound_forms(
+                self.recipe_data('Stew', ['Chop.'], ['carrot']))
+
+        with mock.patch.object(MeasuredIngredient.objects, 'bulk_create',
+                side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                save_recipe(form, formsets, author=self.user.profile)
+
+        self.assertEqual(Recipe.objects.count(), 0)
+        self.assertEqual(RecipeStep.objects.count(), 0)
@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from .models import Recipe, Ingredient, MeasuredIngredient
+from .shopping import shopping_list
+
+
+class ShoppingListTest(TestCase):
+
+
+    def setUp(self):
+        self.butter = Ingredient.objects.create(name='butter')
+        self.flour = Ingredient.objects.create(name='flour')
+        self.egg = Ingredient.objects.create(name='egg')
+        self.shortbread = Recipe.objects.create(title='Shortbread')
+        self.pancakes = Recipe.objects.create(title='Pancakes')
+        self.measure(self.shortbread, self.butter, 1, 'lb')
+        self.measure(self.shortbread, self.flour, 2, 'c')
+        self.measure(self.pancakes, self.butter, 2, 'tbsp')
+        self.measure(self.pancakes, self.butter, 100, 'g')
+        self.measure(self.pancakes, self.flour, 1, 'c')
+        self.measure(self.pancakes, self.egg, 2, '')
+        self.measure(self.pancakes, self.egg, 1, 'dozen')
+
+    def measure(self, recipe, ingredient, amount, unit):
+        MeasuredIngredient.objects.create(recipe=recipe, ingredient=ingredient,
+                amount=amount, units=unit)
+
+    def test_sums_per_ingredient_and_dimension(self):
+        self.assertEqual(shopping_list([self.shortbread.pk, self.pancakes.pk]), [
+            ('butter', [(Decimal('553.592'), 'g'), (Decimal('29.574'), 'ml')]),
+            ('egg', [(Decimal('2.000'), ''), (Decimal('1.000'), 'dozen')]),
+            ('flour', [(Decimal('709.764'), 'ml')]),
+        ])
+
+    def test_repeated_recipes_count_again(self):
+        self.assertEqual(shopping_list([self.pancakes.pk, self.pancakes.pk])[1],
+                ('egg', [(Decimal('4.000'), ''), (Decimal('2.000'), 'dozen')]))
+
+    def test_unknown_recipes_add_nothing(self):
+        self.assertEqual(shopping_list([]), [])
+        self.assertEqual(shopping_list([self.pancakes.pk + 100]), [])
+
+
+class ShoppingListViewTest(TestCase):
+
+
+    def create_recipe(self, title, ingredients):
+        recipe = Recipe.objects.create(title=title)
+        for ingredient in ingredients:
+            MeasuredIngredient.objects.create(recipe=recipe, ingredient=ingredient,
+                    amount=1, units='c')
+        return recipe
+
+    def test_shows_merged_list(self):
+        flour = Ingredient.objects.create(name='flour')
+        bread = self.create_recipe('Bread', [flour])
+        cake = self.create_recipe('Cake', [flour])
+
+        response = self.client.get(reverse('shopping_list'),
+                {'recipes': f'{bread.pk},{cake.pk}'})
+
+        self.assertContains(response, 'Bread')
+        self.assertContains(response, '473.176 ml flour')
+
+    def test_query_count_independent_of_recipe_count(self):
+        ingredients = [Ingredient.objects.create(name=f'ingredient {i}') for i in range(5)]
+        recipes = [self.create_recipe(f'Recipe {i}', ingredients) for i in range(50)]
+
+        # the recipe titles, the ingredients of every recipe
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('shopping_list'),
+                    {'recipes': ','.join(str(recipe.pk) for recipe in recipes)})
+        self.assertContains(response, '11.829 l ingredient 4')
+
+    def test_bad_ids_return_400(self):
+        response = self.client.get(reverse('shopping_list'), {'recipes': '1,x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_too_many_recipes_return_400(self):
+        with self.settings(SHOPPING_LIST_MAX_RECIPES=2):
+            response = self.client.get(reverse('shopping_list'), {'recipes': '1,2,3'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,134 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from . import similarity
+from .models import Recipe, Ingredient, MeasuredIngredient, SimilarRecipe
+
+
+class SignatureTest(TestCase):
+
+
+    def test_identical_sets_share_every_band(self):
+        a = similarity.signature([3, 1, 2])
+        b = similarity.signature([1, 2, 3])
+        self.assertEqual(len(a), similarity.PERMUTATIONS)
+        self.assertEqual(similarity.band_keys(a), similarity.band_keys(b))
+
+    def test_agreement_estimates_jaccard(self):
+        a = similarity.signature(range(0, 100))
+        b = similarity.signature(range(50, 150))
+        agreement = sum(x == y for x, y in zip(a, b)) / similarity.PERMUTATIONS
+        self.assertAlmostEqual(agreement, similarity.jaccard(range(0, 100), range(50, 150)),
+                delta=0.15)
+
+    def test_jaccard(self):
+        self.assertEqual(similarity.jaccard([1, 2, 3], [2, 3, 4]), 0.5)
+        self.assertEqual(similarity.jaccard([1], [2]), 0)
+
+
+class UpdateSimilarRecipesTest(TestCase):
+
+
+    def setUp(self):
+        self.ingredients = [Ingredient.objects.create(name=f'ingredient {i}') for i in range(12)]
+        self.soup = self.create_recipe('Soup', range(0, 5))
+        self.stew = self.create_recipe('Stew', range(0, 6))
+        self.salad = self.create_recipe('Salad', range(6, 12))
+
+    def create_recipe(self, title, ingredients):
+        recipe = Recipe.objects.create(title=title)
+        for i in ingredients:
+            MeasuredIngredient.objects.create(recipe=recipe, ingredient=self.ingredients[i])
+        return recipe
+
+    def similar(self, recipe):
+        return list(SimilarRecipe.objects.filter(recipe=recipe)
+                .order_by('-similarity').values_list('similar__title', 'similarity'))
+
+    def test_stores_neighbours(self):
+        looked_at, changed = similarity.update_similar_recipes()
+
+        self.assertEqual((looked_at, changed), (3, 2))
+        self.assertEqual(self.similar(self.soup), [('Stew', round(5 / 6, 6))])
+        self.assertEqual(self.similar(self.stew), [('Soup', round(5 / 6, 6))])
+        self.assertEqual(self.similar(self.salad), [])
+
+    def test_rerun_changes_nothing(self):
+        similarity.update_similar_recipes()
+        self.assertEqual(similarity.update_similar_recipes(), (3, 0))
+
+    def test_neighbour_count(self):
+        self.create_recipe('Chowder', range(0, 4))
+        similarity.update_similar_recipes(count=1)
+        self.assertEqual(self.similar(self.soup), [('Stew', round(5 / 6, 6))])
+
+    def test_changed_only_updates_affected_recipes(self):
+        similarity.update_similar_recipes()
+        MeasuredIngredient.objects.filter(recipe=self.stew).delete()
+        for i in range(6, 12):
+            MeasuredIngredient.objects.create(recipe=self.stew, ingredient=self.ingredients[i])
+
+        looked_at, changed = similarity.update_similar_recipes([self.stew.pk])
+
+        # the stew, the salad it now shares buckets with and the soup that
+        # listed it
+        self.assertEqual(looked_at, 3)
+        self.assertEqual(self.similar(self.soup), [])
+        self.assertEqual(self.similar(self.stew), [('Salad', 1.0)])
+        self.assertEqual(self.similar(self.salad), [('Stew', 1.0)])
+
+    def test_recipe_without_ingredients_loses_neighbours(self):
+        similarity.update_similar_recipes()
+        MeasuredIngredient.objects.filter(recipe=self.stew).delete()
+
+        similarity.update_similar_recipes([self.stew.pk])
+
+        self.assertEqual(self.similar(self.stew), [])
+        self.assertEqual(self.similar(self.soup), [])
+
+    def test_command_state_limits_next_run(self):
+        directory = tempfile.mkdtemp()
+        state = os.path.join(directory, 'state.json')
+        self.addCleanup(os.rmdir, directory)
+        self.addCleanup(os.remove, state)
+
+        out = io.StringIO()
+        call_command('find_similar_recipes', state=state, stdout=out)
+        self.assertIn('Updated the similar recipes of 2 of 3 recipes.', out.getvalue())
+        with open(state) as state_file:
+            self.assertIn('since', json.load(state_file))
+
+        out = io.StringIO()
+        call_command('find_similar_recipes', state=state, stdout=out)
+        self.assertIn('Updated the similar recipes of 0 of 0 recipes.', out.getvalue())
+
+    def test_shown_on_recipe_page(self):
+        similarity.update_similar_recipes()
+
+        response = self.client.get(reverse('show_recipe', args=[self.soup.pk]))
+
+        self.assertContains(response, 'You might also like')
+        self.assertContains(response, reverse('show_recipe', args=[self.stew.pk]))
+
+    def test_recipe_page_refreshed_when_neighbours_change(self):
+        self.client.get(reverse('show_recipe', args=[self.soup.pk]))
+
+        similarity.update_similar_recipes()
+
+        response = self.client.get(reverse('show_recipe', args=[self.soup.pk]))
+        self.assertContains(response, 'You might also like')
+
+    def test_recipe_page_refreshed_when_neighbour_removed(self):
+        similarity.update_similar_recipes()
+        self.client.get(reverse('show_recipe', args=[self.soup.pk]))
+
+        self.stew.delete()
+
+        response = self.client.get(reverse('show_recipe', args=[self.soup.pk]))
+        self.assertNotContains(response, 'You might also like')
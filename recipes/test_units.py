@@ -0,0 +1,98 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from . import units
+from .models import Recipe, Ingredient, MeasuredIngredient
+
+
+class UnitsTest(TestCase):
+
+
+    def test_find_by_code_or_name(self):
+        self.assertEqual(units.find('c').code, 'c')
+        self.assertEqual(units.find(' Cup ').code, 'c')
+        self.assertEqual(units.find('each').code, '')
+        self.assertIsNone(units.find('handful'))
+
+    def test_conversion_factor(self):
+        self.assertEqual(units.conversion_factor('tbsp', 'tsp'), 3)
+        self.assertEqual(units.conversion_factor('kg', 'g'), 1000)
+        self.assertIsNone(units.conversion_factor('c', 'g'))
+        self.assertIsNone(units.conversion_factor('c', 'handful'))
+
+    def test_canonical(self):
+        self.assertEqual(units.canonical(Decimal('1.5'), 'c'), (Decimal('354.882'), units.VOLUME))
+        self.assertEqual(units.canonical(2, 'lb'), (Decimal('907.185'), units.MASS))
+        self.assertEqual(units.canonical(3, ''), (Decimal('3.000'), units.COUNT))
+        self.assertEqual(units.canonical(1, 'handful'), (None, ''))
+
+    def test_readable(self):
+        self.assertEqual(units.readable(Decimal('1500'), units.MASS), (Decimal('1.500'), 'kg'))
+        self.assertEqual(units.readable(Decimal('250'), units.VOLUME), (Decimal('250.000'), 'ml'))
+        self.assertEqual(units.readable(Decimal('0.5'), units.COUNT), (Decimal('0.500'), ''))
+
+
+class QuantityTest(TestCase):
+
+
+    def setUp(self):
+        self.butter = Ingredient.objects.create(name='butter')
+        self.flour = Ingredient.objects.create(name='flour')
+        self.shortbread = Recipe.objects.create(title='Shortbread')
+        self.toast = Recipe.objects.create(title='Toast')
+        self.roux = Recipe.objects.create(title='Roux')
+
+    def measure(self, recipe, ingredient, amount, unit):
+        return MeasuredIngredient.objects.create(recipe=recipe, ingredient=ingredient,
+                amount=amount, units=unit)
+
+    def test_save_sets_quantity(self):
+        measured = self.measure(self.toast, self.butter, 1, 'tbsp')
+        measured.refresh_from_db()
+        self.assertEqual((measured.quantity, measured.dimension), (Decimal('14.787'), 'volume'))
+
+        measured.amount = 2
+        measured.units = 'oz'
+        measured.save(update_fields=['amount', 'units'])
+        measured.refresh_from_db()
+        self.assertEqual((measured.quantity, measured.dimension), (Decimal('56.699'), 'mass'))
+
+    def test_bulk_create_sets_quantity(self):
+        MeasuredIngredient.objects.bulk_create([MeasuredIngredient(recipe=self.toast,
+            ingredient=self.butter, amount=10, units='g')])
+        self.assertEqual(MeasuredIngredient.objects.get().quantity, 10)
+
+    def test_using_ingredient(self):
+        self.measure(self.shortbread, self.butter, 1, 'lb')
+        self.measure(self.toast, self.butter, 1, 'oz')
+        self.measure(self.roux, self.butter, 100, 'g')
+        self.measure(self.roux, self.butter, 100, 'g')
+        self.measure(self.roux, self.flour, 1, 'c')
+
+        def titles(recipes):
+            return sorted(recipes.values_list('title', flat=True))
+
+        self.assertEqual(titles(Recipe.objects.using_ingredient('Butter', 'g', less_than=200)),
+                ['Toast'])
+        self.assertEqual(titles(Recipe.objects.using_ingredient('butter', 'kg', at_least='0.2')),
+                ['Roux', 'Shortbread'])
+        # flour is measured in cups, not weighed
+        self.assertEqual(titles(Recipe.objects.using_ingredient('flour', 'g')), [])
+        self.assertEqual(titles(Recipe.objects.using_ingredient('flour', 'ml')), ['Roux'])
+        with self.assertRaises(ValueError):
+            Recipe.objects.using_ingredient('flour', 'handful')
+
+    def test_totals(self):
+        self.measure(self.shortbread, self.butter, 1, 'lb')
+        self.measure(self.toast, self.butter, 1, 'oz')
+        self.measure(self.roux, self.flour, 1, 'c')
+        self.measure(self.roux, self.flour, 1, 'tbsp')
+
+        totals = MeasuredIngredient.objects.totals()
+
+        self.assertEqual([(row['ingredient__name'], row['dimension'], row['total'], row['recipes'])
+            for row in totals], [
+            ('butter', 'mass', Decimal('481.942'), 2),
+            ('flour', 'volume', Decimal('251.375'), 1),
+        ])
@@ -1,19 +1,28 @@
 from django.core.urlresolvers import resolve, reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.http import HttpRequest
 from django.contrib.auth import get_user
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
 
 
 from .views import home
-from .models import Recipe, RecipeStep, Ingredient, MeasuredIngredient
+from .ingredient_index import ingredient_index
+from .ingredient_suggest import ingredient_suggester
+from .models import Recipe, RecipeStep, Ingredient, MeasuredIngredient, SimilarRecipe
 from .forms import RecipeForm
+from stockpot import page_cache
 from users.models import Profile
 
 
 class HomeViewTest(TestCase):
 
 
+    def setUp(self):
+        # cached pages outlive the rows rolled back between tests
+        cache.clear()
+
     def test_uses_correct_root_url(self):
         response = self.client.get('/')
         # test permanent url redirection code==301
@@ -33,6 +42,207 @@ class HomeViewTest(TestCase):
         self.assertIn('Tomato Soup', response.content.decode())
         self.assertIn('Grilled Cheese', response.content.decode())
 
+    def test_shows_ingredient_and_step_counts(self):
+        recipe = Recipe.objects.create(title='Tomato Soup')
+        RecipeStep.objects.create(recipe=recipe, body='Simmer.')
+        for name in ('tomato', 'basil'):
+            MeasuredIngredient.objects.create(recipe=recipe,
+                    ingredient=Ingredient.objects.create(name=name))
+
+        response = self.client.get(reverse('home'))
+
+        self.assertIn('2 ingredients, 1 step', response.content.decode())
+
+    @override_settings(RECIPE_FEED_PAGE_SIZE=2)
+    def test_paginates_newest_recipes_first(self):
+        soup = Recipe.objects.create(title='Tomato Soup')
+        cheese = Recipe.objects.create(title='Grilled Cheese')
+        salad = Recipe.objects.create(title='Caesar Salad')
+
+        response = self.client.get(reverse('home'))
+        page = response.context['page']
+
+        self.assertEqual(list(page), [salad.summary, cheese.summary])
+        self.assertFalse(page.has_previous)
+        self.assertEqual(page.next_cursor, cheese.pk)
+        self.assertNotIn(soup.summary, list(page))
+        self.assertNotIn('Tomato Soup', response.content.decode())
+
+    @override_settings(RECIPE_FEED_PAGE_SIZE=2)
+    def test_after_cursor_returns_older_recipes(self):
+        soup = Recipe.objects.create(title='Tomato Soup')
+        cheese = Recipe.objects.create(title='Grilled Cheese')
+        salad = Recipe.objects.create(title='Caesar Salad')
+
+        response = self.client.get(reverse('home'), {'after': cheese.pk})
+        page = response.context['page']
+
+        self.assertEqual(list(page), [soup.summary])
+        self.assertFalse(page.has_next)
+        self.assertEqual(page.previous_cursor, soup.pk)
+        self.assertNotIn(salad.summary, list(page))
+
+    @override_settings(RECIPE_FEED_PAGE_SIZE=2)
+    def test_before_cursor_returns_newer_recipes(self):
+        soup = Recipe.objects.create(title='Tomato Soup')
+        cheese = Recipe.objects.create(title='Grilled Cheese')
+        salad = Recipe.objects.create(title='Caesar Salad')
+        pie = Recipe.objects.create(title='Apple Pie')
+
+        response = self.client.get(reverse('home'), {'before': soup.pk})
+        page = response.context['page']
+
+        self.assertEqual(list(page), [salad.summary, cheese.summary])
+        # the newest recipe is on the page before
+        self.assertTrue(page.has_previous)
+        self.assertNotIn(pie.summary, list(page))
+        self.assertTrue(page.has_next)
+
+    def test_home_query_count_independent_of_recipe_count(self):
+        user = User.objects.create_user(username='username', password='password')
+        for i in range(10):
+            Recipe.objects.create(title=f'Recipe {i}', author=user.profile)
+
+        # the page's ids, then the summaries, which carry the usernames, of
+        # the recipes whose fragments aren't cached
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('home'))
+        self.assertIn('username', response.content.decode())
+
+        # only the ids once the fragments are cached
+        page_cache.purge('recipes')
+        with self.assertNumQueries(1):
+            self.client.get(reverse('home'))
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse('home'), {'after': 'abc'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_anonymous_page_served_from_page_cache(self):
+        Recipe.objects.create(title='Tomato Soup')
+        self.client.get(reverse('home'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertIn('Tomato Soup', response.content.decode())
+
+    def test_page_cache_purged_on_recipe_change(self):
+        soup = Recipe.objects.create(title='Tomato Soup')
+        self.client.get(reverse('home'))
+
+        Recipe.objects.create(title='Grilled Cheese')
+        response = self.client.get(reverse('home'))
+        self.assertIn('Grilled Cheese', response.content.decode())
+
+        soup.delete()
+        response = self.client.get(reverse('home'))
+        self.assertNotIn('Tomato Soup', response.content.decode())
+
+    def test_logged_in_users_bypass_page_cache(self):
+        User.objects.create_user(username='username', password='password')
+        self.client.get(reverse('home'))
+
+        self.client.login(username='username', password='password')
+        response = self.client.get(reverse('home'))
+        self.assertTemplateUsed(response, 'home.html')
+        self.assertIn('Welcome, username!', response.content.decode())
+
+
+class RecipeSearchViewTest(TestCase):
+
+
+    def setUp(self):
+        self.soup = Recipe.objects.create(title='Tomato Soup')
+        self.cheese = Recipe.objects.create(title='Grilled Cheese')
+        RecipeStep.objects.create(recipe=self.cheese, body='Butter the bread.')
+        MeasuredIngredient.objects.create(recipe=self.soup,
+                ingredient=Ingredient.objects.create(name='basil'))
+        # search vectors are normally rebuilt on commit, which never
+        # happens inside a TestCase
+        Recipe.objects.all().update_search_vectors()
+
+    def test_uses_search_template(self):
+        response = self.client.get(reverse('search_recipes'))
+        self.assertTemplateUsed(response, 'search.html')
+        self.assertIsNone(response.context['page'])
+
+    def test_matches_title_steps_and_ingredients(self):
+        for query, expected in (('soup', self.soup), ('BREAD', self.cheese),
+                ('basil', self.soup)):
+            response = self.client.get(reverse('search_recipes'), {'q': query})
+            self.assertEqual(list(response.context['page']), [expected.pk])
+            self.assertIn(expected.title, response.content.decode())
+
+    def test_every_term_must_match(self):
+        response = self.client.get(reverse('search_recipes'), {'q': 'tomato basil'})
+        self.assertEqual(list(response.context['page']), [self.soup.pk])
+
+        response = self.client.get(reverse('search_recipes'), {'q': 'tomato bread'})
+        self.assertEqual(list(response.context['page']), [])
+        self.assertIn('No recipes found.', response.content.decode())
+
+    @override_settings(RECIPE_FEED_PAGE_SIZE=1)
+    def test_results_are_paginated(self):
+        pea_soup = Recipe.objects.create(title='Pea Soup')
+        onion_soup = Recipe.objects.create(title='Onion Soup')
+        Recipe.objects.all().update_search_vectors()
+
+        response = self.client.get(reverse('search_recipes'), {'q': 'soup', 'page': 1})
+        self.assertEqual(list(response.context['page']), [onion_soup.pk])
+
+        response = self.client.get(reverse('search_recipes'), {'q': 'soup', 'page': 2})
+        self.assertEqual(list(response.context['page']), [pea_soup.pk])
+
+        response = self.client.get(reverse('search_recipes'), {'q': 'soup', 'page': 4})
+        self.assertEqual(response.status_code, 404)
+
+
+class CookableRecipesViewTest(TestCase):
+
+
+    def setUp(self):
+        ingredient_index.clear()
+        self.toast = Recipe.objects.create(title='Toast')
+        self.grilled_cheese = Recipe.objects.create(title='Grilled Cheese')
+        for name in ('bread', 'cheese'):
+            MeasuredIngredient.objects.create(recipe=self.grilled_cheese,
+                    ingredient=Ingredient.objects.resolve([name])[name])
+        MeasuredIngredient.objects.create(recipe=self.toast,
+                ingredient=Ingredient.objects.get(name='bread'))
+
+    def test_uses_cookable_recipes_template(self):
+        response = self.client.get(reverse('cookable_recipes'))
+        self.assertTemplateUsed(response, 'cookable_recipes.html')
+        self.assertEqual(response.context['results'], [])
+
+    def test_ranks_recipes_by_missing_ingredients(self):
+        response = self.client.get(reverse('cookable_recipes'), {'ingredients': ' Bread, eggs'})
+        content = response.content.decode()
+
+        self.assertEqual([missing for fragment, missing in response.context['results']], [0, 1])
+        self.assertLess(content.index('Toast'), content.index('Grilled Cheese'))
+        self.assertIn('Missing 1 ingredient', content)
+        self.assertEqual(response.context['ingredients'], 'bread, eggs')
+
+
+class SuggestIngredientsViewTest(TestCase):
+
+
+    def setUp(self):
+        ingredient_index.clear()
+        ingredient_suggester.clear()
+        for name in ('Tomato', 'tomatillo', 'basil'):
+            Ingredient.objects.create(name=name)
+
+    def test_suggests_names_by_prefix(self):
+        response = self.client.get(reverse('suggest_ingredients'), {'q': ' TOM'})
+        self.assertEqual(response.json(), {'suggestions': ['tomatillo', 'tomato']})
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+    def test_empty_query(self):
+        response = self.client.get(reverse('suggest_ingredients'))
+        self.assertEqual(response.json(), {'suggestions': []})
+
 
 class LoginTests(TestCase):
 
@@ -217,6 +427,94 @@ class RecipeShowViewTest(TestCase):
         response = self.client.get(reverse('show_recipe', args=[new_recipe.pk]))
         self.assertIn('Tomato Soup', response.content.decode())
 
+    def test_show_recipe_query_count_independent_of_recipe_size(self):
+        recipe = Recipe.objects.create(title='Tomato Soup', author=self.test_user.profile)
+        for i in range(5):
+            ingredient = Ingredient.objects.create(name=f'ingredient {i}')
+            MeasuredIngredient.objects.create(recipe=recipe, ingredient=ingredient,
+                    amount=1, units='c')
+            RecipeStep.objects.create(recipe=recipe, body=f'Step {i}.')
+
+        # conditional GET timestamps, recipe with author and user,
+        # ingredients with their names, steps, similar recipes
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('show_recipe', args=[recipe.pk]))
+        self.assertIn('ingredient 4', response.content.decode())
+        self.assertIn('Step 4.', response.content.decode())
+
+    def test_show_recipe_served_from_fragment_cache(self):
+        recipe = Recipe.objects.create(title='Tomato Soup', author=self.test_user.profile)
+        self.client.get(reverse('show_recipe', args=[recipe.pk]))
+
+        # only the conditional GET timestamp lookup
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('show_recipe', args=[recipe.pk]))
+        self.assertIn('Tomato Soup', response.content.decode())
+
+    def test_show_recipe_answers_conditional_requests(self):
+        recipe = Recipe.objects.create(title='Tomato Soup', author=self.test_user.profile)
+        url = reverse('show_recipe', args=[recipe.pk])
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_show_recipe_etag_changes_with_recipe(self):
+        recipe = Recipe.objects.create(title='Tomato Soup', author=self.test_user.profile)
+        url = reverse('show_recipe', args=[recipe.pk])
+        etag = self.client.get(url)['ETag']
+
+        RecipeStep.objects.create(recipe=recipe, body='Heat the soup.')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_fragment_cache_invalidated_on_change(self):
+        recipe = Recipe.objects.create(title='Tomato Soup', author=self.test_user.profile)
+        self.client.get(reverse('show_recipe', args=[recipe.pk]))
+
+        step = RecipeStep.objects.create(recipe=recipe, body='Heat the soup.')
+        response = self.client.get(reverse('show_recipe', args=[recipe.pk]))
+        self.assertIn('Heat the soup.', response.content.decode())
+
+        ingredient = Ingredient.objects.create(name='tomato')
+        MeasuredIngredient.objects.create(recipe=recipe, ingredient=ingredient)
+        response = self.client.get(reverse('show_recipe', args=[recipe.pk]))
+        self.assertIn('tomato', response.content.decode())
+
+        step.delete()
+        response = self.client.get(reverse('show_recipe', args=[recipe.pk]))
+        self.assertNotIn('Heat the soup.', response.content.decode())
+
+        self.test_user.username = 'renamed'
+        self.test_user.save()
+        response = self.client.get(reverse('show_recipe', args=[recipe.pk]))
+        self.assertIn('renamed', response.content.decode())
+
+    def test_renaming_a_similar_recipe_updates_the_recipes_listing_it(self):
+        recipe = Recipe.objects.create(title='Tomato Soup', author=self.test_user.profile)
+        similar = Recipe.objects.create(title='Pea Soup', author=self.test_user.profile)
+        SimilarRecipe.objects.create(recipe=recipe, similar=similar, similarity=0.5,
+                computed=timezone.now())
+        url = reverse('show_recipe', args=[recipe.pk])
+        etag = self.client.get(url)['ETag']
+
+        similar = Recipe.objects.get(pk=similar.pk)
+        similar.title = 'Split Pea Soup'
+        similar.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Split Pea Soup', response.content.decode())
+
+    def test_show_missing_recipe_returns_404(self):
+        response = self.client.get(reverse('show_recipe', args=[12345]))
+        self.assertEqual(response.status_code, 404)
+
 
 
 class RecipeEditViewTest(TestCase):
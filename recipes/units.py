@@ -0,0 +1,100 @@
+"""
+The units ingredient amounts are measured in.
+
+Every unit measures a volume, a mass or a count and has a size in that
+dimension's base unit: millilitres, grams or items. An amount in any unit
+converts to a canonical quantity in the base unit, which MeasuredIngredient
+stores so amounts compare and sum across recipes inside the database.
+"""
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+
+VOLUME = 'volume'
+MASS = 'mass'
+COUNT = 'count'
+
+DIMENSION_CHOICES = ((VOLUME, 'volume'), (MASS, 'mass'), (COUNT, 'count'))
+
+Unit = namedtuple('Unit', ('code', 'name', 'dimension', 'size'))
+
+UNITS = (
+    Unit('c', 'cup', VOLUME, Decimal('236.5882365')),
+    Unit('tbsp', 'tablespoon', VOLUME, Decimal('14.78676478125')),
+    Unit('tsp', 'teaspoon', VOLUME, Decimal('4.92892159375')),
+    Unit('ml', 'millilitre', VOLUME, Decimal('1')),
+    Unit('l', 'litre', VOLUME, Decimal('1000')),
+    Unit('g', 'gram', MASS, Decimal('1')),
+    Unit('kg', 'kilogram', MASS, Decimal('1000')),
+    Unit('oz', 'ounce', MASS, Decimal('28.349523125')),
+    Unit('lb', 'pound', MASS, Decimal('453.59237')),
+    # no unit, a number of whole ingredients
+    Unit('', 'each', COUNT, Decimal('1')),
+)
+
+# for MeasuredIngredient.units, the blank count unit is the field's blank
+UNIT_CHOICES = tuple((unit.code, unit.name) for unit in UNITS if unit.code)
+
+# the unit quantities of each dimension are stored in
+BASE_UNITS = {VOLUME: 'ml', MASS: 'g', COUNT: ''}
+
+# places the stored quantities are rounded to
+QUANTITY_PLACES = Decimal('0.001')
+
+# units quantities are shown in, largest first, each used from one of it up
+DISPLAY_UNITS = {VOLUME: ('l', 'ml'), MASS: ('kg', 'g'), COUNT: ('',)}
+
+_by_code = {unit.code: unit for unit in UNITS}
+_by_name = {unit.name: unit for unit in UNITS}
+
+
+def get(code):
+    """
+    The unit with `code`, None when there is none.
+    """
+    return _by_code.get(code)
+
+
+def find(text):
+    """
+    The unit `text` names, by code or name in any case, None when it
+    names none.
+    """
+    text = (text or '').strip().lower()
+    return _by_code.get(text) or _by_name.get(text)
+
+
+def conversion_factor(from_code, to_code):
+    """
+    How many `to_code` one `from_code` is, None when either unit is
+    unknown or they measure different dimensions.
+    """
+    source = get(from_code)
+    target = get(to_code)
+    if source is None or target is None or source.dimension != target.dimension:
+        return None
+    return source.size / target.size
+
+
+def canonical(amount, code):
+    """
+    Return (quantity in the base unit, dimension) for `amount` of the unit
+    with `code`, (None, '') when the unit is unknown.
+    """
+    unit = get(code)
+    if unit is None or amount is None:
+        return None, ''
+    quantity = (Decimal(str(amount)) * unit.size).quantize(QUANTITY_PLACES, rounding=ROUND_HALF_UP)
+    return quantity, unit.dimension
+
+
+def readable(quantity, dimension):
+    """
+    Return (amount, code) for `quantity` of the base unit of `dimension`
+    in the largest of its DISPLAY_UNITS it makes at least one of.
+    """
+    codes = DISPLAY_UNITS[dimension]
+    for code in codes:
+        size = _by_code[code].size
+        if quantity >= size or code == codes[-1]:
+            return (quantity / size).quantize(QUANTITY_PLACES, rounding=ROUND_HALF_UP), code
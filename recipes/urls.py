@@ -5,6 +5,11 @@ from . import views
 
 urlpatterns = [
     url(r'^$', views.home, name='home'),
+    url(r'^search/$', views.search_recipes, name='search_recipes'),
+    url(r'^cook/$', views.cookable_recipes, name='cookable_recipes'),
+    url(r'^export/$', views.export_recipes, name='export_recipes'),
+    url(r'^shopping-list/$', views.shopping_list, name='shopping_list'),
+    url(r'^ingredients/suggest/$', views.suggest_ingredients, name='suggest_ingredients'),
     url(r'^create/', views.create_recipe, name='create_recipe'),
     url(r'^show/(?P<pk>[0-9]+)/$', views.show_recipe, name='show_recipe'),
     url(r'^edit/(?P<pk>[0-9]+)/$', views.edit_recipe, name='edit_recipe'),
@@ -1,17 +1,112 @@
 from django.shortcuts import render, redirect, reverse, get_object_or_404
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseBadRequest, Http404, \
+        StreamingHttpResponse, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.forms import inlineformset_factory
-
-from .models import Recipe, RecipeStep, MeasuredIngredient
-from .forms import RecipeForm, MeasuredIngredientForm
+from django.db.models import Max, Prefetch
+from django.conf import settings
+from django.core.paginator import Paginator, InvalidPage
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+
+from stockpot.db.replicas import primary, use_primary
+from stockpot.page_cache import cache_anonymous_page
+
+from .models import Recipe, RecipeStep, RecipeSummary, SimilarRecipe, MeasuredIngredient, \
+        Ingredient, normalize_ingredient_name
+from .forms import RecipeForm, MeasuredIngredientForm, BaseMeasuredIngredientFormSet
+from .pagination import keyset_paginate
+from .services import save_recipe
+from . import fragments, export, shopping
+from .ingredient_index import ingredient_index
+from .ingredient_suggest import ingredient_suggester
 
 # Create your views here.
+@cache_anonymous_page(lambda request: ['recipes'])
 def home(request):
-    recipes = Recipe.objects.all()
-    return render(request, 'home.html', {'recipes':recipes})
-
+    # one narrow table, no joins or counting per row, the summaries are read
+    # only for the recipes missing from the fragment cache
+    page = keyset_paginate(RecipeSummary.objects.only('recipe'), settings.RECIPE_FEED_PAGE_SIZE,
+            after=request.GET.get('after'), before=request.GET.get('before'))
+    recipe_ids = [summary.pk for summary in page.object_list]
+    found = fragments.render_fragments(recipe_ids, RecipeSummary.objects.in_bulk)
+    recipe_fragments = [found[pk] for pk in recipe_ids if pk in found]
+    return render(request, 'home.html', {'recipe_fragments':recipe_fragments, 'page':page})
+
+def search_recipes(request):
+    query = request.GET.get('q', '').strip()
+    page = None
+    recipe_fragments = []
+    if query:
+        recipe_ids = Recipe.objects.search(query).values_list('pk', flat=True)
+        paginator = Paginator(recipe_ids, settings.RECIPE_FEED_PAGE_SIZE)
+        try:
+            page = paginator.page(request.GET.get('page', 1))
+        except InvalidPage:
+            raise Http404('Invalid page.')
+        recipe_ids = list(page.object_list)
+        found = fragments.render_fragments(recipe_ids, RecipeSummary.objects.in_bulk)
+        recipe_fragments = [found[pk] for pk in recipe_ids if pk in found]
+
+    return render(request, 'search.html', {'query':query, 'page':page,
+        'recipe_fragments':recipe_fragments})
+
+def cookable_recipes(request):
+    # comma separated list of the ingredients on hand
+    names = {normalize_ingredient_name(name)
+            for name in request.GET.get('ingredients', '').split(',') if name.strip()}
+    results = []
+    if names:
+        ingredient_ids = list(Ingredient.objects.filter(name__in=names).values_list('pk', flat=True))
+        ranked = ingredient_index.rank(ingredient_ids, limit=settings.RECIPE_FEED_PAGE_SIZE)
+
+        found = fragments.render_fragments([recipe_id for recipe_id, matched, missing in ranked],
+                RecipeSummary.objects.in_bulk)
+        results = [(found[recipe_id], missing) for recipe_id, matched, missing in ranked
+                if recipe_id in found]
+
+    return render(request, 'cookable_recipes.html', {'ingredients':', '.join(sorted(names)),
+        'results':results})
+
+@require_GET
+def shopping_list(request):
+    # comma separated recipe ids, a recipe listed twice is shopped for twice
+    try:
+        recipe_ids = [int(pk) for pk in request.GET.get('recipes', '').split(',') if pk.strip()]
+    except ValueError:
+        return HttpResponseBadRequest('recipes must be a comma separated list of ids.')
+    if len(recipe_ids) > settings.SHOPPING_LIST_MAX_RECIPES:
+        return HttpResponseBadRequest(
+                f'At most {settings.SHOPPING_LIST_MAX_RECIPES} recipes fit on a list.')
+
+    recipes = RecipeSummary.objects.in_bulk(recipe_ids)
+    return render(request, 'shopping_list.html', {
+        'recipes': [recipes[pk] for pk in recipe_ids if pk in recipes],
+        'items': shopping.shopping_list(recipe_ids)})
+
+@require_GET
+@cache_control(public=True, max_age=60)
+def suggest_ingredients(request):
+    # answered from memory, called on every keystroke of an ingredient name
+    prefix = normalize_ingredient_name(request.GET.get('q', ''))
+    return JsonResponse({'suggestions': ingredient_suggester.suggest(prefix,
+        limit=settings.INGREDIENT_SUGGESTION_LIMIT)})
+
+@require_GET
+@login_required
+def export_recipes(request):
+    # the whole catalog, streamed as it's read, as NDJSON or ?format=csv
+    format = request.GET.get('format', 'ndjson')
+    if format not in export.FORMATS:
+        return HttpResponseBadRequest('Unknown export format.')
+
+    response = StreamingHttpResponse(export.export_lines(format),
+            content_type=export.CONTENT_TYPES[format])
+    response['Content-Disposition'] = f'attachment; filename="recipes.{format}"'
+    return response
+
+@use_primary
 @login_required
 def create_recipe(request):
 
@@ -19,7 +114,8 @@ def create_recipe(request):
             extra=1)
 
     IngredientFormSet = inlineformset_factory(Recipe, MeasuredIngredient,
-            form=MeasuredIngredientForm, fields=('amount', 'units', 'ingredient'), extra=1)
+            form=MeasuredIngredientForm, formset=BaseMeasuredIngredientFormSet,
+            fields=('amount', 'units', 'ingredient'), extra=1)
 
     if request.method == 'POST':
         form = RecipeForm(request.POST)
@@ -27,16 +123,8 @@ def create_recipe(request):
         form.ingredientsformset = IngredientFormSet(request.POST, request.FILES)
 
         if form.is_valid() and form.stepsformset.is_valid() and form.ingredientsformset.is_valid():
-            recipe = form.save(commit=False)
-            recipe.author = request.user.profile
-            recipe.save()
-
-            form.stepsformset.instance = recipe
-            form.stepsformset.save()
-
-            form.ingredientsformset.instance = recipe
-            form.ingredientsformset.save()
-
+            recipe = save_recipe(form, [form.stepsformset, form.ingredientsformset],
+                    author=request.user.profile)
             return redirect('show_recipe', pk=recipe.pk)
     else:
         form = RecipeForm()
@@ -45,6 +133,7 @@ def create_recipe(request):
 
     return render(request, 'create_recipe.html', {'form':form})
 
+@use_primary
 @login_required
 def edit_recipe(request, pk):
     recipe = get_object_or_404(Recipe, pk=pk)
@@ -55,7 +144,8 @@ def edit_recipe(request, pk):
             extra=1)
 
     IngredientFormSet = inlineformset_factory(Recipe, MeasuredIngredient,
-            form=MeasuredIngredientForm, fields=('amount', 'units', 'ingredient'), extra=1)
+            form=MeasuredIngredientForm, formset=BaseMeasuredIngredientFormSet,
+            fields=('amount', 'units', 'ingredient'), extra=1)
 
     form = RecipeForm(request.POST or None, instance=recipe)
     form.stepsformset = StepFormSet(request.POST or None, request.FILES or None,
@@ -64,14 +154,12 @@ def edit_recipe(request, pk):
             instance=recipe)
 
     if form.is_valid() and form.stepsformset.is_valid() and form.ingredientsformset.is_valid():
-        form.save()
-        form.stepsformset.save()
-        form.ingredientsformset.save()
-
+        save_recipe(form, [form.stepsformset, form.ingredientsformset])
         return redirect('show_recipe', pk=recipe.pk)
 
     return render(request, 'edit_recipe.html', {'form':form})
 
+@use_primary
 @login_required
 def remove_recipe(request, pk):
     recipe = get_object_or_404(Recipe, pk=pk)
@@ -81,6 +169,50 @@ def remove_recipe(request, pk):
     recipe.delete()
     return redirect('home')
 
+def _recipe_timestamps(request, pk):
+    # a single indexed lookup shared by the ETag and Last-Modified checks,
+    # the recipe's own timestamp covers its steps and ingredients, the
+    # author's covers the username shown on the page, the newest
+    # neighbour's covers the similar recipes and the titles shown for them,
+    # and the nutrition's is when it was last summed
+    if not hasattr(request, '_recipe_timestamps'):
+        timestamps = Recipe.objects.filter(pk=pk) \
+                .annotate(similar_computed=Max('similar_recipes__computed'),
+                    similar_modified=Max('similar_recipes__similar__modified')) \
+                .values_list('modified', 'author__modified', 'similar_computed',
+                    'similar_modified', 'nutrition__computed').first()
+        request._recipe_timestamps = [ts for ts in timestamps or () if ts is not None]
+    return request._recipe_timestamps
+
+def recipe_etag(request, pk):
+    timestamps = _recipe_timestamps(request, pk)
+    if not timestamps:
+        return None
+    # the navbar differs per user
+    parts = [pk, request.user.pk or 0] + [ts.timestamp() for ts in timestamps]
+    return '-'.join(str(part) for part in parts)
+
+def recipe_last_modified(request, pk):
+    timestamps = _recipe_timestamps(request, pk)
+    return max(timestamps) if timestamps else None
+
+@condition(etag_func=recipe_etag, last_modified_func=recipe_last_modified)
+@cache_anonymous_page(lambda request, pk: [f'recipe:{pk}'])
 def show_recipe(request, pk):
-    recipe = get_object_or_404(Recipe, pk=pk)
-    return render(request, 'show_recipe.html', {'recipe':recipe})
+    # the version is read first, see fragments.get_fragments
+    recipe_fragment, version = fragments.get_fragment(pk, detail=True)
+    if recipe_fragment is None:
+        # load everything recipe.html walks up front, a fixed number of
+        # queries regardless of how many steps or ingredients there are
+        recipes = Recipe.objects.select_related('author__user', 'nutrition').prefetch_related(
+                Prefetch('measuredingredient_set',
+                    queryset=MeasuredIngredient.objects.select_related('ingredient')),
+                'steps',
+                Prefetch('similar_recipes', queryset=SimilarRecipe.objects
+                    .select_related('similar').only('recipe', 'similar__title', 'similarity')
+                    .order_by('-similarity', '-similar_id')))
+        # from the primary, see fragments.render_fragment
+        with primary():
+            recipe = get_object_or_404(recipes, pk=pk)
+            recipe_fragment = fragments.render_fragment(recipe, version, detail=True)
+    return render(request, 'show_recipe.html', {'recipe_fragment':recipe_fragment})
@@ -0,0 +1,29 @@
+"""
+ASGI config for stockpot project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+for servers such as uvicorn:
+
+    gunicorn stockpot.asgi:application -c deploy/gunicorn_asgi.py
+
+Django 1.11 has no asynchronous views or ORM, so requests are handed to the
+regular Django handler on a pool of settings.ASGI_THREADS threads. The event
+loop does all the socket work, so slow clients and idle keep-alive
+connections no longer hold a worker, and a process can keep many more
+connections open than it has threads.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+from django.conf import settings
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stockpot.settings")
+
+# load environment variables from .env file
+from dotenv import load_dotenv
+load_dotenv(os.path.join(settings.BASE_DIR, settings.DOTENV_PATH))
+
+from stockpot.asgi_bridge import WsgiToAsgi
+
+application = WsgiToAsgi(get_wsgi_application(), max_threads=settings.ASGI_THREADS)
@@ -0,0 +1,155 @@
+"""
+Runs a WSGI application as an ASGI (version 3) application.
+
+Each request runs start to finish, including iterating over the response
+and closing it, on one thread of a bounded pool, so Django's per-thread
+database connections are cleaned up as usual. Response chunks are passed
+back to the event loop through a small queue, which also keeps a slow
+client from having a streaming response read into memory ahead of it.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import sys
+import threading
+
+
+# response chunks buffered between the request's thread and the client
+QUEUE_SIZE = 8
+
+_DONE = object()
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+def build_environ(scope, body):
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = f'HTTP_{name}'
+        # repeated headers are joined, as a WSGI server would
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class WsgiToAsgi(object):
+
+
+    def __init__(self, wsgi_application, max_threads=10):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(max_threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f'Unsupported ASGI scope type {scope["type"]!r}.')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue(QUEUE_SIZE)
+        disconnected = threading.Event()
+        environ = build_environ(scope, b''.join(body))
+        worker = loop.run_in_executor(self.executor, self.run,
+                environ, loop, queue, disconnected)
+        message = None
+        try:
+            while message is not _DONE:
+                message = await queue.get()
+                if message is not _DONE:
+                    await send(message)
+        finally:
+            if message is not _DONE:
+                # stop the request's thread and let it finish what it put
+                disconnected.set()
+                while message is not _DONE:
+                    message = await queue.get()
+            await worker
+
+    def run(self, environ, loop, queue, disconnected):
+        """
+        Call the WSGI application and put its ASGI response messages on
+        `queue`, runs on one of the pool's threads.
+        """
+        def put(message):
+            if disconnected.is_set():
+                raise ClientDisconnected
+            asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [[name.lower().encode('latin1'), value.encode('latin1')]
+                    for name, value in headers]
+            return write
+
+        def start():
+            if not response.get('started'):
+                response['started'] = True
+                put({'type': 'http.response.start', 'status': response['status'],
+                    'headers': response['headers']})
+
+        def write(data):
+            start()
+            if data:
+                put({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        try:
+            result = self.wsgi_application(environ, start_response)
+            try:
+                for chunk in result:
+                    write(chunk)
+                start()
+                put({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except ClientDisconnected:
+            pass
+        finally:
+            asyncio.run_coroutine_threadsafe(queue.put(_DONE), loop).result()
@@ -0,0 +1,34 @@
+from django.conf import settings
+
+from . import replicas
+
+
+PIN_COOKIE_NAME = 'primarydb'
+
+
+class ReplicaRoutingMiddleware(object):
+    """
+    Lets safe requests read from the replicas, except for a short window
+    (settings.DATABASE_REPLICA_PIN_SECONDS) after the client wrote anything,
+    so users always see their own changes despite replication lag.
+
+    Should come first in MIDDLEWARE so session and auth reads are routed too.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas.reset()
+        replicas.allow_replicas(request.method in self.SAFE_METHODS and
+                PIN_COOKIE_NAME not in request.COOKIES)
+        try:
+            response = self.get_response(request)
+            if replicas.wrote():
+                response.set_cookie(PIN_COOKIE_NAME, '1',
+                        max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True)
+            return response
+        finally:
+            replicas.reset()
@@ -0,0 +1,133 @@
+"""
+A small thread-safe pool of database connections.
+
+Keeps up to `max_size` idle connections around for reuse and lets up to
+`max_overflow` more be opened under load, which are closed again as soon as
+they are released. Connections are health checked before being handed out
+and recycled once they are older than `recycle` seconds.
+"""
+from collections import deque
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool(object):
+
+
+    def __init__(self, max_size=5, max_overflow=10, timeout=30.0, recycle=None,
+            check=None, close=None):
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        # check(connection) -> bool, whether an idle connection still works
+        self._check = check or (lambda connection: True)
+        self._close = close or (lambda connection: connection.close())
+
+        self._cond = threading.Condition()
+        # idle (connection, created_at) pairs, most recently used last
+        self._idle = deque()
+        # id(connection) -> created_at, for every open connection
+        self._created = {}
+        # connections opened or being opened, idle or checked out
+        self._size = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    def _expired(self, created_at):
+        return self.recycle is not None and time.monotonic() - created_at > self.recycle
+
+    def acquire(self, connect):
+        """
+        Return an idle connection, or one newly opened with `connect()` if
+        there is room, waiting up to `timeout` seconds for one to be
+        released otherwise.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.max_size + self.max_overflow:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                                f'No connection available within {self.timeout} seconds')
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    connection, created_at = self._idle.pop()
+                else:
+                    connection = None
+                    self._size += 1
+
+            if connection is None:
+                return self._open(connect)
+
+            # check outside the lock, it may need a round trip to the server
+            if not self._expired(created_at) and self._healthy(connection):
+                return connection
+            self.discard(connection)
+
+    def _open(self, connect):
+        try:
+            connection = connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created[id(connection)] = time.monotonic()
+        return connection
+
+    def _healthy(self, connection):
+        try:
+            return self._check(connection)
+        except Exception:
+            return False
+
+    def release(self, connection):
+        """
+        Give a checked out connection back to the pool, closing it instead
+        if the pool already holds `max_size` idle connections or the
+        connection is due to be recycled.
+        """
+        with self._cond:
+            created_at = self._created.get(id(connection))
+            if created_at is not None and len(self._idle) < self.max_size \
+                    and not self._expired(created_at):
+                self._idle.append((connection, created_at))
+                self._cond.notify()
+                return
+        self.discard(connection)
+
+    def discard(self, connection):
+        """
+        Close a connection and free up its slot in the pool.
+        """
+        with self._cond:
+            if self._created.pop(id(connection), None) is not None:
+                self._size -= 1
+            self._cond.notify()
+        try:
+            self._close(connection)
+        except Exception:
+            pass
+
+    def close_idle(self):
+        """
+        Close every idle connection, e.g. after forking a worker process.
+        """
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for connection, created_at in idle:
+            self.discard(connection)
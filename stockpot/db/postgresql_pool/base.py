@@ -0,0 +1,107 @@
+"""
+PostgreSQL database backend that borrows connections from an in-process
+ConnectionPool instead of opening a new one for every request.
+
+Use it by setting ENGINE to 'stockpot.db.postgresql_pool' and configuring
+the pool with a POOL dict alongside the usual connection settings:
+
+    'POOL': {
+        'MAX_SIZE': 5,        # idle connections kept for reuse
+        'MAX_OVERFLOW': 10,   # extra connections allowed under load
+        'TIMEOUT': 30,        # seconds to wait for a free connection
+        'RECYCLE': 3600,      # close connections older than this
+        'PRE_PING': True,     # run SELECT 1 before handing out a connection
+    }
+
+Keep CONN_MAX_AGE at 0 with this backend, so Django hands the connection
+back to the pool at the end of every request.
+"""
+from functools import partial
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions, Error as DatabaseError
+
+from stockpot.db.pool import ConnectionPool
+
+
+# one pool per set of connection parameters (the test runner points the
+# same alias at different databases), shared by every thread in the process
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _check(connection, pre_ping=True):
+    if connection.closed:
+        return False
+    if pre_ping:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        # don't leave the ping's implicit transaction open
+        connection.rollback()
+    return True
+
+
+def get_pool(conn_params, options):
+    key = tuple(sorted((name, str(value)) for name, value in conn_params.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                    max_size=options.get('MAX_SIZE', 5),
+                    max_overflow=options.get('MAX_OVERFLOW', 10),
+                    timeout=options.get('TIMEOUT', 30),
+                    recycle=options.get('RECYCLE'),
+                    check=partial(_check, pre_ping=options.get('PRE_PING', True)))
+        return pool
+
+
+def close_idle_connections():
+    """
+    Close the idle connections of every pool in this process, e.g. before
+    dropping a database or after forking.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_idle()
+
+
+class DatabaseCreation(base.DatabaseCreation):
+
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # pooled connections to the test database would block dropping it
+        close_idle_connections()
+        super(DatabaseCreation, self)._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        create = super(DatabaseWrapper, self).get_new_connection
+        self.pool = get_pool(conn_params, self.settings_dict.get('POOL', {}))
+        connection = self.pool.acquire(lambda: create(conn_params))
+
+        # a reused connection skipped the setup done when it was created,
+        # its session already has the configured isolation level
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+
+        connection = self.connection
+        try:
+            # hand the connection back in a clean state
+            if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            connection.autocommit = False
+        except DatabaseError:
+            self.pool.discard(connection)
+        else:
+            self.pool.release(connection)
@@ -0,0 +1,76 @@
+"""
+Per-thread state deciding whether reads may go to a read replica.
+
+Reads only go to replicas while a request has opted in through
+ReplicaRoutingMiddleware, which it does for safe (GET/HEAD) requests that
+are not within the read-your-writes window of an earlier write. Anything
+else, including management commands and shells, reads from the primary.
+A request reads from a single replica, so its reads all see the same point
+in replication.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import random
+import threading
+
+from django.conf import settings
+
+
+_state = threading.local()
+
+
+def replicas_allowed():
+    return getattr(_state, 'replicas_allowed', False) and not wrote()
+
+
+def allow_replicas(allowed):
+    _state.replicas_allowed = allowed
+
+
+def replica():
+    """
+    The replica the current request reads from, picked on its first read.
+    """
+    alias = getattr(_state, 'replica', None)
+    if alias is None:
+        alias = _state.replica = random.choice(settings.DATABASE_REPLICAS)
+    return alias
+
+
+def wrote():
+    return getattr(_state, 'wrote', False)
+
+
+def record_write():
+    _state.wrote = True
+
+
+def reset():
+    _state.replicas_allowed = False
+    _state.wrote = False
+    _state.replica = None
+
+
+@contextmanager
+def primary():
+    """
+    Send every read in the block to the primary database.
+    """
+    previous = getattr(_state, 'replicas_allowed', False)
+    _state.replicas_allowed = False
+    try:
+        yield
+    finally:
+        _state.replicas_allowed = previous
+
+
+def use_primary(view):
+    """
+    View decorator that reads from the primary database, for flows such as
+    edit forms that must see the latest committed data.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with primary():
+            return view(*args, **kwargs)
+    return wrapper
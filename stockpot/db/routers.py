@@ -0,0 +1,28 @@
+from django.conf import settings
+
+from . import replicas
+
+
+class PrimaryReplicaRouter(object):
+    """
+    Sends writes to the 'default' database and, when the current request
+    allows it, reads to one of settings.DATABASE_REPLICAS, the same one for
+    the whole request.
+    """
+
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and replicas.replicas_allowed():
+            return replicas.replica()
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        # later reads in this request must see the write
+        replicas.record_write()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # every database holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,92 @@
+import sys
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from . import close_all_connections
+from .pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection(object):
+
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+
+    def test_reuses_released_connections(self):
+        pool = ConnectionPool(max_size=1, max_overflow=0)
+        connection = pool.acquire(FakeConnection)
+        pool.release(connection)
+        self.assertIs(pool.acquire(FakeConnection), connection)
+        self.assertEqual(pool.size, 1)
+
+    def test_closes_overflow_connections_on_release(self):
+        pool = ConnectionPool(max_size=1, max_overflow=1)
+        first = pool.acquire(FakeConnection)
+        second = pool.acquire(FakeConnection)
+        self.assertEqual(pool.size, 2)
+
+        pool.release(first)
+        pool.release(second)
+        self.assertFalse(first.closed)
+        self.assertTrue(second.closed)
+        self.assertEqual((pool.size, pool.idle), (1, 1))
+
+    def test_times_out_when_exhausted(self):
+        pool = ConnectionPool(max_size=1, max_overflow=0, timeout=0.01)
+        pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+
+    def test_replaces_unhealthy_connections(self):
+        pool = ConnectionPool(max_size=1, max_overflow=0,
+                check=lambda connection: not connection.closed)
+        connection = pool.acquire(FakeConnection)
+        pool.release(connection)
+        connection.closed = True
+
+        replacement = pool.acquire(FakeConnection)
+        self.assertIsNot(replacement, connection)
+        self.assertEqual(pool.size, 1)
+
+    def test_recycles_old_connections(self):
+        pool = ConnectionPool(max_size=1, max_overflow=0, recycle=0)
+        connection = pool.acquire(FakeConnection)
+        pool.release(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.size, 0)
+
+    def test_failed_connect_frees_its_slot(self):
+        def connect():
+            raise IOError('database is down')
+
+        pool = ConnectionPool(max_size=1, max_overflow=0, timeout=0.01)
+        with self.assertRaises(IOError):
+            pool.acquire(connect)
+        self.assertEqual(pool.size, 0)
+        pool.acquire(FakeConnection)
+
+
+class CloseAllConnectionsTest(SimpleTestCase):
+
+
+    def test_closes_idle_pooled_connections(self):
+        pool = ConnectionPool()
+        connection = pool.acquire(FakeConnection)
+        pool.release(connection)
+        pool_backend = mock.Mock(close_idle_connections=pool.close_idle)
+
+        with mock.patch.dict(sys.modules, {'stockpot.db.postgresql_pool.base': pool_backend}), \
+                mock.patch('stockpot.db.connections') as connections:
+            close_all_connections()
+
+        connections.close_all.assert_called_once_with()
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.size, 0)
@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, RequestFactory, override_settings
+from django.http import HttpResponse
+
+from stockpot.page_cache import cache_anonymous_page
+from . import replicas
+from .middleware import ReplicaRoutingMiddleware, PIN_COOKIE_NAME
+from .routers import PrimaryReplicaRouter
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], DATABASE_REPLICA_PIN_SECONDS=10)
+class PrimaryReplicaRouterTest(SimpleTestCase):
+
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+        self.routed_reads = []
+
+    def tearDown(self):
+        replicas.reset()
+
+    def view(self, request, write=False):
+        self.routed_reads.append(self.router.db_for_read(None))
+        if write:
+            self.router.db_for_write(None)
+            self.routed_reads.append(self.router.db_for_read(None))
+        return HttpResponse()
+
+    def call(self, request, write=False):
+        middleware = ReplicaRoutingMiddleware(lambda request: self.view(request, write))
+        return middleware(request)
+
+    def test_reads_go_to_primary_outside_requests(self):
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+    def test_safe_requests_read_from_replica(self):
+        response = self.call(self.factory.get('/'))
+        self.assertEqual(self.routed_reads, ['replica_0'])
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+    def test_unsafe_requests_read_from_primary(self):
+        self.call(self.factory.post('/'))
+        self.assertEqual(self.routed_reads, ['default'])
+
+    def test_writes_pin_later_reads_to_primary(self):
+        response = self.call(self.factory.post('/'), write=True)
+        self.assertEqual(response.cookies[PIN_COOKIE_NAME]['max-age'], 10)
+
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE_NAME] = '1'
+        self.call(request)
+        self.assertEqual(self.routed_reads, ['default', 'default', 'default'])
+
+    def test_reads_after_a_write_in_the_same_request_use_primary(self):
+        self.call(self.factory.get('/'), write=True)
+        self.assertEqual(self.routed_reads, ['replica_0', 'default'])
+
+    @override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'])
+    def test_each_request_reads_from_a_single_replica(self):
+        def view(request):
+            self.view(request)
+            return self.view(request)
+
+        with mock.patch('random.choice', side_effect=['replica_0', 'replica_1']):
+            ReplicaRoutingMiddleware(view)(self.factory.get('/'))
+            ReplicaRoutingMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(self.routed_reads, ['replica_0', 'replica_0', 'replica_1', 'replica_1'])
+
+    def test_cached_pages_are_rendered_from_primary(self):
+        cache.clear()
+        view = cache_anonymous_page(lambda request: ['routing-test'])(self.view)
+        ReplicaRoutingMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(self.routed_reads, ['default'])
+
+    def test_use_primary_decorator(self):
+        view = replicas.use_primary(lambda request: self.view(request))
+        ReplicaRoutingMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(self.routed_reads, ['default'])
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica_0', 'recipes'))
+        self.assertTrue(self.router.allow_migrate('default', 'recipes'))
@@ -0,0 +1,286 @@
+"""
+Prometheus style metrics for requests, database queries and caches.
+
+Every process keeps its own counters, gauges and histograms in memory. When
+settings.METRICS_DIR is set it also writes them to a file of its own in that
+directory (at most every settings.METRICS_FLUSH_INTERVAL seconds), and the
+/metrics view sums the files of all processes, so it reports the same totals
+whichever worker answers it. Gauges of processes that have exited are left
+out. The directory should be emptied whenever the server is (re)started.
+"""
+from bisect import bisect_left
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, Http404
+
+from .profiling import RequestProfile
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'stockpot_requests_total':
+        ('counter', 'Requests answered, by view and status code.'),
+    'stockpot_request_duration_seconds':
+        ('histogram', 'Time spent answering requests, by view.'),
+    'stockpot_db_queries_total':
+        ('counter', 'Database queries run while answering requests.'),
+    'stockpot_db_query_duration_seconds_total':
+        ('counter', 'Time spent in database queries while answering requests.'),
+    'stockpot_db_connections_opened_total':
+        ('counter', 'Database connections opened.'),
+    'stockpot_db_pool_connections':
+        ('gauge', 'Connections held by the connection pools, by state.'),
+    'stockpot_cache_requests_total':
+        ('counter', 'Cache lookups, by cache and result (hit or miss).'),
+}
+
+
+class Registry(object):
+    """
+    This process's metric values, keyed by (name, labels) with labels a
+    sorted tuple of (label, value) pairs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        # (name, labels) -> [count per bucket..., +Inf count, sum]
+        self.histograms = {}
+
+    def inc(self, name, labels=None, value=1):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, labels=None, value=0):
+        with self._lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, name, labels=None, value=0.0):
+        key = (name, _labels(labels))
+        with self._lock:
+            values = self.histograms.get(key)
+            if values is None:
+                values = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+            values[bisect_left(BUCKETS, value)] += 1
+            values[-1] += value
+
+    def dump(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value]
+                    for (name, labels), value in self.counters.items()],
+                'gauges': [[name, labels, value]
+                    for (name, labels), value in self.gauges.items()],
+                'histograms': [[name, labels, values]
+                    for (name, labels), values in self.histograms.items()],
+            }
+
+
+def _labels(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+registry = Registry()
+
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+
+
+def record_cache(cache, hits, misses=0):
+    if hits:
+        registry.inc('stockpot_cache_requests_total', {'cache': cache, 'result': 'hit'}, hits)
+    if misses:
+        registry.inc('stockpot_cache_requests_total', {'cache': cache, 'result': 'miss'}, misses)
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    registry.inc('stockpot_db_connections_opened_total', {'alias': connection.alias})
+
+
+def _update_pool_gauges():
+    # only when the pooling backend is in use, importing it needs psycopg2
+    pool_backend = sys.modules.get('stockpot.db.postgresql_pool.base')
+    if pool_backend is None:
+        return
+    with pool_backend._pools_lock:
+        pools = list(pool_backend._pools.items())
+    for key, pool in pools:
+        database = dict(key).get('database', '')
+        idle = pool.idle
+        registry.set('stockpot_db_pool_connections',
+                {'database': database, 'state': 'idle'}, idle)
+        registry.set('stockpot_db_pool_connections',
+                {'database': database, 'state': 'in_use'}, pool.size - idle)
+
+
+def _path(pid):
+    return os.path.join(settings.METRICS_DIR, f'{pid}.json')
+
+
+def flush(force=False):
+    """
+    Write this process's metrics to its file in settings.METRICS_DIR, unless
+    it was written less than METRICS_FLUSH_INTERVAL seconds ago.
+    """
+    global _last_flush
+    if not settings.METRICS_DIR:
+        return
+    with _flush_lock:
+        now = time.monotonic()
+        if not force and now - _last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        _last_flush = now
+
+    _update_pool_gauges()
+    data = registry.dump()
+    data['pid'] = os.getpid()
+    # a file of its own, another thread may be flushing at the same time
+    descriptor, temporary = tempfile.mkstemp(suffix='.tmp', dir=settings.METRICS_DIR)
+    try:
+        with os.fdopen(descriptor, 'w') as output:
+            json.dump(data, output)
+        os.replace(temporary, _path(os.getpid()))
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _dumps():
+    if not settings.METRICS_DIR:
+        _update_pool_gauges()
+        yield registry.dump()
+        return
+
+    flush(force=True)
+    for filename in os.listdir(settings.METRICS_DIR):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, filename)) as dump:
+                data = json.load(dump)
+        except (OSError, ValueError):
+            # removed or replaced while listing
+            continue
+        if not _alive(data['pid']):
+            data['gauges'] = []
+        yield data
+
+
+def collect():
+    """
+    Return this or, with METRICS_DIR, every process's metrics summed up, as
+    a Registry.
+    """
+    total = Registry()
+    for data in _dumps():
+        for name, labels, value in data['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            total.counters[key] = total.counters.get(key, 0) + value
+        for name, labels, value in data['gauges']:
+            key = (name, tuple(map(tuple, labels)))
+            total.gauges[key] = total.gauges.get(key, 0) + value
+        for name, labels, values in data['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            current = total.histograms.setdefault(key, [0] * len(values))
+            total.histograms[key] = [a + b for a, b in zip(current, values)]
+    return total
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\')
+        .replace('"', r'\"').replace('\n', r'\n')) for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(total):
+    """
+    The Prometheus text exposition of a Registry.
+    """
+    samples = {}
+    for (name, labels), value in list(total.counters.items()) + list(total.gauges.items()):
+        samples.setdefault(name, []).append(
+                f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for (name, labels), values in total.histograms.items():
+        lines = samples.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), values[:-1]):
+            cumulative += count
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(values[-1])}')
+        lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+
+    output = []
+    for name in sorted(samples):
+        kind, help = METRICS.get(name, ('untyped', ''))
+        output.append(f'# HELP {name} {help}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(sorted(samples[name]))
+    return '\n'.join(output) + '\n'
+
+
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404('Metrics are disabled.')
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4')
+
+
+class MetricsMiddleware(object):
+    """
+    Records each request's latency, status and database queries under the
+    url name of its view. Should come early in MIDDLEWARE so the session and
+    auth queries are counted too.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        profile.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else 'unresolved'
+        registry.inc('stockpot_requests_total',
+                {'view': view, 'status': str(response.status_code)})
+        registry.observe('stockpot_request_duration_seconds', {'view': view},
+                profile.total_time)
+        registry.inc('stockpot_db_queries_total', {'view': view}, len(profile.queries))
+        registry.inc('stockpot_db_query_duration_seconds_total', {'view': view},
+                profile.sql_time)
+        flush()
+        return response
@@ -0,0 +1,93 @@
+"""
+Full-page cache for anonymous requests.
+
+Cached pages are keyed by path and by the current version of each of the
+page's tags (e.g. 'recipe:12'), so purging a tag makes every page built
+from it miss without having to know their keys. Requests that may see
+personalized content (a session or messages cookie) always bypass the
+cache, as do responses that set cookies or embed a CSRF token. Pages are
+rendered from the primary database, never a read replica.
+"""
+from functools import wraps
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import metrics
+from .db.replicas import primary
+
+
+def _tag_key(tag):
+    return f'page-tag:{tag}'
+
+
+def _tag_versions(tags):
+    keys = [_tag_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def _page_key(request, tags):
+    versions = ':'.join(_tag_versions(tags))
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'page:{request.method}:{path}:{versions}'
+
+
+def is_anonymous_request(request):
+    return request.method in ('GET', 'HEAD') and \
+            settings.SESSION_COOKIE_NAME not in request.COOKIES and \
+            'messages' not in request.COOKIES
+
+
+def _is_cacheable(request, response):
+    return response.status_code == 200 and \
+            not response.cookies and \
+            not request.META.get('CSRF_COOKIE_USED') and \
+            not response.streaming
+
+
+def cache_anonymous_page(tags):
+    """
+    View decorator caching the page for anonymous requests.
+
+    `tags(request, *args, **kwargs)` returns the tags the page is built
+    from, purging any one of them drops the cached page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_anonymous_request(request):
+                return view(request, *args, **kwargs)
+
+            key = _page_key(request, tags(request, *args, **kwargs))
+            response = cache.get(key)
+            metrics.record_cache('page', hits=int(response is not None),
+                    misses=int(response is None))
+            if response is None:
+                # a page rendered from a lagging replica would be cached after
+                # the write that purged it, and served until it expires
+                with primary():
+                    response = view(request, *args, **kwargs)
+                if _is_cacheable(request, response):
+                    cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
+
+
+def purge(*tags):
+    """
+    Drop every cached page built from any of `tags`, right away and again
+    once the surrounding transaction commits.
+    """
+    keys = [_tag_key(tag) for tag in tags]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
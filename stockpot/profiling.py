@@ -0,0 +1,170 @@
+"""
+Per-request profiling: SQL queries, template rendering and view time.
+
+ProfilingMiddleware is only active when settings.PROFILING_ENABLED is set,
+and then only profiles a settings.PROFILING_SAMPLE_RATE fraction of the
+requests. A profiled request gets a Server-Timing header and a JSON line on
+the 'stockpot.profiling' logger, and a warning is logged when the view ran
+more queries than its budget in settings.PROFILING_QUERY_BUDGETS.
+"""
+from collections import Counter
+from functools import wraps
+import json
+import logging
+import random
+import threading
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+def _instrument_templates():
+    """
+    Wrap Template.render to add the time spent rendering the outermost
+    template of each render to the current request's profile.
+    """
+    if getattr(Template.render, 'profiled', False):
+        return
+    render = Template.render
+
+    @wraps(render)
+    def profiled_render(self, context):
+        profile = getattr(_state, 'profile', None)
+        if profile is None or profile.template_depth:
+            return render(self, context)
+
+        profile.template_depth += 1
+        start = perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_time += perf_counter() - start
+            profile.template_depth -= 1
+
+    profiled_render.profiled = True
+    Template.render = profiled_render
+
+
+class RequestProfile(object):
+    """
+    Collects the queries run on every database connection between start()
+    and stop(), the same way django.test.utils.CaptureQueriesContext does.
+    """
+
+    def __init__(self):
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.view_start = None
+        self.queries = []
+
+    def start(self):
+        self.start_time = perf_counter()
+        self._debug_cursors = {}
+        for connection in connections.all():
+            self._debug_cursors[connection.alias] = (connection.force_debug_cursor,
+                    len(connection.queries_log))
+            connection.force_debug_cursor = True
+
+    def stop(self):
+        self.end_time = perf_counter()
+        for connection in connections.all():
+            force_debug_cursor, initial = self._debug_cursors.get(connection.alias, (False, 0))
+            connection.force_debug_cursor = force_debug_cursor
+            self.queries.extend(list(connection.queries_log)[initial:])
+
+    @property
+    def sql_time(self):
+        return sum(float(query['time']) for query in self.queries)
+
+    @property
+    def duplicate_queries(self):
+        # identical statements with identical parameters, run more than once
+        counts = Counter(query['sql'] for query in self.queries)
+        return sum(count - 1 for count in counts.values())
+
+    @property
+    def total_time(self):
+        return self.end_time - self.start_time
+
+    @property
+    def view_time(self):
+        if self.view_start is None:
+            return 0.0
+        return self.end_time - self.view_start
+
+    def server_timing(self):
+        metrics = [
+            ('sql', self.sql_time, f'{len(self.queries)} queries, '
+                f'{self.duplicate_queries} duplicated'),
+            ('template', self.template_time, 'Template rendering'),
+            ('view', self.view_time, 'View'),
+            ('total', self.total_time, 'Total'),
+        ]
+        return ', '.join(f'{name};dur={duration * 1000:.1f};desc="{desc}"'
+                for name, duration, desc in metrics)
+
+
+class ProfilingMiddleware(object):
+    """
+    Should come early in MIDDLEWARE so the queries of the session and auth
+    middleware are counted too. The view time runs from the view being
+    called until the response comes back up through this middleware.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _instrument_templates()
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        _state.profile = profile
+        profile.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+            _state.profile = None
+
+        response['Server-Timing'] = profile.server_timing()
+        self.log(request, response, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(_state, 'profile', None)
+        if profile is not None:
+            profile.view_start = perf_counter()
+
+    def log(self, request, response, profile):
+        match = request.resolver_match
+        view = match.url_name if match else None
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'queries': len(profile.queries),
+            'duplicate_queries': profile.duplicate_queries,
+            'sql_ms': round(profile.sql_time * 1000, 1),
+            'template_ms': round(profile.template_time * 1000, 1),
+            'view_ms': round(profile.view_time * 1000, 1),
+            'total_ms': round(profile.total_time * 1000, 1),
+        }
+        logger.info(json.dumps(record))
+
+        budget = settings.PROFILING_QUERY_BUDGETS.get(view, settings.PROFILING_QUERY_BUDGET)
+        if budget is not None and len(profile.queries) > budget:
+            logger.warning('%s ran %d queries, over its budget of %d: %s',
+                    view or request.path, len(profile.queries), budget, json.dumps(record))
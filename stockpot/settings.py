@@ -47,6 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'stockpot.db.middleware.ReplicaRoutingMiddleware',
+    'stockpot.metrics.MetricsMiddleware',
+    'stockpot.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,22 +79,143 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'stockpot.wsgi.application'
 
+# threads per process running requests for stockpot.asgi, every one of them
+# may hold a database connection
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS') or 10)
+
 
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
 
+#
+# CONN_MAX_AGE keeps connections open between requests (seconds, 'None'
+# for no limit, 0 to close after every request).
+#
+# Setting DATABASE_ENGINE to 'stockpot.db.postgresql_pool' instead borrows
+# connections from an in-process pool configured by the DATABASE_POOL_*
+# variables, keep DATABASE_CONN_MAX_AGE at 0 with it.
+#
+# To run behind PgBouncer in transaction pooling mode:
+# - set DATABASE_DISABLE_SERVER_SIDE_CURSORS=1, named cursors (used by
+#   QuerySet.iterator()) do not survive across transactions
+# - set the role's time zone in the database, `ALTER ROLE ... SET timezone
+#   TO 'UTC'`, rather than relying on the per session SET TIME ZONE
+# - keep using the plain postgresql engine with DATABASE_CONN_MAX_AGE=0 or
+#   a small value, PgBouncer does the pooling
+# Multi statement writes such as the formset saves in create_recipe and
+# edit_recipe only rely on statement or explicit transaction level state,
+# so they are unaffected by which server connection runs them.
+
+def _conn_max_age(value):
+    if value.lower() == 'none':
+        return None
+    return int(value)
+
 DATABASES = {
     'default': {
-        'CONN_MAX_AGE': 0,
+        'CONN_MAX_AGE': _conn_max_age(os.environ.get('DATABASE_CONN_MAX_AGE') or '0'),
+        'DISABLE_SERVER_SIDE_CURSORS': bool(int(os.environ.get('DATABASE_DISABLE_SERVER_SIDE_CURSORS') or 0)),
         'ENGINE': os.environ.get('DATABASE_ENGINE'),
         'HOST': os.environ.get('DATABASE_HOST'),
         'NAME': os.environ.get('DATABASE_NAME'),
         'PASSWORD': os.environ.get('DATABASE_PASSWORD'),
         'PORT': os.environ.get('DATABASE_PORT'),
-        'USER': os.environ.get('DATABASE_USER')
+        'USER': os.environ.get('DATABASE_USER'),
+        # only used by the stockpot.db.postgresql_pool engine
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DATABASE_POOL_MAX_SIZE') or 5),
+            'MAX_OVERFLOW': int(os.environ.get('DATABASE_POOL_MAX_OVERFLOW') or 10),
+            'TIMEOUT': float(os.environ.get('DATABASE_POOL_TIMEOUT') or 30),
+            'RECYCLE': int(os.environ.get('DATABASE_POOL_RECYCLE') or 3600),
+            'PRE_PING': bool(int(os.environ.get('DATABASE_POOL_PRE_PING') or 1)),
+        },
     }
 }
 
+# Read replicas, DATABASE_REPLICA_HOSTS is a comma separated list of hosts
+# that otherwise share the default database's settings. Safe requests read
+# from a random replica, writes and anything within
+# DATABASE_REPLICA_PIN_SECONDS of a client's last write use the primary.
+
+DATABASE_REPLICAS = []
+for _host in filter(None, (os.environ.get('DATABASE_REPLICA_HOSTS') or '').split(',')):
+    _alias = f'replica_{len(DATABASE_REPLICAS)}'
+    DATABASES[_alias] = dict(DATABASES['default'], HOST=_host.strip(),
+            TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(_alias)
+
+DATABASE_ROUTERS = ['stockpot.db.routers.PrimaryReplicaRouter']
+
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS') or 10)
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+# defaults to a per-process local memory cache, production should point
+# this at a shared backend (memcached, redis) so all workers see the same
+# invalidations
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND') or
+            'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# seconds a rendered recipe fragment stays cached, fragments are also
+# invalidated whenever the recipe changes
+RECIPE_FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('RECIPE_FRAGMENT_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# seconds a whole page rendered for an anonymous visitor stays cached, pages
+# are also purged whenever the recipes or profile they show change
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 60 * 10))
+
+
+# Profiling
+# with PROFILING_ENABLED, a PROFILING_SAMPLE_RATE fraction of requests get a
+# Server-Timing header and a log line with their query count, SQL, template
+# and view time. Views running more queries than their budget log a warning.
+
+PROFILING_ENABLED = bool(int(os.environ.get('PROFILING_ENABLED') or 0))
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE') or 1.0)
+PROFILING_QUERY_BUDGET = int(os.environ.get('PROFILING_QUERY_BUDGET') or 20)
+# per view (url name) budgets, overriding PROFILING_QUERY_BUDGET
+PROFILING_QUERY_BUDGETS = {
+    'home': 5,
+    'show_recipe': 8,
+    'edit_recipe': 15,
+    'show_profile': 6,
+}
+
+
+# Metrics
+# with METRICS_ENABLED, /metrics serves request, database and cache metrics
+# in the Prometheus text format. Multi-process servers must point METRICS_DIR
+# at a directory shared by their workers (and emptied on every start), each
+# worker writes its metrics there at most every METRICS_FLUSH_INTERVAL seconds
+
+METRICS_ENABLED = bool(int(os.environ.get('METRICS_ENABLED') or 0))
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL') or 1.0)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'stockpot.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -135,3 +259,20 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 LOGIN_REDIRECT_URL = '/recipes/'
+
+# number of recipes shown per page of the home feed
+RECIPE_FEED_PAGE_SIZE = int(os.environ.get('RECIPE_FEED_PAGE_SIZE', 20))
+
+# number of names offered while typing an ingredient
+INGREDIENT_SUGGESTION_LIMIT = int(os.environ.get('INGREDIENT_SUGGESTION_LIMIT', 10))
+
+# seconds a process goes without checking whether another one has changed
+# the ingredient index or names it keeps in memory, see recipes/generation.py
+GENERATION_CHECK_INTERVAL = float(os.environ.get('GENERATION_CHECK_INTERVAL') or 1.0)
+
+# most recipes, counting repeats, merged into one shopping list
+SHOPPING_LIST_MAX_RECIPES = int(os.environ.get('SHOPPING_LIST_MAX_RECIPES', 300))
+
+# CSV of the nutrient values of one unit of each ingredient, see
+# recipes/nutrition.py, no nutrition is worked out without it
+NUTRIENT_TABLE = os.environ.get('NUTRIENT_TABLE') or None
@@ -0,0 +1,128 @@
+import asyncio
+
+from django.core.urlresolvers import reverse
+from django.core.wsgi import get_wsgi_application
+from django.test import SimpleTestCase, TransactionTestCase
+
+from recipes.models import Recipe
+from .asgi_bridge import WsgiToAsgi, build_environ
+
+
+def call(application, scope, body=b'', disconnect=False):
+    messages = []
+
+    async def receive():
+        if disconnect:
+            return {'type': 'http.disconnect'}
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(application(scope, receive, send))
+    finally:
+        loop.close()
+    return messages
+
+
+def http_scope(path, query_string=b'', method='GET', headers=()):
+    return {'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http',
+        'path': path, 'query_string': query_string, 'root_path': '',
+        'headers': list(headers) or [(b'host', b'localhost')],
+        'server': ('localhost', 8000), 'client': ('10.0.0.1', 1234)}
+
+
+class BuildEnvironTest(SimpleTestCase):
+
+
+    def test_maps_scope_to_wsgi_environ(self):
+        environ = build_environ(http_scope('/recipes/caf\xe9/', b'q=soup',
+            headers=[(b'content-type', b'text/plain'), (b'x-tag', b'a'), (b'x-tag', b'b')]),
+            b'body')
+
+        self.assertEqual(environ['PATH_INFO'], '/recipes/caf\xc3\xa9/')
+        self.assertEqual(environ['QUERY_STRING'], 'q=soup')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['HTTP_X_TAG'], 'a,b')
+        self.assertEqual(environ['REMOTE_ADDR'], '10.0.0.1')
+        self.assertEqual(environ['wsgi.input'].read(), b'body')
+
+
+class WsgiToAsgiTest(SimpleTestCase):
+
+
+    def test_streams_response_chunks(self):
+        def wsgi_application(environ, start_response):
+            start_response('201 Created', [('Content-Type', 'text/plain')])
+            return [b'one', b'', b'two']
+
+        messages = call(WsgiToAsgi(wsgi_application, max_threads=2), http_scope('/'))
+
+        self.assertEqual(messages[0], {'type': 'http.response.start', 'status': 201,
+            'headers': [[b'content-type', b'text/plain']]})
+        self.assertEqual([m['body'] for m in messages[1:]], [b'one', b'two', b''])
+        self.assertFalse(messages[-1]['more_body'])
+
+    def test_closes_response_when_client_goes_away(self):
+        closed = []
+
+        class Response(object):
+            def __iter__(self):
+                for i in range(100):
+                    yield b'chunk'
+
+            def close(self):
+                closed.append(True)
+
+        def wsgi_application(environ, start_response):
+            start_response('200 OK', [])
+            return Response()
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                raise ConnectionResetError
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        loop = asyncio.new_event_loop()
+        try:
+            with self.assertRaises(ConnectionResetError):
+                loop.run_until_complete(WsgiToAsgi(wsgi_application)(
+                    http_scope('/'), receive, send))
+        finally:
+            loop.close()
+        self.assertEqual(closed, [True])
+
+    def test_answers_lifespan_events(self):
+        events = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+        sent = []
+
+        async def receive():
+            return next(events)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(WsgiToAsgi(None)({'type': 'lifespan'}, receive, send))
+        finally:
+            loop.close()
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+class DjangoOverAsgiTest(TransactionTestCase):
+
+
+    def test_serves_django_views(self):
+        recipe = Recipe.objects.create(title='Tomato Soup')
+        application = WsgiToAsgi(get_wsgi_application(), max_threads=1)
+
+        messages = call(application, http_scope(reverse('show_recipe', args=[recipe.pk]),
+            headers=[(b'host', b'testserver')]))
+
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn(b'Tomato Soup', b''.join(m.get('body', b'') for m in messages[1:]))
@@ -0,0 +1,97 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase, SimpleTestCase, override_settings
+
+from . import metrics
+
+
+class RenderTest(SimpleTestCase):
+
+
+    def test_renders_counters_and_cumulative_histograms(self):
+        registry = metrics.Registry()
+        registry.inc('stockpot_requests_total', {'view': 'home', 'status': '200'}, 2)
+        registry.observe('stockpot_request_duration_seconds', {'view': 'home'}, 0.003)
+        registry.observe('stockpot_request_duration_seconds', {'view': 'home'}, 0.02)
+        registry.observe('stockpot_request_duration_seconds', {'view': 'home'}, 60)
+
+        lines = metrics.render(registry).splitlines()
+
+        self.assertIn('# TYPE stockpot_requests_total counter', lines)
+        self.assertIn('stockpot_requests_total{status="200",view="home"} 2', lines)
+        self.assertIn('stockpot_request_duration_seconds_bucket{view="home",le="0.005"} 1', lines)
+        self.assertIn('stockpot_request_duration_seconds_bucket{view="home",le="0.025"} 2', lines)
+        self.assertIn('stockpot_request_duration_seconds_bucket{view="home",le="10.0"} 2', lines)
+        self.assertIn('stockpot_request_duration_seconds_bucket{view="home",le="+Inf"} 3', lines)
+        self.assertIn('stockpot_request_duration_seconds_count{view="home"} 3', lines)
+
+    def test_escapes_label_values(self):
+        registry = metrics.Registry()
+        registry.inc('stockpot_requests_total', {'view': 'a"b'})
+        self.assertIn(r'stockpot_requests_total{view="a\"b"} 1', metrics.render(registry))
+
+
+class MultiProcessCollectTest(SimpleTestCase):
+
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write_dump(self, pid, counters=(), gauges=()):
+        with open(os.path.join(self.directory, f'{pid}.json'), 'w') as output:
+            json.dump({'pid': pid, 'counters': list(counters), 'gauges': list(gauges),
+                'histograms': []}, output)
+
+    def test_sums_every_process_and_drops_gauges_of_dead_ones(self):
+        key = ['stockpot_db_pool_connections', [['state', 'idle']]]
+        # our parent is alive, a pid above the kernel's limit never is
+        self.write_dump(os.getppid(), counters=[['stockpot_requests_total', [], 3]],
+                gauges=[key + [2]])
+        self.write_dump(2 ** 23, counters=[['stockpot_requests_total', [], 4]],
+                gauges=[key + [5]])
+
+        with override_settings(METRICS_DIR=self.directory):
+            total = metrics.collect()
+
+        self.assertEqual(total.counters[('stockpot_requests_total', ())],
+                7 + metrics.registry.counters.get(('stockpot_requests_total', ()), 0))
+        self.assertEqual(total.gauges[('stockpot_db_pool_connections', (('state', 'idle'),))], 2)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, f'{os.getpid()}.json')))
+
+    def test_concurrent_flushes_leave_one_whole_file(self):
+        with override_settings(METRICS_DIR=self.directory):
+            threads = [threading.Thread(target=metrics.flush, kwargs={'force': True})
+                    for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(os.listdir(self.directory), [f'{os.getpid()}.json'])
+        with open(os.path.join(self.directory, f'{os.getpid()}.json')) as dump:
+            self.assertEqual(json.load(dump)['pid'], os.getpid())
+
+
+class MetricsViewTest(TestCase):
+
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_reports_requests_by_view(self):
+        self.client.get(reverse('search_recipes'))
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('stockpot_requests_total{status="200",view="search_recipes"}', content)
+        self.assertIn('stockpot_request_duration_seconds_count{view="search_recipes"}', content)
+        self.assertIn('stockpot_db_queries_total{view="search_recipes"}', content)
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,63 @@
+import json
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from recipes.models import Recipe
+from .profiling import RequestProfile
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0)
+class ProfilingMiddlewareTest(TestCase):
+
+
+    def setUp(self):
+        self.recipe = Recipe.objects.create(title='Tomato Soup')
+
+    def test_adds_server_timing_header(self):
+        with self.assertLogs('stockpot.profiling', 'INFO'):
+            response = self.client.get(reverse('show_recipe', args=[self.recipe.pk]))
+        timing = response['Server-Timing']
+        for metric in ('sql;', 'template;', 'view;', 'total;'):
+            self.assertIn(metric, timing)
+
+    def test_logs_request_profile(self):
+        with self.assertLogs('stockpot.profiling', 'INFO') as logs:
+            self.client.get(reverse('search_recipes'), {'q': 'soup'})
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'search_recipes')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+
+    @override_settings(PROFILING_QUERY_BUDGETS={'search_recipes': 0})
+    def test_warns_when_view_is_over_query_budget(self):
+        with self.assertLogs('stockpot.profiling', 'WARNING') as logs:
+            self.client.get(reverse('search_recipes'), {'q': 'soup'})
+        self.assertIn('over its budget of 0', logs.output[0])
+
+    @override_settings(PROFILING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_profiled(self):
+        response = self.client.get(reverse('search_recipes'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('search_recipes'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class RequestProfileTest(TestCase):
+
+
+    def test_counts_queries_and_duplicates(self):
+        profile = RequestProfile()
+        profile.start()
+        list(Recipe.objects.filter(pk=1))
+        list(Recipe.objects.filter(pk=1))
+        list(Recipe.objects.filter(pk=2))
+        profile.stop()
+
+        self.assertEqual(len(profile.queries), 3)
+        self.assertEqual(profile.duplicate_queries, 1)
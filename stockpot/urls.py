@@ -19,11 +19,14 @@ from django.conf.urls import include
 from django.views.generic import RedirectView
 
 from recipes import views
+from stockpot import metrics
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^accounts/', include('django.contrib.auth.urls')),
     url(r'^users/', include('users.urls')),
     url(r'^recipes/', include('recipes.urls')),
+    url(r'^api/recipes/', include('recipes.api_urls')),
+    url(r'^metrics$', metrics.metrics_view, name='metrics'),
     url(r'^$', RedirectView.as_view(url='/recipes/', permanent=True)),
 ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 09:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_profile_bio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,13 +1,16 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save
 from django.dispatch import receiver
 
+from stockpot import page_cache
+
 # Create your models here.
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     name = models.TextField(blank=True)
     bio = models.TextField(blank=True)
+    modified = models.DateTimeField(auto_now=True)
 
 
 # create and save Profile object when User object is created or saved
@@ -19,3 +22,18 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
+
+# the username a user was loaded with, read from __dict__ so a deferred
+# username isn't fetched
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._loaded_username = instance.__dict__.get('username')
+
+# drop the cached anonymous profile page, under the old username too after
+# a rename
+@receiver(post_save, sender=Profile)
+def purge_profile_page(sender, instance, **kwargs):
+    user = instance.user
+    usernames = {user.username, getattr(user, '_loaded_username', None) or user.username}
+    page_cache.purge(*[f'profile:{username}' for username in usernames])
+    user._loaded_username = user.username
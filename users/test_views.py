@@ -79,6 +79,35 @@ class UserProfileViewTests(TestCase):
         self.assertIsNotNone(response.context['display_user'])
         self.assertTemplateUsed(response, 'show_profile.html')
 
+    def test_user_profile_answers_conditional_requests(self):
+        user = User.objects.create_user(**self.credentials)
+        url = reverse('show_profile', args=[user.username])
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        user.profile.bio = 'Food nerd.'
+        user.profile.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Food nerd.', response.content.decode())
+
+    def test_renamed_user_old_profile_page_purged(self):
+        user = User.objects.create_user(**self.credentials)
+        old_url = reverse('show_profile', args=[user.username])
+        self.assertEqual(self.client.get(old_url).status_code, 200)
+
+        user.username = 'renamed'
+        user.save()
+
+        self.assertEqual(self.client.get(old_url).status_code, 404)
+
+    def test_missing_user_profile_returns_404(self):
+        response = self.client.get(reverse('show_profile', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
+
 
 class UserProfileEditViewTest(TestCase):
 
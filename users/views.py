@@ -4,8 +4,13 @@ from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.core.exceptions import PermissionDenied
+from django.views.decorators.http import condition
+
+from stockpot.db.replicas import use_primary
+from stockpot.page_cache import cache_anonymous_page
 
 from .forms import ProfileForm
+from .models import Profile
 
 # Create your views here.
 def register(request):
@@ -22,10 +27,31 @@ def register(request):
         form = UserCreationForm()
     return render(request, 'registration/register.html', {'form':form})
 
+def _profile_modified(request, username):
+    # a single lookup on the unique username index, shared by the ETag and
+    # Last-Modified checks
+    if not hasattr(request, '_profile_modified'):
+        request._profile_modified = Profile.objects.filter(user__username=username) \
+                .values_list('modified', flat=True).first()
+    return request._profile_modified
+
+def profile_etag(request, username):
+    modified = _profile_modified(request, username)
+    if modified is None:
+        return None
+    # the navbar differs per user
+    return f'{username}-{request.user.pk or 0}-{modified.timestamp()}'
+
+def profile_last_modified(request, username):
+    return _profile_modified(request, username)
+
+@condition(etag_func=profile_etag, last_modified_func=profile_last_modified)
+@cache_anonymous_page(lambda request, username: [f'profile:{username}'])
 def show_profile(request, username):
     user = get_object_or_404(User, username=username)
     return render(request, 'show_profile.html', {'display_user':user})
 
+@use_primary
 @login_required
 def edit_profile(request, username):
     user = get_object_or_404(User, username=username)